@@ -3,6 +3,7 @@ from __future__ import annotations
 from datetime import datetime, timezone
 
 from .db import collection
+from .routers.common import bump_collection_version
 
 
 SEED_ACTIONS: list[tuple[str, str, str, str]] = [
@@ -155,5 +156,6 @@ async def ensure_action_library_seed() -> int:
 
     if docs:
         await lib.insert_many(docs)
+        await bump_collection_version('action_library')
     return len(docs)
 
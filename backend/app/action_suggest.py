@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import Counter
+
+from .config import settings
+from .db import collection
+from .routers.common import collection_version, normalize_doc
+from .text_search import words
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'action_library'
+TITLE_FIELDS = ('title_tr', 'title_en')
+TEXT_FIELDS = ('text_tr', 'text_en')
+MAX_PREFIX = 16
+MIN_FUZZY_LENGTH = 3
+FUZZY_MIN_OVERLAP = 0.5
+
+
+def _trigrams(word: str) -> set[str]:
+    padded = f' {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ActionLibraryIndex:
+    """In-process prefix + trigram index over active action library items.
+
+    Word prefixes answer normal typing; trigrams catch typos and mid-word
+    fragments when no prefix matches. A rebuild swaps all structures at once,
+    so readers never see a half-built index.
+    """
+
+    def __init__(self):
+        self.version = -1
+        self.items: list[dict] = []
+        self._words: list[set[str]] = []
+        self._title_words: list[set[str]] = []
+        self._prefixes: dict[str, set[int]] = {}
+        self._trigrams: dict[str, set[int]] = {}
+        self._lock = asyncio.Lock()
+
+    def build(self, docs: list[dict], version: int = 0):
+        item_words, title_words = [], []
+        prefixes: dict[str, set[int]] = {}
+        trigrams: dict[str, set[int]] = {}
+        for idx, doc in enumerate(docs):
+            titles = {w for field in TITLE_FIELDS for w in words(doc.get(field) or '')}
+            all_words = titles | {w for field in TEXT_FIELDS for w in words(doc.get(field) or '')}
+            title_words.append(titles)
+            item_words.append(all_words)
+            for word in all_words:
+                for end in range(1, min(len(word), MAX_PREFIX) + 1):
+                    prefixes.setdefault(word[:end], set()).add(idx)
+                for gram in _trigrams(word):
+                    trigrams.setdefault(gram, set()).add(idx)
+        self.items, self._words, self._title_words = docs, item_words, title_words
+        self._prefixes, self._trigrams = prefixes, trigrams
+        self.version = version
+
+    async def refresh(self):
+        async with self._lock:
+            version = await collection_version(VERSION_KEY)
+            docs = [normalize_doc(doc) async for doc in collection('action_library').find({'is_active': True}).sort([('scope', 1), ('order_index', 1)])]
+            self.build(docs, version)
+
+    async def refresh_if_stale(self):
+        if await collection_version(VERSION_KEY) != self.version:
+            await self.refresh()
+
+    def _prefix_score(self, idx: int, token: str) -> float:
+        score = 1.0
+        if token in self._words[idx]:
+            score += 0.5
+        if any(w.startswith(token) for w in self._title_words[idx]):
+            score += 1.0
+        return score
+
+    def _match(self, token: str) -> dict[int, float]:
+        hits = self._prefixes.get(token[:MAX_PREFIX], set())
+        if len(token) > MAX_PREFIX:
+            hits = {idx for idx in hits if any(w.startswith(token) for w in self._words[idx])}
+        if hits:
+            return {idx: self._prefix_score(idx, token) for idx in hits}
+        if len(token) < MIN_FUZZY_LENGTH:
+            return {}
+        grams = _trigrams(token)
+        overlap = Counter(idx for gram in grams for idx in self._trigrams.get(gram, ()))
+        return {idx: 0.5 * count / len(grams) for idx, count in overlap.items() if count / len(grams) >= FUZZY_MIN_OVERLAP}
+
+    def suggest(self, q: str, *, scope: str | None = None, valve_type: str | None = None, limit: int = 10) -> list[dict]:
+        tokens = list(dict.fromkeys(words(q)))
+        if not tokens:
+            return []
+        scores: dict[int, float] | None = None
+        for token in tokens:
+            matched = self._match(token)
+            scores = matched if scores is None else {idx: scores[idx] + score for idx, score in matched.items() if idx in scores}
+            if not scores:
+                return []
+        ranked = []
+        for idx, score in scores.items():
+            item = self.items[idx]
+            if scope and item.get('scope') != scope:
+                continue
+            if valve_type and item.get('valve_type') not in (valve_type, None, ''):
+                continue
+            ranked.append((-score, item.get('order_index') or 0, idx))
+        ranked.sort()
+        return [self.items[idx] for _, _, idx in ranked[:limit]]
+
+
+action_library_index = ActionLibraryIndex()
+
+
+async def run_action_index_poller():
+    """Pick up library writes made through other API nodes."""
+    while True:
+        await asyncio.sleep(settings.action_index_refresh_seconds)
+        try:
+            await action_library_index.refresh_if_stale()
+        except Exception:
+            logger.exception('action library index refresh failed')
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+import redis.asyncio as redis
+
+from .config import settings
+from .metrics import RESPONSE_CACHE_REQUESTS, RESPONSE_CACHE_REDIS_ERRORS
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'rc:'
+# Only raise the mirrored version: bumps from two workers can land out of order. The short
+# expiry bounds staleness when a bump happened while this process could not reach Redis.
+SET_VERSION_IF_HIGHER = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '-1')
+if tonumber(ARGV[1]) > current then
+  redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+return 1
+"""
+
+
+class ResponseCache:
+    """Rendered response bodies keyed by (tag, collection version, key).
+
+    Bumping a tag's version in `collection_versions` invalidates every entry
+    for it, so a cached body is never stale, only unreachable. Lookups go to
+    a small in-process LRU first, then Redis. While Redis is unreachable the
+    cache runs on the LRU alone and retries Redis after
+    `cache_redis_retry_seconds`. Concurrent misses for one key are collapsed:
+    within a process by a lock, across processes by a short Redis lock whose
+    losers poll for the winner's value.
+    """
+
+    def __init__(self):
+        self._local: OrderedDict[str, bytes] = OrderedDict()
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._redis = None
+        self._redis_down_until = 0.0
+
+    def _client(self):
+        if not settings.redis_url or time.monotonic() < self._redis_down_until:
+            return None
+        if self._redis is None:
+            self._redis = redis.from_url(settings.redis_url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        return self._redis
+
+    def _redis_failed(self):
+        RESPONSE_CACHE_REDIS_ERRORS.inc()
+        if not self._redis_down_until:
+            logger.warning('response cache: Redis unavailable, using the in-process cache only', exc_info=True)
+        self._redis_down_until = time.monotonic() + settings.cache_redis_retry_seconds
+
+    async def _redis_call(self, method: str, *args, **kwargs):
+        client = self._client()
+        if client is None:
+            return None
+        try:
+            result = await getattr(client, method)(*args, **kwargs)
+        except Exception:
+            self._redis_failed()
+            return None
+        self._redis_down_until = 0.0
+        return result
+
+    async def get_version(self, tag: str) -> int | None:
+        value = await self._redis_call('get', f'{KEY_PREFIX}version:{tag}')
+        return int(value) if value is not None else None
+
+    async def set_version(self, tag: str, version: int):
+        await self._redis_call('eval', SET_VERSION_IF_HIGHER, 1, f'{KEY_PREFIX}version:{tag}', version, settings.cache_version_ttl_seconds)
+
+    def _remember(self, key: str, body: bytes):
+        self._local[key] = body
+        self._local.move_to_end(key)
+        while len(self._local) > settings.cache_local_max_entries:
+            self._local.popitem(last=False)
+
+    async def _lookup(self, tag: str, key: str) -> bytes | None:
+        body = self._local.get(key)
+        if body is not None:
+            self._local.move_to_end(key)
+            RESPONSE_CACHE_REQUESTS.labels(tag, 'local_hit').inc()
+            return body
+        body = await self._redis_call('get', key)
+        if body is not None:
+            self._remember(key, body)
+            RESPONSE_CACHE_REQUESTS.labels(tag, 'redis_hit').inc()
+        return body
+
+    async def get_or_load(self, tag: str, version: int, key: str, load: Callable[[], Awaitable[bytes]]) -> bytes:
+        cache_key = f'{KEY_PREFIX}{tag}:{version}:{key}'
+        body = await self._lookup(tag, cache_key)
+        if body is not None:
+            return body
+        lock = self._locks.setdefault(cache_key, asyncio.Lock())
+        try:
+            async with lock:
+                body = await self._lookup(tag, cache_key)
+                if body is not None:
+                    return body
+                lock_key = f'{cache_key}:lock'
+                acquired = await self._redis_call('set', lock_key, b'1', nx=True, px=settings.cache_lock_ms)
+                # None with a live client means another process holds the lock (not that Redis is down).
+                if acquired is None and self._client() is not None:
+                    # Another process is loading this key; wait for its value, then load ourselves.
+                    deadline = time.monotonic() + settings.cache_lock_ms / 1000
+                    while time.monotonic() < deadline:
+                        await asyncio.sleep(0.05)
+                        body = await self._lookup(tag, cache_key)
+                        if body is not None:
+                            return body
+                RESPONSE_CACHE_REQUESTS.labels(tag, 'miss').inc()
+                body = await load()
+                self._remember(cache_key, body)
+                await self._redis_call('set', cache_key, body, ex=settings.cache_ttl_seconds)
+                if acquired:
+                    await self._redis_call('delete', lock_key)
+                return body
+        finally:
+            if not lock.locked():
+                self._locks.pop(cache_key, None)
+
+
+response_cache = ResponseCache()
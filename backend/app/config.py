@@ -10,8 +10,79 @@ class Settings(BaseSettings):
     minio_endpoint: str = 'minio:9000'
     minio_access_key: str = 'minioadmin'
     minio_secret_key: str = 'minioadmin'
+    # Host clients use to reach MinIO directly; presigned URLs are signed for it.
+    minio_public_endpoint: str | None = None
+    # 'local' serves uploads from /files/uploads, 'presigned' hands out MinIO URLs.
+    media_url_mode: str = 'local'
+    presigned_url_ttl_seconds: int = 6 * 3600
+    # Local disk is an LRU cache over MinIO; 0 disables eviction.
+    upload_cache_max_bytes: int = 5 * 1024**3
+    # Paths MinIO did not have are answered from memory for this long instead of re-fetched.
+    upload_cache_negative_ttl_seconds: int = 60
+    # Files whose MinIO upload failed are retried this often; 0 disables.
+    upload_retry_interval_seconds: int = 60
+    # How often each API node checks for action library writes made elsewhere.
+    action_index_refresh_seconds: int = 30
+    # Shared response cache for catalog endpoints; empty keeps only the in-process LRU.
     redis_url: str = 'redis://redis:6379/0'
+    cache_ttl_seconds: int = 24 * 3600
+    cache_version_ttl_seconds: int = 60
+    cache_local_max_entries: int = 512
+    cache_lock_ms: int = 2000
+    cache_redis_retry_seconds: int = 30
     jwt_secret: str = 'change-me'
 
+    # Orphaned media/export garbage collection; the periodic sweeper is off when interval is 0.
+    gc_interval_seconds: int = 0
+    gc_dry_run: bool = True
+    gc_grace_seconds: int = 3600
+    gc_batch_size: int = 500
+    gc_max_batches_per_second: float = 2.0
+
+    # Commands slower than this are recorded in the capped `slow_queries` collection; 0 disables.
+    slow_query_ms: int = 200
+    slow_query_explain: bool = True
+    # Each query shape is explained at most once per interval.
+    slow_query_explain_interval_seconds: int = 300
+    slow_query_log_size_bytes: int = 64 * 1024**2
+
+    # Requests sent with `X-Profile-Token: <token>` are profiled; empty disables the header.
+    # The sample rate and route filter live in `runtime_settings` (see /api/admin/profiling).
+    profiling_token: str = ''
+    profiling_max_concurrent: int = 2
+    profiling_max_seconds: int = 120
+    profile_retention_days: int = 7
+
+    # Heavy libraries load on first use. Listed engines (weasyprint, openpyxl, pillow, boto3) are
+    # imported in the background right after startup instead, e.g. WARM_UP_ENGINES='["weasyprint"]'.
+    warm_up_engines: list[str] = []
+
+    # Seeding, index builds and read-model backfills run in one process at a time under a Mongo
+    # lease; other workers wait up to startup_lock_wait_seconds for it, then start serving anyway.
+    startup_lock_ttl_seconds: int = 60
+    startup_lock_wait_seconds: int = 300
+    # Steps that finished for this deploy are skipped; empty derives the id from the app's source code.
+    deploy_id: str = ''
+
+    # POSTs sent with an Idempotency-Key replay their first response for idempotency_ttl_hours. A retry
+    # of a request still running waits for it; a marker left by a worker that died expires with the lease.
+    idempotency_ttl_hours: int = 24
+    idempotency_wait_seconds: int = 60
+    idempotency_lease_seconds: int = 300
+
+    # Import jobs not updated for this long lost their worker and are resumed or marked failed; 0 disables.
+    import_stale_seconds: int = 900
+
+    # Reports entering these statuses get the export set below rendered in the background, and again
+    # after later changes; each entry is export options plus 'type' (pdf, excel_external, excel_internal).
+    prerender_statuses: list[str] = ['approved', 'final_report']
+    prerender_exports: list[dict] = [
+        {'type': 'pdf', 'language': 'tr'},
+        {'type': 'pdf', 'language': 'en'},
+        {'type': 'excel_external', 'language': 'tr'},
+    ]
+    # Writes within this window after the first are rendered once.
+    prerender_delay_seconds: float = 5
+
 
 settings = Settings()
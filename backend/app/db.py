@@ -1,9 +1,11 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from .config import settings
+from .metrics import MongoCommandMetrics
+from .slow_queries import slow_query_recorder
 
 
-client = AsyncIOMotorClient(settings.mongodb_uri)
+client = AsyncIOMotorClient(settings.mongodb_uri, event_listeners=[MongoCommandMetrics(), slow_query_recorder])
 db = client[settings.mongodb_db]
 
 
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+def process_age_seconds() -> float | None:
+    """Seconds since this process started (interpreter start-up and imports included); Linux only."""
+    try:
+        with open('/proc/self/stat') as fh:
+            start_ticks = int(fh.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as fh:
+            uptime = float(fh.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 3)
+
+
+def current_rss_bytes() -> int:
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        # Peak rather than current outside Linux; ru_maxrss is bytes on macOS, KiB elsewhere.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Engine:
+    """A heavy library imported on first use, with what loading it cost."""
+
+    def __init__(self, name: str, loader: Callable[[], Any]):
+        self.name = name
+        self.loader = loader
+        self.value: Any = None
+        self.loaded = False
+        self.load_seconds: float | None = None
+        self.rss_delta_bytes: int | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self.loaded:
+            return self.value
+        with self._lock:
+            if not self.loaded:
+                rss = current_rss_bytes()
+                started = time.perf_counter()
+                self.value = self.loader()
+                self.load_seconds = round(time.perf_counter() - started, 4)
+                self.rss_delta_bytes = current_rss_bytes() - rss
+                self.loaded = True
+                logger.info('loaded %s engine in %.3fs (+%d KiB RSS)', self.name, self.load_seconds, self.rss_delta_bytes // 1024)
+        return self.value
+
+    def stats(self) -> dict:
+        return {'name': self.name, 'loaded': self.loaded, 'load_seconds': self.load_seconds, 'rss_delta_bytes': self.rss_delta_bytes}
+
+
+ENGINES: dict[str, Engine] = {}
+
+
+def register(name: str):
+    def decorator(loader: Callable[[], Any]):
+        ENGINES[name] = Engine(name, loader)
+        return loader
+    return decorator
+
+
+def engine(name: str) -> Any:
+    return ENGINES[name].get()
+
+
+@register('weasyprint')
+def _weasyprint():
+    # pango/cairo are loaded through cffi here, which is most of the cost.
+    from weasyprint import HTML
+    return SimpleNamespace(HTML=HTML)
+
+
+@register('openpyxl')
+def _openpyxl():
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.drawing.image import Image
+    return SimpleNamespace(Workbook=Workbook, load_workbook=load_workbook, Image=Image)
+
+
+@register('pillow')
+def _pillow():
+    from PIL import Image
+    return SimpleNamespace(Image=Image)
+
+
+@register('boto3')
+def _boto3():
+    import boto3
+    from botocore.client import Config
+    return SimpleNamespace(client=boto3.client, Config=Config)
+
+
+def warm_up(names: list[str]) -> list[dict]:
+    """Load the named engines now; unknown names and failing imports are logged, not raised."""
+    for name in names:
+        if name not in ENGINES:
+            logger.warning('unknown engine %r in warm-up list', name)
+            continue
+        try:
+            ENGINES[name].get()
+        except Exception:
+            logger.exception('warming up %s engine failed', name)
+    return engine_report()
+
+
+def engine_report() -> list[dict]:
+    return [e.stats() for e in ENGINES.values()]
+
+
+def startup_report() -> dict:
+    return {
+        'process_age_seconds': process_age_seconds(),
+        'rss_bytes': current_rss_bytes(),
+        'engines': engine_report(),
+    }
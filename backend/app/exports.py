@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from uuid import uuid4
+
+from bson import ObjectId
+from .db import collection
+from .engines import engine
+from .metrics import EXPORT_FAILURES, EXPORT_RENDER_SECONDS, EXPORT_REUSED, EXPORT_SIZE_BYTES
+from .responses import dumps
+from .schemas import ExcelExportOptionsIn, ExportOptionsIn
+from .storage import EXPORT_BUCKET, EXPORT_DIR, MultipartUploadWriter, upload_cache
+from .routers.common import collection_version, now
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+# Renders running in this process, so a request for an export being pre-rendered waits for it.
+_rendering: dict[tuple, asyncio.Future] = {}
+
+
+def export_download_url(export_id: str) -> str:
+    return f'/api/exports/{export_id}/download'
+
+
+def export_source_stamp(report: dict, before: list[dict], after: list[dict], company_version: int) -> str:
+    """Hash of everything an export is rendered from; equal stamps mean identical output."""
+    photos = [(str(p['_id']), p.get('updated_at') or p.get('created_at')) for p in before + after]
+    return hashlib.sha1(dumps([report.get('updated_at'), company_version, photos])).hexdigest()
+
+
+def _export_result(doc: dict) -> dict:
+    export_id = str(doc['_id'])
+    return doc | {'id': export_id, 'url': export_download_url(export_id)}
+
+
+async def load_report_photos(report: dict) -> tuple[list[dict], list[dict]]:
+    sets = report.get('photo_sets') or {}
+    before_ids = [x for x in sets.get('before', []) if ObjectId.is_valid(x)]
+    after_ids = [x for x in sets.get('after', []) if ObjectId.is_valid(x)]
+    if not before_ids and not after_ids:
+        return [], []
+    by_id = {str(p['_id']): p async for p in collection('photos').find({'_id': {'$in': [ObjectId(x) for x in before_ids + after_ids]}})}
+    return [by_id[x] for x in before_ids if x in by_id], [by_id[x] for x in after_ids if x in by_id]
+
+
+async def load_company_profile(report: dict) -> dict | None:
+    company = None
+    profile_id = report.get('company_profile_id')
+    if profile_id and ObjectId.is_valid(profile_id):
+        company = await collection('company_profiles').find_one({'_id': ObjectId(profile_id)})
+    if not company:
+        company = await collection('company_profiles').find_one({'is_default': True})
+    return company
+
+
+def build_pdf_html(report: dict, before: list[dict], after: list[dict], options: ExportOptionsIn, company: dict | None, photo_paths: dict[str, Path]):
+    company_html = ''
+    if company:
+        company_html = f"""
+        <div style='font-size:12px'>
+          <strong>{company.get('name','')}</strong><br/>
+          {company.get('address','')}<br/>
+          {company.get('phone','')} · {company.get('email','')}
+        </div>
+        """
+
+    slots = options.photos_per_page
+    photo_width = '48%' if slots <= 4 else ('31%' if slots == 6 else '23%')
+
+    def section(title: str, photos: list[dict]):
+        blocks = []
+        for p in photos:
+            image_path = photo_paths.get(p.get('optimized_object_key', ''))
+            if image_path:
+                blocks.append(
+                    f"<div style='width:{photo_width}; margin:0 1% 14px 1%; display:inline-block; vertical-align:top;'>"
+                    f"<img src='file://{image_path}' style='width:100%; height:170px; object-fit:contain; border:1px solid #ddd;'/>"
+                    f"<div style='font-size:10px; color:#444; margin-top:4px'>{p.get('caption','')}</div></div>"
+                )
+        return f"<h3>{title}</h3><div>{''.join(blocks) or '<em>No photos</em>'}</div>"
+
+    return f"""
+    <html><body style='font-family: Arial, sans-serif; font-size:12px;'>
+      <div style='border-bottom:2px solid #1e40af; padding-bottom:8px; margin-bottom:12px;'>
+        <h1 style='margin:0; color:#1e40af'>SERVICE REPORT</h1>
+        {company_html}
+        <div>Report No: {report.get('report_no','')} | Revision: {report.get('revision_no',1)} | Language: {options.language}</div>
+      </div>
+      <h3>General</h3>
+      <p>Customer: {report.get('customer_name') or report.get('customer_id','')} | Short: {report.get('customer_short_name','-')} | Code: {report.get('customer_code','-')} | Contact: {report.get('contact_id','')} | Status: {report.get('status','')}</p>
+      <h3>Complaint</h3><p>{' '.join([x.get('text','') for x in report.get('blocks',{}).get('complaint',[])])}</p>
+      <h3>Problems</h3><p>{' '.join([x.get('text','') for x in report.get('blocks',{}).get('problems',[])])}</p>
+      <h3>Actions</h3><p>{' '.join([x.get('text','') for x in report.get('blocks',{}).get('actions',[])])}</p>
+      <h3>Spares</h3><p>{', '.join([f"{x.get('part_name','')} x{x.get('qty','')}" for x in report.get('spares',[])])}</p>
+      <h3>Result</h3><p>{report.get('result_notes','')}</p>
+      {section('Before Photos', before)}
+      {section('After Photos', after)}
+    </body></html>
+    """
+
+
+def render_pdf(target, report: dict, before: list[dict], after: list[dict], options: ExportOptionsIn, company: dict | None, photo_paths: dict[str, Path]):
+    engine('weasyprint').HTML(string=build_pdf_html(report, before, after, options, company, photo_paths)).write_pdf(target)
+
+
+def render_excel(target, report: dict, before: list[dict], after: list[dict], options: ExcelExportOptionsIn, photo_paths: dict[str, Path]):
+    xlsx = engine('openpyxl')
+    wb = xlsx.Workbook()
+    ws = wb.active
+    ws.title = 'Summary'
+    ws['A1'] = 'Report No'
+    ws['B1'] = report.get('report_no')
+    ws['A2'] = 'Status'
+    ws['B2'] = report.get('status')
+    ws['A3'] = 'Result'
+    ws['B3'] = report.get('result_notes', '')
+
+    findings = wb.create_sheet('Findings')
+    findings['A1'] = 'Problems'
+    findings['A2'] = ' | '.join([x.get('text', '') for x in report.get('blocks', {}).get('problems', [])])
+
+    actions = wb.create_sheet('Actions')
+    actions['A1'] = 'Actions'
+    actions['A2'] = ' | '.join([x.get('text', '') for x in report.get('blocks', {}).get('actions', [])])
+
+    parts = wb.create_sheet('Parts')
+    parts.append(['Part', 'Qty', 'Note'])
+    for part in report.get('spares', []):
+        parts.append([part.get('part_name'), part.get('qty'), part.get('note')])
+
+    photos_ws = wb.create_sheet('Photos')
+    photos_ws.append(['Before', 'Before Caption', 'After', 'After Caption'])
+    rows = max(len(before), len(after))
+    row_idx = 2
+    for i in range(rows):
+        b = before[i] if i < len(before) else None
+        a = after[i] if i < len(after) else None
+        photos_ws[f'B{row_idx}'] = b.get('caption', '') if b else ''
+        photos_ws[f'D{row_idx}'] = a.get('caption', '') if a else ''
+        if b:
+            path = photo_paths.get(b.get('optimized_object_key', ''))
+            if path:
+                img = xlsx.Image(str(path))
+                img.width, img.height = 180, 120
+                photos_ws.add_image(img, f'A{row_idx}')
+        if a:
+            path = photo_paths.get(a.get('optimized_object_key', ''))
+            if path:
+                img = xlsx.Image(str(path))
+                img.width, img.height = 180, 120
+                photos_ws.add_image(img, f'C{row_idx}')
+        photos_ws.row_dimensions[row_idx].height = 95
+        row_idx += 6
+
+    if options.type == 'internal':
+        wb.create_sheet('Measurements')
+        wb.create_sheet('Work_Order')
+        wb.create_sheet('History')
+
+    wb.save(target)
+
+
+def _write_export(key: str, content_type: str, render) -> tuple[int, str | None]:
+    with MultipartUploadWriter(EXPORT_DIR / key, EXPORT_BUCKET, key, content_type) as out:
+        render(out)
+    return out.size, out.object_key
+
+
+async def create_export(
+    report: dict,
+    export_type: str,
+    options: ExportOptionsIn | ExcelExportOptionsIn,
+    *,
+    speculative: bool = False,
+    executor: Executor | None = None,
+) -> dict:
+    """Render an export, stream it to MinIO and record it in `exports` and on the report.
+
+    `export_type` is 'pdf', 'excel_external' or 'excel_internal'. An export
+    already rendered (or being rendered) from the same report state with the
+    same options is returned instead of rendering again. `speculative`
+    exports are pre-renders nobody asked for yet; they stay out of the
+    export list until a request picks one up.
+    """
+    report_id = str(report['_id'])
+    before, after = await load_report_photos(report)
+    stamp = export_source_stamp(report, before, after, await collection_version('company_profiles'))
+    render_key = (report_id, export_type, dumps(options.model_dump()), stamp)
+    while render_key in _rendering:
+        await asyncio.shield(_rendering[render_key])
+    existing = await collection('exports').find_one({'report_id': report_id, 'type': export_type, 'options': options.model_dump(), 'source_stamp': stamp})
+    if existing:
+        if not speculative:
+            if existing.get('speculative'):
+                await collection('exports').update_one({'_id': existing['_id']}, {'$set': {'speculative': False}})
+                existing['speculative'] = False
+            await _set_latest_export(report, export_type, str(existing['_id']), existing['size_bytes'])
+        EXPORT_REUSED.labels(export_type, 'speculative' if speculative else 'request').inc()
+        return _export_result(existing)
+
+    _rendering[render_key] = asyncio.get_running_loop().create_future()
+    try:
+        return await _render_export(report, export_type, options, before, after, stamp, speculative, executor)
+    finally:
+        _rendering.pop(render_key).set_result(None)
+
+
+async def _render_export(report, export_type, options, before, after, stamp: str, speculative: bool, executor: Executor | None) -> dict:
+    report_id = str(report['_id'])
+    photo_paths = await upload_cache.get_many([p.get('optimized_object_key') for p in before + after])
+    report_no = report.get('report_no', report_id)
+
+    if export_type == 'pdf':
+        company = await load_company_profile(report)
+        filename = f"{report_no}-{options.language}.pdf"
+        content_type = CONTENT_TYPES['pdf']
+
+        def render(out):
+            render_pdf(out, report, before, after, options, company, photo_paths)
+    else:
+        filename = f"{report_no}-{options.type}-{options.language}.xlsx"
+        content_type = CONTENT_TYPES['xlsx']
+
+        def render(out):
+            render_excel(out, report, before, after, options, photo_paths)
+
+    # Unique per export, so older exports of the same report stay downloadable.
+    key = f'{report_id}/{uuid4().hex}/{filename}'
+    started = time.perf_counter()
+    try:
+        size, object_key = await asyncio.get_running_loop().run_in_executor(executor, _write_export, key, content_type, render)
+    except Exception:
+        EXPORT_FAILURES.labels(export_type).inc()
+        raise
+    EXPORT_RENDER_SECONDS.labels(export_type).observe(time.perf_counter() - started)
+    EXPORT_SIZE_BYTES.labels(export_type).observe(size)
+
+    export_doc = {
+        'report_id': report_id,
+        'type': export_type,
+        'file_name': filename,
+        'file_path': str(EXPORT_DIR / key),
+        'bucket': EXPORT_BUCKET,
+        'object_key': key,
+        'stored_in_minio': bool(object_key),
+        'content_type': content_type,
+        'size_bytes': size,
+        'options': options.model_dump(),
+        'source_stamp': stamp,
+        'speculative': speculative,
+        'created_at': now(),
+    }
+    inserted = await collection('exports').insert_one(export_doc)
+    export_id = str(inserted.inserted_id)
+    # Pre-renders (tr and en PDFs share a type) become the report's latest export only once requested.
+    if not speculative:
+        await _set_latest_export(report, export_type, export_id, size)
+    return export_doc | {'id': export_id, 'url': export_download_url(export_id)}
+
+
+async def _set_latest_export(report: dict, export_type: str, export_id: str, size: int):
+    latest = {'latest_url': export_download_url(export_id), 'export_id': export_id, 'generated_at': now(), 'size_bytes': size}
+    await collection('reports').update_one({'_id': report['_id']}, {'$set': {f'exports.{export_type}': latest}})
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable
+from uuid import uuid4
+
+from fastapi import HTTPException, Request, Response
+from pymongo.errors import DuplicateKeyError
+
+from .config import settings
+from .db import collection
+from .metrics import IDEMPOTENCY_REQUESTS
+from .responses import dumps
+from .routers.common import now
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_COLLECTION = 'idempotency_keys'
+IDEMPOTENCY_HEADER = 'idempotency-key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.25
+
+
+def _record_id(request: Request, key: str) -> str:
+    # Keys are scoped to the endpoint: the same client key sent to another URL is another request.
+    return hashlib.sha256(f'{request.method} {request.url.path}\n{key}'.encode()).hexdigest()
+
+
+def _fingerprint(request: Request, data: Any) -> str:
+    return hashlib.sha256(dumps([request.url.query, data])).hexdigest()
+
+
+def _replay(doc: dict) -> Response:
+    return Response(doc['body'], status_code=doc['status'], media_type=doc.get('media_type'), headers={REPLAYED_HEADER: 'true'})
+
+
+async def _claim(record_id: str, fingerprint: str) -> tuple[str | None, dict | None]:
+    """Insert the in-flight marker for a key, or take over one whose lease ran out.
+
+    Returns (owner, None) when this request now owns the key, `owner` being
+    the token its later writes are conditioned on; otherwise (None, record)
+    with the current record (None if it vanished meanwhile).
+    """
+    ts = now()
+    owner = uuid4().hex
+    fields = {
+        'fingerprint': fingerprint,
+        'state': 'in_flight',
+        'owner': owner,
+        'created_at': ts,
+        'lease_until': ts + timedelta(seconds=settings.idempotency_lease_seconds),
+        'expires_at': ts + timedelta(hours=settings.idempotency_ttl_hours),
+    }
+    try:
+        await collection(IDEMPOTENCY_COLLECTION).insert_one({'_id': record_id} | fields)
+        return owner, None
+    except DuplicateKeyError:
+        pass
+    # The owner died mid-request (worker killed, pod evicted): its marker is taken over by the retry.
+    taken = await collection(IDEMPOTENCY_COLLECTION).update_one(
+        {'_id': record_id, 'state': 'in_flight', 'fingerprint': fingerprint, 'lease_until': {'$lte': ts}}, {'$set': fields}
+    )
+    if taken.modified_count:
+        return owner, None
+    return None, await collection(IDEMPOTENCY_COLLECTION).find_one({'_id': record_id})
+
+
+async def _renew(record_id: str, owner: str):
+    # Keeps the lease ahead of a long-running request so a retry waits for it instead of taking over.
+    while True:
+        await asyncio.sleep(settings.idempotency_lease_seconds / 3)
+        try:
+            result = await collection(IDEMPOTENCY_COLLECTION).update_one(
+                {'_id': record_id, 'owner': owner, 'state': 'in_flight'},
+                {'$set': {'lease_until': now() + timedelta(seconds=settings.idempotency_lease_seconds)}},
+            )
+        except Exception:
+            logger.exception('renewing idempotency lease %s failed', record_id)
+            continue
+        if not result.matched_count:
+            logger.error('idempotency lease %s lost; a retry may be running the same request', record_id)
+            return
+
+
+async def idempotent(request: Request, work: Callable[[], Awaitable[Any]], fingerprint: Any = None) -> Any:
+    """Run `work` once per Idempotency-Key header; without the header it just runs.
+
+    A retry with the same key gets the stored response back (with an
+    Idempotent-Replayed header) instead of running `work` again; a retry
+    that arrives while the first request is still running waits up to
+    `idempotency_wait_seconds` for its result, then gets a 409. Reusing a
+    key with a different `fingerprint` (the request's parameters) is a 422.
+    If `work` raises, the key is released so the next retry runs it again.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key:
+        return await work()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters')
+    route = request.scope['route'].path
+    record_id = _record_id(request, key)
+    request_fingerprint = _fingerprint(request, fingerprint)
+    deadline = time.monotonic() + settings.idempotency_wait_seconds
+    waited = False
+    while True:
+        owner, record = await _claim(record_id, request_fingerprint)
+        if owner:
+            break
+        if record is None:
+            continue  # released by a failed first attempt; claim it
+        if record['fingerprint'] != request_fingerprint:
+            IDEMPOTENCY_REQUESTS.labels(route, 'conflict').inc()
+            raise HTTPException(status_code=422, detail='Idempotency-Key was already used with different request parameters')
+        if record['state'] == 'done':
+            IDEMPOTENCY_REQUESTS.labels(route, 'waited' if waited else 'replayed').inc()
+            return _replay(record)
+        if time.monotonic() >= deadline:
+            IDEMPOTENCY_REQUESTS.labels(route, 'in_progress').inc()
+            raise HTTPException(
+                status_code=409,
+                detail='A request with this Idempotency-Key is still in progress',
+                headers={'Retry-After': str(max(1, settings.idempotency_wait_seconds // 4))},
+            )
+        waited = True
+        await asyncio.sleep(POLL_SECONDS)
+
+    IDEMPOTENCY_REQUESTS.labels(route, 'new').inc()
+    renewer = asyncio.create_task(_renew(record_id, owner))
+    try:
+        result = await work()
+    except BaseException:
+        await collection(IDEMPOTENCY_COLLECTION).delete_one({'_id': record_id, 'owner': owner, 'state': 'in_flight'})
+        raise
+    finally:
+        renewer.cancel()
+    if isinstance(result, Response):
+        status, body, media_type = result.status_code, result.body, result.media_type
+    else:
+        status, body, media_type = 200, dumps(result), 'application/json'
+    stored = await collection(IDEMPOTENCY_COLLECTION).update_one(
+        {'_id': record_id, 'owner': owner, 'state': 'in_flight'},
+        {'$set': {'state': 'done', 'status': status, 'body': body, 'media_type': media_type, 'completed_at': now()}, '$unset': {'lease_until': ''}},
+    )
+    if not stored.matched_count:
+        logger.error('idempotency key %s was taken over while its request ran; keeping the other response', record_id)
+    return result
@@ -0,0 +1,402 @@
+from __future__ import annotations
+
+import asyncio
+import csv
+import logging
+from collections.abc import Iterator
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from bson import ObjectId
+from pydantic import BaseModel, ValidationError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .config import settings
+from .db import collection
+from .engines import engine
+from .product_lookup import LOOKUP_FIELDS, product_lookup_keys
+from .routers.common import bump_collection_version, now
+from .routers.customers import next_customer_code
+from .schemas import BrandIn, ContactIn, CustomerIn, ModelIn, ProductIn
+from .storage import RUNTIME_DIR
+from .text_search import fold
+
+logger = logging.getLogger(__name__)
+
+IMPORT_DIR = RUNTIME_DIR / 'imports'
+JOBS_COLLECTION = 'import_jobs'
+ERRORS_COLLECTION = 'import_job_errors'
+BATCH_SIZE = 500
+IMPORT_KINDS = ('customers', 'contacts', 'brands', 'models', 'products')
+TOTAL_FIELDS = ('processed', 'inserted', 'updated', 'failed')
+# A job left by a dead worker is resumed at most this many times before it is marked failed.
+MAX_RESUMES = 3
+# Strong references to running jobs; bare asyncio tasks can be garbage collected.
+_running: set[asyncio.Task] = set()
+
+
+def _header_key(value) -> str:
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _cell(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    text = str(value).strip()
+    return text or None
+
+
+def _nest(flat: dict) -> dict:
+    # "actuator.serial_no" columns become {"actuator": {"serial_no": ...}}.
+    row: dict = {}
+    for key, value in flat.items():
+        if not key or value is None:
+            continue
+        target = row
+        *parents, leaf = key.split('.')
+        for part in parents:
+            target = target.setdefault(part, {})
+        target[leaf] = value
+    return row
+
+
+def _xlsx_rows(path: Path) -> Iterator[tuple[int, dict]]:
+    wb = engine('openpyxl').load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [_header_key(v) for v in next(rows, ())]
+        for number, values in enumerate(rows, start=2):
+            if any(v is not None and str(v).strip() for v in values):
+                yield number, _nest({key: _cell(v) for key, v in zip(header, values)})
+    finally:
+        wb.close()
+
+
+def _csv_rows(path: Path) -> Iterator[tuple[int, dict]]:
+    with path.open(newline='', encoding='utf-8-sig') as fh:
+        sample = fh.read(4096)
+        fh.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(fh, dialect)
+        header = [_header_key(v) for v in next(reader, [])]
+        for number, values in enumerate(reader, start=2):
+            if any(v.strip() for v in values):
+                yield number, _nest({key: _cell(v) for key, v in zip(header, values)})
+
+
+def read_rows(path: Path) -> Iterator[tuple[int, dict]]:
+    """(spreadsheet row number, row dict) pairs, streamed without loading the file."""
+    return _xlsx_rows(path) if path.suffix.lower() in {'.xlsx', '.xlsm'} else _csv_rows(path)
+
+
+def _next_batch(rows: Iterator[tuple[int, dict]]) -> list[tuple[int, dict]]:
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= BATCH_SIZE:
+            break
+    return batch
+
+
+def _validation_errors(exc: ValidationError) -> list[dict]:
+    return [{'field': '.'.join(str(p) for p in err['loc']), 'message': err['msg']} for err in exc.errors()]
+
+
+class RowError(Exception):
+    def __init__(self, field: str, message: str):
+        super().__init__(message)
+        self.field = field
+
+
+class Resolver:
+    """Per-job caches from names/codes in the sheet to document ids."""
+
+    def __init__(self, create_missing: bool):
+        self.create_missing = create_missing
+        self.brands: dict[str, str] | None = None
+        self.models: dict[tuple[str, str], str] = {}
+        self.model_brands_loaded: set[str] = set()
+        self.customers: dict[int, str | None] = {}
+        # (tax_no|name, value) of sheet customers without a code -> filters of the matching documents.
+        self.customer_keys: dict[tuple[str, str], list[dict]] = {}
+        self.catalog_changed: set[str] = set()
+
+    async def brand_id(self, name: str) -> str:
+        if self.brands is None:
+            self.brands = {fold(doc['name']): str(doc['_id']) async for doc in collection('brands').find({}, {'name': 1}) if doc.get('name')}
+        if not name:
+            raise RowError('brand', 'brand or brand_id is required')
+        key = fold(name)
+        if key not in self.brands:
+            if not self.create_missing:
+                raise RowError('brand', f'unknown brand {name!r}')
+            inserted = await collection('brands').insert_one({'name': name, 'created_at': now(), 'updated_at': now()})
+            self.brands[key] = str(inserted.inserted_id)
+            self.catalog_changed.add('brands')
+        return self.brands[key]
+
+    async def model_id(self, brand_id: str, name: str) -> str:
+        if brand_id not in self.model_brands_loaded:
+            async for doc in collection('models').find({'brand_id': brand_id}, {'name': 1}):
+                self.models[(brand_id, fold(doc.get('name') or ''))] = str(doc['_id'])
+            self.model_brands_loaded.add(brand_id)
+        if not name:
+            raise RowError('model', 'model or model_id is required')
+        key = (brand_id, fold(name))
+        if key not in self.models:
+            if not self.create_missing:
+                raise RowError('model', f'unknown model {name!r}')
+            inserted = await collection('models').insert_one({'brand_id': brand_id, 'name': name, 'created_at': now(), 'updated_at': now()})
+            self.models[key] = str(inserted.inserted_id)
+            self.catalog_changed.add('models')
+        return self.models[key]
+
+    async def preload_customers(self, codes: set[int]):
+        missing = [c for c in codes if c not in self.customers]
+        if missing:
+            self.customers.update({c: None for c in missing})
+            async for doc in collection('customers').find({'customer_code': {'$in': missing}}, {'customer_code': 1}):
+                self.customers[doc['customer_code']] = str(doc['_id'])
+
+    async def preload_customer_keys(self, rows: list[dict]):
+        keys = {_customer_key(r) for r in rows if not r.get('customer_code')} - {None} - self.customer_keys.keys()
+        if not keys:
+            return
+        for key in keys:
+            self.customer_keys[key] = []
+        query = {'$or': [{field: {'$in': [v for f, v in keys if f == field]}} for field in {f for f, _ in keys}]}
+        async for doc in collection('customers').find(query, {'tax_no': 1, 'name': 1, 'customer_code': 1}):
+            match = {'customer_code': doc['customer_code']} if doc.get('customer_code') else {'_id': doc['_id']}
+            for key in (('tax_no', doc.get('tax_no')), ('name', doc.get('name'))):
+                if key in keys:
+                    self.customer_keys[key].append(match)
+
+    def customer_id(self, row: dict) -> str:
+        if row.get('customer_id'):
+            if not ObjectId.is_valid(row['customer_id']):
+                raise RowError('customer_id', 'invalid id')
+            return row['customer_id']
+        code = row.get('customer_code')
+        if not code or not str(code).isdigit():
+            raise RowError('customer_code', 'customer_id or a numeric customer_code is required')
+        customer_id = self.customers.get(int(code))
+        if not customer_id:
+            raise RowError('customer_code', f'no customer with code {code}')
+        return customer_id
+
+
+def _customer_key(row: dict) -> tuple[str, str] | None:
+    # The tax number identifies a company across spellings of its name; the name is the fallback.
+    if row.get('tax_no'):
+        return 'tax_no', str(row['tax_no'])
+    if row.get('name'):
+        return 'name', str(row['name'])
+    return None
+
+
+class Importer:
+    def __init__(self, kind: str, create_missing: bool):
+        self.kind = kind
+        self.resolver = Resolver(create_missing)
+        self.next_code: int | None = None
+
+    def _validate(self, schema: type[BaseModel], row: dict) -> dict:
+        fields = schema.model_fields
+        return schema.model_validate({k: v for k, v in row.items() if k in fields}).model_dump()
+
+    async def prepare(self, batch: list[tuple[int, dict]]):
+        if self.kind == 'customers':
+            await self.resolver.preload_customer_keys([r for _, r in batch])
+        if self.kind in {'contacts', 'products'}:
+            await self.resolver.preload_customers({int(r['customer_code']) for _, r in batch if not r.get('customer_id') and str(r.get('customer_code') or '').isdigit()})
+
+    async def operation(self, row: dict) -> UpdateOne:
+        """An upsert keyed on the row's natural key, so importing the same sheet again updates instead of duplicating."""
+        stamp = {'updated_at': now()}
+        if self.kind == 'customers':
+            values = self._validate(CustomerIn, row)
+            if values.get('customer_code'):
+                return UpdateOne({'customer_code': values['customer_code']}, {'$set': values | stamp, '$setOnInsert': {'created_at': now()}}, upsert=True)
+            del values['customer_code']
+            key = _customer_key(values)
+            matches = self.resolver.customer_keys.setdefault(key, [])
+            if len(matches) > 1:
+                raise RowError(key[0], f'{len(matches)} customers have {key[0]} {key[1]!r}; add a customer_code to pick one')
+            if not matches:
+                if self.next_code is None:
+                    self.next_code = await next_customer_code()
+                # Later rows of the sheet with the same key update this customer.
+                matches.append({'customer_code': self.next_code})
+                self.next_code += 1
+            return UpdateOne(matches[0], {'$set': values | stamp, '$setOnInsert': {'created_at': now()}}, upsert=True)
+        if self.kind == 'contacts':
+            values = self._validate(ContactIn, row | {'customer_id': self.resolver.customer_id(row)})
+            field = next(f for f in ('email', 'phone', 'name') if values.get(f))
+            key = {'customer_id': values['customer_id'], field: values[field]}
+            return UpdateOne(key, {'$set': values | stamp, '$setOnInsert': {'created_at': now()}}, upsert=True)
+        if self.kind == 'brands':
+            values = self._validate(BrandIn, row)
+            return UpdateOne({'name': values['name']}, {'$set': stamp, '$setOnInsert': values | {'created_at': now()}}, upsert=True)
+        if self.kind == 'models':
+            brand_id = row.get('brand_id') or await self.resolver.brand_id(row.get('brand') or '')
+            values = self._validate(ModelIn, row | {'brand_id': brand_id})
+            return UpdateOne({'brand_id': brand_id, 'name': values['name']}, {'$set': stamp, '$setOnInsert': values | {'created_at': now()}}, upsert=True)
+
+        resolved = {'customer_id': self.resolver.customer_id(row)}
+        resolved['brand_id'] = row.get('brand_id') or await self.resolver.brand_id(row.get('brand') or '')
+        resolved['model_id'] = row.get('model_id') or await self.resolver.model_id(resolved['brand_id'], row.get('model') or '')
+        values = self._validate(ProductIn, row | resolved)
+        values['lookup'] = product_lookup_keys(values)
+        field = next((f for f in LOOKUP_FIELDS if values['lookup'][f]), None)
+        if field is None:
+            raise RowError('serial_no', 'serial_no, tag_no or actuator.serial_no is required to match the product on re-import')
+        key = {'customer_id': values['customer_id'], f'lookup.{field}': values['lookup'][field]}
+        return UpdateOne(key, {'$set': values | stamp, '$setOnInsert': {'created_at': now()}}, upsert=True)
+
+    @property
+    def target(self) -> str:
+        return {'contacts': 'customer_contacts'}.get(self.kind, self.kind)
+
+
+async def _write(importer: Importer, batch: list[tuple[int, dict]], job_id: ObjectId) -> dict:
+    await importer.prepare(batch)
+    ops, op_rows, errors = [], [], []
+    for number, row in batch:
+        try:
+            ops.append(await importer.operation(row))
+            op_rows.append((number, row))
+        except ValidationError as exc:
+            errors.append({'job_id': job_id, 'row': number, 'errors': _validation_errors(exc), 'values': row})
+        except RowError as exc:
+            errors.append({'job_id': job_id, 'row': number, 'errors': [{'field': exc.field, 'message': str(exc)}], 'values': row})
+    counts = {'inserted': 0, 'updated': 0}
+    if ops:
+        try:
+            result = (await collection(importer.target).bulk_write(ops, ordered=False)).bulk_api_result
+        except BulkWriteError as exc:
+            # Unordered: every other row in the batch was still written.
+            result = exc.details
+            for err in result.get('writeErrors', []):
+                number, row = op_rows[err['index']]
+                errors.append({'job_id': job_id, 'row': number, 'errors': [{'field': '', 'message': err.get('errmsg', 'write failed')}], 'values': row})
+        counts['inserted'] = result.get('nInserted', 0) + result.get('nUpserted', 0)
+        counts['updated'] = result.get('nModified', 0)
+    counts['failed'] = len(errors)
+    if errors:
+        await collection(ERRORS_COLLECTION).insert_many(errors)
+    return counts
+
+
+def _count_rows(path: Path) -> int | None:
+    if path.suffix.lower() in {'.xlsx', '.xlsm'}:
+        wb = engine('openpyxl').load_workbook(path, read_only=True)
+        try:
+            return max((wb.active.max_row or 1) - 1, 0)
+        finally:
+            wb.close()
+    return None
+
+
+async def run_import(job_id: ObjectId, path: Path, kind: str, create_missing: bool = True, resume: dict | None = None):
+    """Import the spooled file; `resume` is the job document of an interrupted run to continue after its last batch."""
+    jobs = collection(JOBS_COLLECTION)
+    resume = resume or {}
+    totals = {key: resume.get(key, 0) for key in TOTAL_FIELDS}
+    # Spreadsheet row number of the last batch whose counts were saved; earlier rows are done.
+    done_row = resume.get('done_row', 0)
+    importer = Importer(kind, create_missing)
+    try:
+        if resume:
+            # Errors of a batch that was written but not counted before the worker died are reported again.
+            await collection(ERRORS_COLLECTION).delete_many({'job_id': job_id, 'row': {'$gt': done_row}})
+        if not resume.get('started_at'):
+            await jobs.update_one({'_id': job_id}, {'$set': {'status': 'running', 'started_at': now(), 'total_rows': await asyncio.to_thread(_count_rows, path)}})
+        rows = read_rows(path)
+        while batch := await asyncio.to_thread(_next_batch, rows):
+            batch = [item for item in batch if item[0] > done_row]
+            if not batch:
+                continue
+            counts = await _write(importer, batch, job_id)
+            totals['processed'] += len(batch)
+            for key, value in counts.items():
+                totals[key] += value
+            done_row = batch[-1][0]
+            await jobs.update_one({'_id': job_id}, {'$set': totals | {'done_row': done_row, 'updated_at': now()}})
+        status, error = 'completed', None
+    except Exception as exc:
+        logger.exception('import job %s failed', job_id)
+        status, error = 'failed', str(exc)
+    finally:
+        path.unlink(missing_ok=True)
+    for name in sorted(importer.resolver.catalog_changed | ({importer.kind} if importer.kind in {'brands', 'models'} else set())):
+        await bump_collection_version(name)
+    await jobs.update_one({'_id': job_id}, {'$set': totals | {'status': status, 'error': error, 'finished_at': now(), 'updated_at': now()}})
+
+
+async def start_import(kind: str, file_name: str, source, create_missing: bool = True) -> str:
+    """Spool the upload to disk, record a queued job and process it in the background."""
+    IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    job = {'kind': kind, 'file_name': file_name, 'status': 'queued', 'create_missing': create_missing, 'processed': 0, 'created_at': now(), 'updated_at': now()}
+    job_id = (await collection(JOBS_COLLECTION).insert_one(job)).inserted_id
+    path = IMPORT_DIR / f'{job_id}{Path(file_name).suffix.lower()}'
+    with path.open('wb') as out:
+        while chunk := await source.read(1024 * 1024):
+            out.write(chunk)
+    _spawn(run_import(job_id, path, kind, create_missing))
+    return str(job_id)
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _running.add(task)
+    task.add_done_callback(_running.discard)
+
+
+async def resume_stale_imports() -> int:
+    """Pick up jobs whose worker stopped updating them; returns how many were resumed.
+
+    Every batch refreshes the job's updated_at, so a queued or running job
+    untouched for `import_stale_seconds` lost its worker. It continues after
+    its last counted batch (rows are upserts, so a batch written twice is
+    harmless) if the spooled file is on this node's disk; otherwise, or after
+    MAX_RESUMES attempts, it is marked failed so the user uploads it again.
+    """
+    jobs = collection(JOBS_COLLECTION)
+    resumed = 0
+    while True:
+        cutoff = now() - timedelta(seconds=settings.import_stale_seconds)
+        # Claimed by bumping updated_at, so another worker's sweep skips it.
+        doc = await jobs.find_one_and_update(
+            {'status': {'$in': ['queued', 'running']}, 'updated_at': {'$lt': cutoff}},
+            {'$set': {'status': 'running', 'updated_at': now()}, '$inc': {'resumes': 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            return resumed
+        path = IMPORT_DIR / f"{doc['_id']}{Path(doc['file_name']).suffix.lower()}"
+        if doc['resumes'] > MAX_RESUMES or not path.exists():
+            error = 'interrupted too many times' if path.exists() else 'interrupted and the uploaded file is gone; upload it again'
+            path.unlink(missing_ok=True)
+            await jobs.update_one({'_id': doc['_id']}, {'$set': {'status': 'failed', 'error': error, 'finished_at': now(), 'updated_at': now()}})
+            continue
+        logger.warning('resuming import job %s after row %s', doc['_id'], doc.get('done_row', 0))
+        _spawn(run_import(doc['_id'], path, doc['kind'], doc.get('create_missing', True), resume=doc))
+        resumed += 1
+
+
+async def run_stale_import_sweeper():
+    """Background loop started by the app when IMPORT_STALE_SECONDS > 0."""
+    while True:
+        try:
+            await resume_stale_imports()
+        except Exception:
+            logger.exception('resuming stale import jobs failed')
+        await asyncio.sleep(settings.import_stale_seconds / 2)
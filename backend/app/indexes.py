@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from .config import settings
+from .db import collection
+
+INDEXES: dict[str, list[IndexModel]] = {
+    'customer_contacts': [IndexModel([('customer_id', ASCENDING)])],
+    'exports': [IndexModel([('report_id', ASCENDING), ('type', ASCENDING), ('source_stamp', ASCENDING)])],
+    'idempotency_keys': [IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0)],
+    'import_job_errors': [IndexModel([('job_id', ASCENDING), ('row', ASCENDING)])],
+    'import_jobs': [IndexModel([('status', ASCENDING), ('updated_at', ASCENDING)])],
+    'products': [
+        IndexModel([('customer_id', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('lookup.serial_no', ASCENDING)]),
+        IndexModel([('lookup.tag_no', ASCENDING)]),
+        IndexModel([('lookup.actuator_serial_no', ASCENDING)]),
+    ],
+    'profiles': [
+        IndexModel([('created_at', ASCENDING)], expireAfterSeconds=settings.profile_retention_days * 86400),
+        IndexModel([('route', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('request_id', ASCENDING)]),
+    ],
+    'report_search': [
+        IndexModel([('terms', ASCENDING), ('_id', DESCENDING)]),
+        IndexModel([('synced_at', ASCENDING)]),
+    ],
+    'report_summaries': [
+        IndexModel([('created_at', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('customer_id', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('issuer_id', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('synced_at', ASCENDING)]),
+    ],
+    'reports': [
+        IndexModel([('products.product_id', ASCENDING), ('created_at', DESCENDING)]),
+    ],
+    'slow_queries': [
+        IndexModel([('ts', DESCENDING)]),
+        IndexModel([('shape_id', ASCENDING), ('ts', DESCENDING)]),
+    ],
+}
+
+
+async def ensure_indexes():
+    for name, models in INDEXES.items():
+        await collection(name).create_indexes(models)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from pymongo.errors import DuplicateKeyError
+
+from .db import collection
+from .metrics import LOCK_ACQUISITIONS, LOCK_HELD_SECONDS, LOCK_LEASES_LOST, LOCK_WAIT_SECONDS
+from .routers.common import now
+
+logger = logging.getLogger(__name__)
+
+LOCKS_COLLECTION = 'locks'
+PROCESS_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}'
+
+
+def source_fingerprint(root: Path) -> str:
+    """Hash of the Python sources under `root`; identifies a deploy when no DEPLOY_ID is set."""
+    digest = hashlib.sha1()
+    for path in sorted(root.rglob('*.py')):
+        digest.update(str(path.relative_to(root)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class LeaseLock:
+    """Mongo-backed lease: one document per lock name in `locks`.
+
+    Whoever holds it renews `expires_at` every ttl/3; a holder that dies
+    loses the lease after `ttl_seconds` and another process can take over.
+    Release stamps `completed_at`, so processes that waited can tell the
+    work they were waiting for has been done. `steps` maps each finished
+    step to the run key (deploy) it finished for.
+    """
+
+    def __init__(self, name: str, ttl_seconds: int):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.owner = PROCESS_ID
+        self.acquired_at: float | None = None
+        self._renewer: asyncio.Task | None = None
+
+    async def try_acquire(self) -> bool:
+        ts = now()
+        try:
+            await collection(LOCKS_COLLECTION).update_one(
+                {'_id': self.name, '$or': [{'expires_at': {'$lte': ts}}, {'owner': self.owner}]},
+                {'$set': {'owner': self.owner, 'acquired_at': ts, 'expires_at': ts + timedelta(seconds=self.ttl_seconds)}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return False  # the document exists and another owner's lease is still live
+        self.acquired_at = time.monotonic()
+        self._renewer = asyncio.create_task(self._renew())
+        return True
+
+    async def state(self) -> dict:
+        return await collection(LOCKS_COLLECTION).find_one({'_id': self.name}) or {}
+
+    async def _renew(self):
+        while True:
+            await asyncio.sleep(self.ttl_seconds / 3)
+            try:
+                result = await collection(LOCKS_COLLECTION).update_one(
+                    {'_id': self.name, 'owner': self.owner}, {'$set': {'expires_at': now() + timedelta(seconds=self.ttl_seconds)}}
+                )
+            except Exception:
+                logger.exception('renewing lock %s failed', self.name)
+                continue
+            if not result.matched_count:
+                LOCK_LEASES_LOST.labels(self.name).inc()
+                logger.error('lock %s lease lost; another process may be running the same work', self.name)
+                return
+
+    async def mark_step(self, step: str, run_key: str):
+        await collection(LOCKS_COLLECTION).update_one({'_id': self.name, 'owner': self.owner}, {'$set': {f'steps.{step}': run_key}})
+
+    async def release(self, completed: bool = True):
+        if self._renewer:
+            self._renewer.cancel()
+            self._renewer = None
+        fields: dict = {'expires_at': now()}
+        if completed:
+            fields['completed_at'] = now()
+        await collection(LOCKS_COLLECTION).update_one({'_id': self.name, 'owner': self.owner}, {'$set': fields})
+        if self.acquired_at is not None:
+            LOCK_HELD_SECONDS.labels(self.name).observe(time.monotonic() - self.acquired_at)
+            self.acquired_at = None
+
+
+async def run_exclusively(
+    name: str, steps, *, ttl_seconds: int, wait_seconds: float, poll_seconds: float = 1.0, run_key: str | None = None
+) -> str:
+    """Run `steps` (async callables, in order) in exactly one process at a time.
+
+    Returns 'ran' if this process ran them, 'skipped' if another process
+    finished them (while this one waited, or earlier for the same
+    `run_key`), or 'timeout' if the holder was still busy after
+    `wait_seconds` (the caller goes on without them). With a `run_key`,
+    each step is recorded when it finishes and is not run again for that
+    key, so workers booting after the first one skip the work and a
+    process taking over a dead holder's lease resumes after its last
+    finished step.
+    """
+    lock = LeaseLock(name, ttl_seconds)
+    started = time.monotonic()
+    holder_acquired_at = None  # the live holder this process is waiting on
+    state: dict = {}
+    while True:
+        if holder_acquired_at is not None:
+            state = await lock.state()
+            if state.get('acquired_at') == holder_acquired_at and state.get('completed_at') and state['completed_at'] >= holder_acquired_at:
+                outcome = 'skipped'
+                break
+        if await lock.try_acquire():
+            outcome = 'ran'
+            break
+        state = await lock.state()
+        holder_acquired_at = state.get('acquired_at')
+        if time.monotonic() - started >= wait_seconds:
+            outcome = 'timeout'
+            break
+        await asyncio.sleep(poll_seconds)
+    LOCK_WAIT_SECONDS.labels(name, outcome).observe(time.monotonic() - started)
+    LOCK_ACQUISITIONS.labels(name, outcome).inc()
+    if outcome != 'ran':
+        logger.info('%s steps %s (held by %s)', name, outcome, state.get('owner'))
+        return outcome
+    completed = False
+    ran = 0
+    try:
+        done = (await lock.state()).get('steps') or {} if run_key else {}
+        for step in steps:
+            if run_key and done.get(step.__name__) == run_key:
+                continue
+            await step()
+            ran += 1
+            if run_key:
+                await lock.mark_step(step.__name__, run_key)
+        completed = True
+    finally:
+        await lock.release(completed=completed)
+    if not ran:
+        logger.info('%s steps already done for %s', name, run_key)
+        return 'skipped'
+    return outcome
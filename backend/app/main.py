@@ -1,17 +1,40 @@
+import asyncio
+import logging
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from .action_library_seed import ensure_action_library_seed
+from .action_suggest import action_library_index, run_action_index_poller
 from .config import settings
-from .routers import action_library, auth, catalog, customers, media, products, reports, settings as settings_router, templates
+from .engines import startup_report, warm_up
+from .importer import run_stale_import_sweeper
+from .indexes import ensure_indexes
+from .locks import run_exclusively, source_fingerprint
+from .report_search import ensure_report_search
+from .report_summaries import ensure_report_summaries
+from .service_summary import ensure_product_service_summary
+from .media_gc import run_periodic_sweeper
+from .metrics import MetricsMiddleware, render_metrics
+from .product_lookup import ensure_product_lookup
+from .profiling import ProfilingMiddleware
+from .report_actions import ensure_final_texts
+from .slow_query_log import ensure_slow_query_log, run_slow_query_drain
+from .responses import MongoJSONResponse
+from .routers import action_library, admin, auth, catalog, customers, imports, media, products, reports, settings as settings_router, templates
+from .static_files import ImmutableStaticFiles
+from .storage import EXPORT_DIR, UPLOAD_DIR, run_pinned_upload_retry, upload_cache
 
-Path('runtime/uploads').mkdir(parents=True, exist_ok=True)
-Path('exports').mkdir(parents=True, exist_ok=True)
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title=settings.app_name)
+STARTUP_LOCK = 'startup'
+STARTUP_CHECKS_LOCK = 'startup-checks'
+# Schema steps run once per deploy: a new build re-runs them, more workers or restarts of it do not.
+STARTUP_RUN_KEY = settings.deploy_id or source_fingerprint(Path(__file__).parent)
+
+app = FastAPI(title=settings.app_name, default_response_class=MongoJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,11 +43,49 @@ app.add_middleware(
     allow_methods=['*'],
     allow_headers=['*'],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event('startup')
 async def startup_seed_data():
-    await ensure_action_library_seed()
+    await run_exclusively(
+        STARTUP_LOCK,
+        [ensure_slow_query_log, ensure_indexes],
+        ttl_seconds=settings.startup_lock_ttl_seconds,
+        wait_seconds=settings.startup_lock_wait_seconds,
+        run_key=STARTUP_RUN_KEY,
+    )
+    # These check their own state (empty or stale read models, an unfinished backfill, a missing
+    # seed) and must look again on every boot, so they are serialized by the lock but never skipped.
+    await run_exclusively(
+        STARTUP_CHECKS_LOCK,
+        [
+            ensure_report_summaries,
+            ensure_report_search,
+            ensure_product_service_summary,
+            ensure_product_lookup,
+            ensure_final_texts,
+            ensure_action_library_seed,
+        ],
+        ttl_seconds=settings.startup_lock_ttl_seconds,
+        wait_seconds=settings.startup_lock_wait_seconds,
+    )
+    # Walks the whole upload tree; done here so the first request does not pay for it on the event loop.
+    await asyncio.to_thread(upload_cache.load)
+    await action_library_index.refresh()
+    app.state.action_index_task = asyncio.create_task(run_action_index_poller())
+    if settings.slow_query_ms > 0:
+        app.state.slow_query_task = asyncio.create_task(run_slow_query_drain())
+    if settings.gc_interval_seconds > 0:
+        app.state.gc_task = asyncio.create_task(run_periodic_sweeper())
+    if settings.upload_retry_interval_seconds > 0:
+        app.state.upload_retry_task = asyncio.create_task(run_pinned_upload_retry())
+    if settings.import_stale_seconds > 0:
+        app.state.import_sweeper_task = asyncio.create_task(run_stale_import_sweeper())
+    if settings.warm_up_engines:
+        app.state.warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up, settings.warm_up_engines))
+    logger.info('startup complete: %s', startup_report())
 
 
 @app.get('/health')
@@ -32,6 +93,12 @@ async def health():
     return {'status': 'ok'}
 
 
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
+
 app.include_router(auth.router)
 app.include_router(customers.router)
 app.include_router(catalog.router)
@@ -41,6 +108,8 @@ app.include_router(templates.router)
 app.include_router(action_library.router)
 app.include_router(media.router)
 app.include_router(settings_router.router)
+app.include_router(admin.router)
+app.include_router(imports.router)
 
-app.mount('/files/uploads', StaticFiles(directory='runtime/uploads'), name='uploads')
-app.mount('/files/exports', StaticFiles(directory='exports'), name='exports')
+app.mount('/files/uploads', ImmutableStaticFiles(directory=UPLOAD_DIR, fetch_missing=upload_cache.get), name='uploads')
+app.mount('/files/exports', StaticFiles(directory=EXPORT_DIR), name='exports')
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from bson import ObjectId
+
+from .config import settings
+from .db import collection
+from .storage import EXPORT_BUCKET, EXPORT_DIR, PHOTO_BUCKET, UPLOAD_DIR, _s3_client, upload_cache
+
+logger = logging.getLogger(__name__)
+
+PHOTO_KEY_FIELDS = ('original_object_key', 'optimized_object_key', 'thumb_object_key')
+SAMPLE_SIZE = 20
+# S3 DeleteObjects accepts at most 1000 keys per call.
+MAX_DELETE_BATCH = 1000
+
+
+def photo_object_keys(photo: dict) -> list[str]:
+    return [photo[field] for field in PHOTO_KEY_FIELDS if photo.get(field)]
+
+
+def _remove_local_files(base: Path, names: list[str]) -> int:
+    removed = 0
+    for name in names:
+        path = base / name
+        try:
+            removed += path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            continue
+    return removed
+
+
+def _delete_minio_objects(bucket: str, keys: list[str]) -> int:
+    client = _s3_client()
+    failed = 0
+    for start in range(0, len(keys), MAX_DELETE_BATCH):
+        batch = keys[start:start + MAX_DELETE_BATCH]
+        result = client.delete_objects(Bucket=bucket, Delete={'Objects': [{'Key': k} for k in batch], 'Quiet': True})
+        failed += len(result.get('Errors', []))
+    return failed
+
+
+async def delete_object_keys(keys: list[str]):
+    """Remove photo objects from local disk and MinIO; MinIO failures are left to the sweeper."""
+    if not keys:
+        return
+    for key in keys:
+        upload_cache.forget(key)
+    await asyncio.to_thread(_remove_local_files, UPLOAD_DIR, keys)
+    try:
+        await asyncio.to_thread(_delete_minio_objects, PHOTO_BUCKET, keys)
+    except Exception:
+        logger.warning('MinIO delete failed for %d objects; the GC sweeper will retry', len(keys))
+
+
+def export_rel_path(doc: dict) -> str | None:
+    # Exports before object storage were written as EXPORT_DIR/<file_name>.
+    return doc.get('object_key') or doc.get('file_name')
+
+
+async def delete_export_files(exports: list[dict]):
+    keys = [doc['object_key'] for doc in exports if doc.get('object_key')]
+    legacy = [doc['file_name'] for doc in exports if not doc.get('object_key') and doc.get('file_name')]
+    # Legacy file names were reused by every export of a report number.
+    still_used = set(await collection('exports').distinct('file_name', {'file_name': {'$in': legacy}, 'object_key': None})) if legacy else set()
+    await asyncio.to_thread(_remove_local_files, EXPORT_DIR, keys + [name for name in legacy if name not in still_used])
+    if keys:
+        try:
+            await asyncio.to_thread(_delete_minio_objects, EXPORT_BUCKET, keys)
+        except Exception:
+            logger.warning('MinIO delete failed for %d exports; the GC sweeper will retry', len(keys))
+
+
+async def _photos_shared_with_other_reports(photo_ids: list[str], report_id: ObjectId) -> set[str]:
+    if not photo_ids:
+        return set()
+    shared: set[str] = set()
+    query = {'_id': {'$ne': report_id}, '$or': [{'photo_sets.before': {'$in': photo_ids}}, {'photo_sets.after': {'$in': photo_ids}}]}
+    async for doc in collection('reports').find(query, {'photo_sets': 1}):
+        sets = doc.get('photo_sets') or {}
+        shared.update(sets.get('before', []) + sets.get('after', []))
+    return shared
+
+
+async def delete_photo_cascade(photo: dict) -> list[ObjectId]:
+    """Delete a photo and unlink it from reports; returns the ids of the reports that changed.
+
+    The caller runs reports_written for them (importing report_events here would be circular).
+    """
+    photo_id = str(photo['_id'])
+    await collection('photos').delete_one({'_id': photo['_id']})
+    # Revisions copy photo_sets, so every report pointing at the photo is updated.
+    linked = {'$or': [{'photo_sets.before': photo_id}, {'photo_sets.after': photo_id}]}
+    report_ids = [doc['_id'] async for doc in collection('reports').find(linked, {'_id': 1})]
+    if report_ids:
+        await collection('reports').update_many(
+            {'_id': {'$in': report_ids}},
+            {'$pull': {'photo_sets.before': photo_id, 'photo_sets.after': photo_id}, '$set': {'updated_at': datetime.now(timezone.utc)}},
+        )
+    await delete_object_keys(photo_object_keys(photo))
+    return report_ids
+
+
+async def delete_report_cascade(report: dict):
+    """Delete a removed report's photos and exports; photos another report still references are kept."""
+    report_id = report['_id']
+    sets = report.get('photo_sets') or {}
+    listed = [ObjectId(x) for x in sets.get('before', []) + sets.get('after', []) if ObjectId.is_valid(x)]
+    photos = [doc async for doc in collection('photos').find({'$or': [{'report_id': str(report_id)}, {'_id': {'$in': listed}}]})]
+    shared = await _photos_shared_with_other_reports([str(p['_id']) for p in photos], report_id)
+    doomed = [p for p in photos if str(p['_id']) not in shared]
+    if doomed:
+        await collection('photos').delete_many({'_id': {'$in': [p['_id'] for p in doomed]}})
+        await delete_object_keys([key for p in doomed for key in photo_object_keys(p)])
+
+    exports = [doc async for doc in collection('exports').find({'report_id': str(report_id)}, {'file_name': 1, 'object_key': 1})]
+    if exports:
+        await collection('exports').delete_many({'_id': {'$in': [e['_id'] for e in exports]}})
+        await delete_export_files(exports)
+
+
+def _list_local_files(base: Path, cutoff: float) -> dict[str, int]:
+    files = {}
+    for path in base.rglob('*'):
+        if path.is_file():
+            stat = path.stat()
+            if stat.st_mtime < cutoff:
+                files[path.relative_to(base).as_posix()] = stat.st_size
+    return files
+
+
+def _list_minio_objects(bucket: str, cutoff: datetime) -> dict[str, int]:
+    objects = {}
+    client = _s3_client()
+    try:
+        for page in client.get_paginator('list_objects_v2').paginate(Bucket=bucket):
+            for obj in page.get('Contents', []):
+                if obj['LastModified'] < cutoff:
+                    objects[obj['Key']] = obj['Size']
+    except client.exceptions.NoSuchBucket:
+        return {}
+    return objects
+
+
+class _RateLimiter:
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self.next_at = 0.0
+
+    async def wait(self):
+        delay = self.next_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.next_at = time.monotonic() + self.interval
+
+
+def _summary(items: dict[str, int]) -> dict:
+    return {'count': len(items), 'bytes': sum(items.values()), 'sample': sorted(items)[:SAMPLE_SIZE]}
+
+
+async def sweep(*, dry_run: bool = True, grace_seconds: int | None = None, batch_size: int | None = None) -> dict:
+    """Find and (unless dry_run) delete photos, objects and export files nothing references.
+
+    Files younger than the grace period are ignored so in-flight uploads and
+    renders are never collected.
+    """
+    grace = settings.gc_grace_seconds if grace_seconds is None else grace_seconds
+    batch = max(1, min(batch_size or settings.gc_batch_size, MAX_DELETE_BATCH))
+    limiter = _RateLimiter(settings.gc_max_batches_per_second)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace)
+    started = time.monotonic()
+
+    report_ids: set[str] = set()
+    referenced_photo_ids: set[str] = set()
+    async for doc in collection('reports').find({}, {'photo_sets': 1}):
+        report_ids.add(str(doc['_id']))
+        sets = doc.get('photo_sets') or {}
+        referenced_photo_ids.update(sets.get('before', []) + sets.get('after', []))
+
+    orphan_photos: list[dict] = []
+    live_keys: set[str] = set()
+    async for photo in collection('photos').find({}, {'report_id': 1, 'created_at': 1, **{f: 1 for f in PHOTO_KEY_FIELDS}}):
+        created = photo.get('created_at')
+        is_old = created is None or created.replace(tzinfo=created.tzinfo or timezone.utc) < cutoff
+        if is_old and photo.get('report_id') not in report_ids and str(photo['_id']) not in referenced_photo_ids:
+            orphan_photos.append(photo)
+        else:
+            live_keys.update(photo_object_keys(photo))
+
+    orphan_exports: list[dict] = []
+    live_export_files: set[str] = set()
+    async for doc in collection('exports').find({}, {'report_id': 1, 'file_name': 1, 'object_key': 1}):
+        if doc.get('report_id') not in report_ids:
+            orphan_exports.append(doc)
+        elif export_rel_path(doc):
+            live_export_files.add(export_rel_path(doc))
+
+    local_uploads = {k: v for k, v in (await asyncio.to_thread(_list_local_files, UPLOAD_DIR, cutoff.timestamp())).items() if k not in live_keys}
+    local_exports = {k: v for k, v in (await asyncio.to_thread(_list_local_files, EXPORT_DIR, cutoff.timestamp())).items() if k not in live_export_files}
+    errors: list[str] = []
+    minio_objects: dict[str, int] = {}
+    minio_exports: dict[str, int] = {}
+    try:
+        minio_objects = {k: v for k, v in (await asyncio.to_thread(_list_minio_objects, PHOTO_BUCKET, cutoff)).items() if k not in live_keys}
+        minio_exports = {k: v for k, v in (await asyncio.to_thread(_list_minio_objects, EXPORT_BUCKET, cutoff)).items() if k not in live_export_files}
+    except Exception as exc:
+        errors.append(f'minio listing failed: {exc}')
+
+    result = {
+        'dry_run': dry_run,
+        'grace_seconds': grace,
+        'orphan_photo_docs': {'count': len(orphan_photos), 'sample': [str(p['_id']) for p in orphan_photos[:SAMPLE_SIZE]]},
+        'orphan_export_docs': {'count': len(orphan_exports), 'sample': [str(e['_id']) for e in orphan_exports[:SAMPLE_SIZE]]},
+        'local_uploads': _summary(local_uploads),
+        'local_exports': _summary(local_exports),
+        'minio_objects': _summary(minio_objects),
+        'minio_exports': _summary(minio_exports),
+        'errors': errors,
+    }
+
+    if not dry_run:
+        docs_deleted = 0
+        for docs, name in ((orphan_photos, 'photos'), (orphan_exports, 'exports')):
+            for start in range(0, len(docs), batch):
+                await limiter.wait()
+                deleted = await collection(name).delete_many({'_id': {'$in': [d['_id'] for d in docs[start:start + batch]]}})
+                docs_deleted += deleted.deleted_count
+        for base, names in ((UPLOAD_DIR, sorted(local_uploads)), (EXPORT_DIR, sorted(local_exports))):
+            for start in range(0, len(names), batch):
+                await limiter.wait()
+                if base == UPLOAD_DIR:
+                    for key in names[start:start + batch]:
+                        upload_cache.forget(key)
+                await asyncio.to_thread(_remove_local_files, base, names[start:start + batch])
+        minio_failed = 0
+        for bucket, objects in ((PHOTO_BUCKET, minio_objects), (EXPORT_BUCKET, minio_exports)):
+            keys = sorted(objects)
+            for start in range(0, len(keys), batch):
+                await limiter.wait()
+                try:
+                    minio_failed += await asyncio.to_thread(_delete_minio_objects, bucket, keys[start:start + batch])
+                except Exception as exc:
+                    errors.append(f'minio delete failed: {exc}')
+                    break
+        result['deleted'] = {'documents': docs_deleted, 'minio_failed': minio_failed}
+
+    result['duration_seconds'] = round(time.monotonic() - started, 3)
+    return result
+
+
+async def run_periodic_sweeper():
+    """Background loop started by the app when GC_INTERVAL_SECONDS > 0."""
+    while True:
+        await asyncio.sleep(settings.gc_interval_seconds)
+        try:
+            result = await sweep(dry_run=settings.gc_dry_run)
+            logger.info('media gc sweep: %s', result)
+        except Exception:
+            logger.exception('media gc sweep failed')
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from pymongo import monitoring
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+SIZE_BUCKETS = tuple(2**n * 1024 for n in range(4, 16, 2))  # 16 KiB .. 16 MiB
+UNMATCHED_ROUTE = '<unmatched>'
+
+HTTP_REQUEST_SECONDS = Histogram('http_request_duration_seconds', 'HTTP request latency by route template.', ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests being handled.', ['method', 'route'], multiprocess_mode='livesum')
+MONGO_COMMAND_SECONDS = Histogram('mongo_command_duration_seconds', 'MongoDB command latency.', ['collection', 'command'], buckets=MONGO_BUCKETS)
+MONGO_COMMAND_FAILURES = Counter('mongo_command_failures_total', 'MongoDB commands that failed.', ['collection', 'command'])
+MONGO_SLOW_COMMANDS = Counter('mongo_slow_commands_total', 'MongoDB commands over SLOW_QUERY_MS.', ['collection', 'command'])
+PHOTO_STAGE_SECONDS = Histogram('photo_pipeline_stage_seconds', 'Photo upload pipeline stage latency.', ['stage'], buckets=LATENCY_BUCKETS)
+EXPORT_RENDER_SECONDS = Histogram('export_render_duration_seconds', 'Export render and upload time.', ['type'], buckets=LATENCY_BUCKETS)
+EXPORT_SIZE_BYTES = Histogram('export_size_bytes', 'Rendered export size.', ['type'], buckets=SIZE_BUCKETS)
+EXPORT_FAILURES = Counter('export_failures_total', 'Exports that failed to render.', ['type'])
+EXPORT_REUSED = Counter('export_reused_total', 'Exports served from an earlier render of the same report state, by caller (request, speculative).', ['type', 'caller'])
+MINIO_UPLOAD_SECONDS = Histogram('minio_upload_duration_seconds', 'MinIO upload call latency.', ['bucket', 'operation'], buckets=LATENCY_BUCKETS)
+RESPONSE_CACHE_REQUESTS = Counter('response_cache_requests_total', 'Response cache lookups by result (local_hit, redis_hit, miss).', ['tag', 'result'])
+RESPONSE_CACHE_REDIS_ERRORS = Counter('response_cache_redis_errors_total', 'Redis calls from the response cache that failed.')
+IDEMPOTENCY_REQUESTS = Counter('idempotency_requests_total', 'Requests with an Idempotency-Key by outcome (new, replayed, waited, in_progress, conflict).', ['route', 'outcome'])
+LOCK_WAIT_SECONDS = Histogram('lock_wait_seconds', 'Time spent waiting for a lease lock, by outcome.', ['lock', 'outcome'], buckets=LATENCY_BUCKETS + (60, 120, 300))
+LOCK_HELD_SECONDS = Histogram('lock_held_seconds', 'Time a lease lock was held.', ['lock'], buckets=LATENCY_BUCKETS + (60, 120, 300))
+LOCK_ACQUISITIONS = Counter('lock_acquisitions_total', 'Lease lock attempts by outcome (ran, skipped, timeout).', ['lock', 'outcome'])
+LOCK_LEASES_LOST = Counter('lock_leases_lost_total', 'Leases that expired or were taken over while held.', ['lock'])
+MINIO_UPLOAD_FAILURES = Counter('minio_upload_failures_total', 'MinIO upload calls that failed.', ['bucket', 'operation'])
+
+
+def route_template(app, scope) -> str:
+    """Path template of the route `scope` will hit, so ids do not explode label cardinality."""
+    partial = UNMATCHED_ROUTE
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', UNMATCHED_ROUTE)
+        if match == Match.PARTIAL and partial == UNMATCHED_ROUTE:
+            partial = getattr(route, 'path', UNMATCHED_ROUTE)  # path matched, method did not (405)
+    return partial
+
+
+class MetricsMiddleware:
+    """Per-route latency histogram and in-flight gauge; plain ASGI to keep the overhead small."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method = scope['method']
+        route = route_template(scope['app'], scope)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command latency by collection/operation, fed by the driver's command events."""
+
+    def __init__(self):
+        # Succeeded/failed events do not carry the command, so the collection is kept from `started`.
+        self._pending: dict[tuple, str] = {}
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            target = event.command.get('collection', '')  # getMore carries the cursor id instead
+        self._pending[self._key(event)] = target if isinstance(target, str) else ''
+
+    def succeeded(self, event):
+        collection = self._pending.pop(self._key(event), '')
+        MONGO_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        collection = self._pending.pop(self._key(event), '')
+        MONGO_COMMAND_SECONDS.labels(collection, event.command_name).observe(event.duration_micros / 1e6)
+        MONGO_COMMAND_FAILURES.labels(collection, event.command_name).inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    # Under several worker processes each one writes to PROMETHEUS_MULTIPROC_DIR and the scrape merges them.
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+
+from bson import ObjectId
+
+from .config import settings
+from .db import collection
+from .exports import create_export
+from .media_gc import delete_export_files
+from .schemas import ExcelExportOptionsIn, ExportOptionsIn
+
+logger = logging.getLogger(__name__)
+
+# Added to the render thread's nice value so pre-renders yield the CPU to request work.
+PRERENDER_NICENESS = 10
+
+
+def prerender_set() -> list[tuple[str, ExportOptionsIn | ExcelExportOptionsIn]]:
+    """(export_type, options) pairs from PRERENDER_EXPORTS; entries are export options plus 'type'."""
+    pairs = []
+    for entry in settings.prerender_exports:
+        options = {k: v for k, v in entry.items() if k != 'type'}
+        export_type = entry['type']
+        if export_type == 'pdf':
+            pairs.append((export_type, ExportOptionsIn(**options)))
+        else:
+            pairs.append((export_type, ExcelExportOptionsIn(type=export_type.removeprefix('excel_'), **options)))
+    return pairs
+
+
+def _lower_priority():
+    # Linux keeps a nice value per thread; elsewhere the render thread runs at normal priority.
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), os.getpriority(os.PRIO_PROCESS, 0) + PRERENDER_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+class Prerenderer:
+    """Render the configured export set for reports in a pre-render status, in the background.
+
+    Reports are queued after each write and rendered one at a time on a
+    single low-priority thread, `prerender_delay_seconds` after the last
+    write so a burst of edits renders once. Exports already rendered from
+    the same report state are reused by create_export, so only reports that
+    changed are rendered again. Pre-renders of an older state that nobody
+    downloaded are deleted once the new ones exist.
+    """
+
+    def __init__(self):
+        self._pending: dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def schedule(self, report_ids: Iterable[str | ObjectId]):
+        if not settings.prerender_exports or not settings.prerender_statuses:
+            return
+        ids = [ObjectId(x) for x in report_ids]
+        query = {'_id': {'$in': ids}, 'status': {'$in': settings.prerender_statuses}}
+        due = asyncio.get_running_loop().time() + settings.prerender_delay_seconds
+        async for doc in collection('reports').find(query, {'_id': 1}):
+            self._pending[str(doc['_id'])] = due
+        if self._pending:
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._run())
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            report_id, due = min(self._pending.items(), key=lambda item: item[1])
+            if due > loop.time():
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), due - loop.time())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            del self._pending[report_id]
+            try:
+                await self.render(report_id)
+            except Exception:
+                logger.exception('pre-rendering exports for report %s failed', report_id)
+
+    async def render(self, report_id: str):
+        report = await collection('reports').find_one({'_id': ObjectId(report_id)})
+        if not report or report.get('status') not in settings.prerender_statuses:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prerender', initializer=_lower_priority)
+        for export_type, options in prerender_set():
+            export = await create_export(report, export_type, options, speculative=True, executor=self._executor)
+            query = {'report_id': report_id, 'type': export_type, 'options': options.model_dump(), 'speculative': True, 'source_stamp': {'$ne': export['source_stamp']}}
+            stale = []
+            async for doc in collection('exports').find(query, {'_id': 1}):
+                # Re-checked per document: a request may have picked the export up meanwhile.
+                deleted = await collection('exports').find_one_and_delete({'_id': doc['_id'], 'speculative': True}, {'file_name': 1, 'object_key': 1})
+                if deleted:
+                    stale.append(deleted)
+            if stale:
+                await delete_export_files(stale)
+
+
+prerenderer = Prerenderer()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import re
+
+from pymongo import UpdateOne
+
+from .db import collection
+from .service_summary import SUMMARY_COLLECTION
+from .text_search import fold
+
+# lookup.<key> -> path of the raw value on a product document.
+LOOKUP_FIELDS = {
+    'serial_no': ('serial_no',),
+    'tag_no': ('tag_no',),
+    'actuator_serial_no': ('actuator', 'serial_no'),
+}
+_NON_ALNUM = re.compile(r'[^0-9a-z]')
+# Internal search keys, left out of API responses.
+HIDDEN_FIELDS = {'lookup': 0}
+
+
+def normalize_code(value: str | None) -> str:
+    """Scanner- and typist-proof key: case/diacritics folded, separators dropped."""
+    return _NON_ALNUM.sub('', fold(value or ''))
+
+
+def product_lookup_keys(product: dict) -> dict[str, str | None]:
+    keys = {}
+    for key, path in LOOKUP_FIELDS.items():
+        value = product
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        keys[key] = normalize_code(value) or None
+    return keys
+
+
+def _code_filter(codes: list[str], field: str, prefix: bool) -> dict:
+    keys = list(LOOKUP_FIELDS) if field == 'any' else [field]
+    if prefix:
+        return {'$or': [{f'lookup.{key}': {'$regex': f'^{code}'}} for key in keys for code in codes]}
+    return {'$or': [{f'lookup.{key}': {'$in': codes}} for key in keys]}
+
+
+def _lookup_pipeline(match: dict, limit: int) -> list[dict]:
+    return [
+        {'$match': match},
+        {'$limit': limit},
+        {'$set': {'pid': {'$toString': '$_id'}}},
+        {'$lookup': {'from': SUMMARY_COLLECTION, 'localField': 'pid', 'foreignField': '_id', 'as': 'service'}},
+        {'$set': {'service_summary': {'$arrayElemAt': ['$service', 0]}}},
+        {'$set': {'latest_report_id': '$service_summary.last_report_id'}},
+        {'$project': {'pid': 0, 'service': 0, 'service_summary._id': 0, 'lookup': 0}},
+    ]
+
+
+async def find_products(codes: list[str], *, field: str = 'any', prefix: bool = False, limit: int = 20) -> list[dict]:
+    """Products whose normalized serial/tag matches, each with its service summary and latest report id."""
+    codes = [code for code in dict.fromkeys(normalize_code(c) for c in codes) if code]
+    if not codes:
+        return []
+    return await collection('products').aggregate(_lookup_pipeline(_code_filter(codes, field, prefix), limit)).to_list(limit)
+
+
+async def backfill_product_lookup(only_missing: bool = False, batch_size: int = 1000) -> int:
+    query = {'lookup': {'$exists': False}} if only_missing else {}
+    projection = {'serial_no': 1, 'tag_no': 1, 'actuator.serial_no': 1}
+    count = 0
+    ops = []
+    async for product in collection('products').find(query, projection).batch_size(batch_size):
+        ops.append(UpdateOne({'_id': product['_id']}, {'$set': {'lookup': product_lookup_keys(product)}}))
+        if len(ops) >= batch_size:
+            await collection('products').bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        await collection('products').bulk_write(ops, ordered=False)
+        count += len(ops)
+    return count
+
+
+async def ensure_product_lookup():
+    """Fill `lookup` for products written before it existed or inserted outside the API."""
+    if await collection('products').find_one({'lookup': {'$exists': False}}, {'_id': 1}):
+        await backfill_product_lookup(only_missing=True)
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import hmac
+import logging
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from uuid import uuid4
+
+from .config import settings
+from .db import collection
+from .metrics import route_template
+from .routers.common import now
+
+logger = logging.getLogger(__name__)
+
+PROFILES_COLLECTION = 'profiles'
+RUNTIME_SETTINGS_COLLECTION = 'runtime_settings'
+PROFILING_SETTINGS_ID = 'profiling'
+PROFILE_HEADER = b'x-profile-token'
+REQUEST_ID_HEADER = b'x-request-id'
+DEFAULT_CONFIG = {'sample_rate': 0.0, 'routes': [], 'interval_ms': 5}
+CONFIG_REFRESH_SECONDS = 10
+# Leaf frames of threads parked in a wait; such samples are idle time, not work.
+IDLE_LEAVES = {('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get'), ('thread.py', '_worker')}
+
+
+class ProfilingConfig:
+    """Sampling settings kept in `runtime_settings`, so they change without a restart.
+
+    Each process re-reads them at most every CONFIG_REFRESH_SECONDS.
+    """
+
+    def __init__(self):
+        self.values = dict(DEFAULT_CONFIG)
+        self._loaded_at = 0.0
+
+    async def get(self) -> dict:
+        if time.monotonic() - self._loaded_at > CONFIG_REFRESH_SECONDS:
+            self._loaded_at = time.monotonic()
+            try:
+                doc = await collection(RUNTIME_SETTINGS_COLLECTION).find_one({'_id': PROFILING_SETTINGS_ID}) or {}
+                self.values = DEFAULT_CONFIG | {k: doc[k] for k in DEFAULT_CONFIG if k in doc}
+            except Exception:
+                logger.exception('profiling settings refresh failed')
+        return self.values
+
+    async def update(self, values: dict) -> dict:
+        await collection(RUNTIME_SETTINGS_COLLECTION).update_one(
+            {'_id': PROFILING_SETTINGS_ID}, {'$set': values | {'updated_at': now()}}, upsert=True
+        )
+        self.values = DEFAULT_CONFIG | values
+        self._loaded_at = time.monotonic()
+        return self.values
+
+
+profiling_config = ProfilingConfig()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f'{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})'
+
+
+class StackSampler(threading.Thread):
+    """Sample thread stacks every `interval` seconds while one request runs.
+
+    Event-loop samples count only while the request's own coroutine is on the
+    stack (`anchor` is the middleware frame) and are cut at that frame. Busy
+    worker threads are sampled whole under their thread name: that is where
+    renders and image work run via asyncio.to_thread, but a concurrent
+    request's thread work can show up there too.
+    """
+
+    def __init__(self, anchor, interval: float, max_seconds: float):
+        super().__init__(name='request-profiler', daemon=True)
+        self.anchor = anchor
+        self.loop_thread = threading.get_ident()
+        self.interval = interval
+        self.deadline = time.monotonic() + max_seconds
+        self.stacks: Counter[tuple[str, ...]] = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval) and time.monotonic() < self.deadline:
+            self.samples += 1
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                stack = self._loop_stack(frame) if ident == self.loop_thread else self._thread_stack(frame, names.get(ident, str(ident)))
+                if stack:
+                    self.stacks[stack] += 1
+
+    def _loop_stack(self, frame) -> tuple[str, ...] | None:
+        labels = []
+        while frame is not None:
+            if frame is self.anchor:
+                return ('request',) + tuple(reversed(labels))
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        return None
+
+    @staticmethod
+    def _thread_stack(frame, thread_name: str) -> tuple[str, ...] | None:
+        if (Path(frame.f_code.co_filename).name, frame.f_code.co_name) in IDLE_LEAVES:
+            return None
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        return (f'thread {thread_name}',) + tuple(reversed(labels))
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's folded format: `frame;frame;frame count` per line."""
+        return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+
+def to_speedscope(collapsed: str, name: str, interval_ms: float) -> dict:
+    """Convert folded stacks to a speedscope 'sampled' profile weighted in milliseconds."""
+    frames: list[dict] = []
+    frame_index: dict[str, int] = {}
+    samples, weights = [], []
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(' ')
+        indices = []
+        for label in stack.split(';'):
+            if label not in frame_index:
+                frame_index[label] = len(frames)
+                frames.append({'name': label})
+            indices.append(frame_index[label])
+        samples.append(indices)
+        weights.append(int(count) * interval_ms)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': settings.app_name,
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'milliseconds',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights,
+        }],
+    }
+
+
+class ProfilingMiddleware:
+    """Profile a request when it carries X-Profile-Token or is picked by the runtime sample rate.
+
+    The profile is stored in `profiles` under a generated id, returned in the
+    X-Profile-Id response header; the client's X-Request-Id is kept alongside
+    as `request_id` for correlation.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._active = 0
+
+    async def _trigger(self, scope, headers: dict) -> str | None:
+        token = headers.get(PROFILE_HEADER)
+        if token and settings.profiling_token and hmac.compare_digest(token, settings.profiling_token.encode()):
+            return 'header'
+        config = await profiling_config.get()
+        if config['sample_rate'] <= 0 or random.random() >= config['sample_rate']:
+            return None
+        if config['routes'] and route_template(scope['app'], scope) not in config['routes']:
+            return None
+        return 'sample'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope['headers'])
+        trigger = await self._trigger(scope, headers)
+        if trigger is None or self._active >= settings.profiling_max_concurrent:
+            await self.app(scope, receive, send)
+            return
+        # Taken before the next await, so concurrent requests cannot all pass the check above.
+        self._active += 1
+        try:
+            await self._profile(scope, receive, send, headers, trigger)
+        finally:
+            self._active -= 1
+
+    async def _profile(self, scope, receive, send, headers: dict, trigger: str):
+        profile_id = uuid4().hex
+        request_id = headers.get(REQUEST_ID_HEADER, b'').decode('latin-1')[:64] or None
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode('latin-1'))]
+            await send(message)
+
+        interval_ms = (await profiling_config.get())['interval_ms']
+        sampler = StackSampler(sys._getframe(), interval_ms / 1000, settings.profiling_max_seconds)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            duration_ms = (time.perf_counter() - started) * 1000
+            try:
+                await collection(PROFILES_COLLECTION).insert_one({
+                    '_id': profile_id,
+                    'request_id': request_id,
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    'route': route_template(scope['app'], scope),
+                    'status': status,
+                    'trigger': trigger,
+                    'duration_ms': round(duration_ms, 1),
+                    'interval_ms': interval_ms,
+                    'samples': sampler.samples,
+                    'collapsed': sampler.collapsed(),
+                    'created_at': now(),
+                })
+            except Exception:
+                logger.exception('storing profile %s failed', profile_id)
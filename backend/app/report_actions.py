@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import timedelta
+
+from pymongo import UpdateOne
+
+from .db import collection
+from .report_search import sync_report_search
+from .routers.common import now
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = 'migrations'
+FINAL_TEXT_MIGRATION = 'report_action_final_text'
+SAMPLE_SIZE = 20
+# A running backfill checkpoints every batch; one silent for longer than this is presumed dead.
+BACKFILL_LEASE_SECONDS = 300
+# Strong reference so the background backfill is not garbage collected.
+_background: set[asyncio.Task] = set()
+
+
+def compose_final_text(snapshot: str, extension: str) -> str:
+    snap = (snapshot or '').strip()
+    ext = (extension or '').strip()
+    return f"{snap} {ext}".strip() if ext else snap
+
+
+def normalize_actions(actions: list[dict]) -> list[dict]:
+    """Compose final_text_tr/en from snapshot text and manual extension; done once, on write."""
+    normalized: list[dict] = []
+    for item in actions:
+        entry = dict(item)
+        entry['final_text_tr'] = compose_final_text(entry.get('snapshot_text_tr', ''), entry.get('manual_extension_tr', ''))
+        entry['final_text_en'] = compose_final_text(entry.get('snapshot_text_en', ''), entry.get('manual_extension_en', ''))
+        normalized.append(entry)
+    return normalized
+
+
+def _stale(report: dict) -> list[dict] | None:
+    actions = report.get('actions') or []
+    normalized = normalize_actions(actions)
+    return normalized if normalized != actions else None
+
+
+async def backfill_final_texts(batch_size: int = 500, restart: bool = False) -> dict:
+    """Persist composed final texts on reports written before they were stored.
+
+    Progress is checkpointed by _id in `migrations`, so an interrupted run
+    resumes where it stopped. Writes are guarded on updated_at, so a report
+    edited mid-run keeps the newer (already normalized) actions.
+    """
+    migrations = collection(MIGRATIONS_COLLECTION)
+    state = await migrations.find_one({'_id': FINAL_TEXT_MIGRATION}) or {}
+    if restart or state.get('status') == 'completed':
+        state = {}
+    last_id = state.get('last_id')
+    totals = {'scanned': state.get('scanned', 0), 'updated': state.get('updated', 0)}
+    await migrations.update_one(
+        {'_id': FINAL_TEXT_MIGRATION},
+        {'$set': {'status': 'running', 'last_id': last_id, **totals, 'updated_at': now()}, '$setOnInsert': {'started_at': now()}},
+        upsert=True,
+    )
+    while True:
+        query = {'_id': {'$gt': last_id}} if last_id else {}
+        batch = await collection('reports').find(query, {'actions': 1, 'updated_at': 1}).sort('_id', 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        ops = []
+        changed = []
+        for report in batch:
+            normalized = _stale(report)
+            if normalized is not None:
+                ops.append(UpdateOne({'_id': report['_id'], 'updated_at': report.get('updated_at')}, {'$set': {'actions': normalized}}))
+                changed.append(report['_id'])
+        if ops:
+            totals['updated'] += (await collection('reports').bulk_write(ops, ordered=False)).modified_count
+            # Final texts are indexed; the search entries were built from the actions before the rewrite.
+            await sync_report_search(changed)
+        totals['scanned'] += len(batch)
+        last_id = batch[-1]['_id']
+        await migrations.update_one({'_id': FINAL_TEXT_MIGRATION}, {'$set': {'last_id': last_id, **totals, 'updated_at': now()}})
+    await migrations.update_one({'_id': FINAL_TEXT_MIGRATION}, {'$set': {'status': 'completed', 'finished_at': now(), 'updated_at': now()}})
+    return totals
+
+
+async def check_final_texts(batch_size: int = 1000) -> dict:
+    """Count reports whose stored final texts differ from what the write path would store."""
+    scanned = 0
+    stale: list[str] = []
+    async for report in collection('reports').find({'actions.0': {'$exists': True}}, {'actions': 1}).batch_size(batch_size):
+        scanned += 1
+        if _stale(report) is not None:
+            stale.append(str(report['_id']))
+    return {'scanned': scanned, 'stale': len(stale), 'sample': stale[:SAMPLE_SIZE]}
+
+
+async def ensure_final_texts():
+    """Start (or resume) the backfill in the background until it has completed once.
+
+    Runs under the startup lock, so marking the migration running before the
+    task starts keeps a second worker from starting another backfill.
+    """
+    migrations = collection(MIGRATIONS_COLLECTION)
+    live = {'status': 'running', 'updated_at': {'$gt': now() - timedelta(seconds=BACKFILL_LEASE_SECONDS)}}
+    if await migrations.find_one({'_id': FINAL_TEXT_MIGRATION, '$or': [{'status': 'completed'}, live]}, {'_id': 1}):
+        return
+    await migrations.update_one(
+        {'_id': FINAL_TEXT_MIGRATION}, {'$set': {'status': 'running', 'updated_at': now()}, '$setOnInsert': {'started_at': now()}}, upsert=True
+    )
+
+    async def run():
+        try:
+            logger.info('report action final_text backfill: %s', await backfill_final_texts())
+        except Exception:
+            logger.exception('report action final_text backfill failed')
+
+    task = asyncio.create_task(run())
+    _background.add(task)
+    task.add_done_callback(_background.discard)
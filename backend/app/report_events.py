@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from bson import ObjectId
+
+from .db import collection
+from .prerender import prerenderer
+from .report_search import sync_report_search
+from .report_summaries import SUMMARY_COLLECTION, sync_report_summaries
+from .service_summary import refresh_product_summaries
+
+
+def report_product_ids(report: dict | None) -> set[str]:
+    return {p.get('product_id') for p in (report or {}).get('products') or [] if isinstance(p, dict) and p.get('product_id')}
+
+
+async def reports_written(report_ids: Iterable[str | ObjectId], *, product_ids: Iterable[str] = ()):
+    """Run after report inserts/updates; `product_ids` covers products added or removed."""
+    report_ids = list(report_ids)
+    await sync_report_summaries(report_ids)
+    await sync_report_search(report_ids)
+    await refresh_product_summaries(product_ids)
+    await prerenderer.schedule(report_ids)
+
+
+async def report_written(report_id: str, *, product_ids: Iterable[str] = ()):
+    await reports_written([report_id], product_ids=product_ids)
+
+
+async def report_deleted(report_id: str, *, product_ids: Iterable[str] = ()):
+    await collection(SUMMARY_COLLECTION).delete_one({'_id': ObjectId(report_id)})
+    # The report is gone, so this drops its entry and its terms' counts.
+    await sync_report_search([report_id])
+    await refresh_product_summaries(product_ids)
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import math
+from collections import Counter
+from collections.abc import Iterable
+
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from .db import collection
+from .report_summaries import SUMMARY_COLLECTION
+from .routers.common import now
+from .text_search import highlight, terms
+
+SEARCH_COLLECTION = 'report_search'
+# Document frequency per term ({_id: term, df}), kept in step with SEARCH_COLLECTION.
+TERMS_COLLECTION = 'report_search_terms'
+BLOCK_FIELDS = ('complaint', 'problems', 'actions')
+SOURCE_PROJECTION = {
+    'customer_id': 1,
+    'status': 1,
+    'result_notes': 1,
+    'actions.final_text_tr': 1,
+    'actions.final_text_en': 1,
+    **{f'blocks.{name}.text': 1 for name in BLOCK_FIELDS},
+}
+MAX_HIGHLIGHTS = 3
+# Reports scored per query; a query whose rarest term is in more reports ranks the newest of them.
+MAX_CANDIDATES = 2000
+
+
+def report_text_fields(report: dict) -> list[tuple[str, str]]:
+    """(field, text) pairs for every searchable narrative in a report."""
+    fields = []
+    blocks = report.get('blocks') or {}
+    for name in BLOCK_FIELDS:
+        fields.extend((name, item['text']) for item in blocks.get(name) or [] if isinstance(item, dict) and item.get('text'))
+    for action in report.get('actions') or []:
+        if isinstance(action, dict):
+            fields.extend((key, action[key]) for key in ('final_text_tr', 'final_text_en') if action.get(key))
+    if report.get('result_notes'):
+        fields.append(('result_notes', report['result_notes']))
+    return fields
+
+
+def build_search_entry(report: dict) -> dict:
+    counts = Counter(term for _, text in report_text_fields(report) for term in terms(text))
+    return {
+        '_id': report['_id'],
+        'customer_id': report.get('customer_id'),
+        'status': report.get('status'),
+        'terms': sorted(counts),
+        'tf': dict(counts),
+        'length': sum(counts.values()),
+        'synced_at': now(),
+    }
+
+
+async def sync_report_search(report_ids: Iterable[str | ObjectId]):
+    ids = [ObjectId(x) for x in {str(r) for r in report_ids} if ObjectId.is_valid(x)]
+    if not ids:
+        return
+    index = collection(SEARCH_COLLECTION)
+    delta: Counter = Counter()
+    found = set()
+    # One entry at a time: the replaced document is the exact previous state, so concurrent syncs
+    # of the same report cannot count a term change twice.
+    async for report in collection('reports').find({'_id': {'$in': ids}}, SOURCE_PROJECTION):
+        found.add(report['_id'])
+        entry = build_search_entry(report)
+        previous = await index.find_one_and_replace({'_id': report['_id']}, entry, {'terms': 1}, upsert=True)
+        delta.update(entry['terms'])
+        delta.subtract((previous or {}).get('terms', []))
+    for oid in ids:
+        if oid not in found:
+            previous = await index.find_one_and_delete({'_id': oid}, {'terms': 1})
+            delta.subtract((previous or {}).get('terms', []))
+    await _apply_term_delta(delta)
+
+
+async def _apply_term_delta(delta: Counter):
+    changed = {term: n for term, n in delta.items() if n}
+    if not changed:
+        return
+    terms_index = collection(TERMS_COLLECTION)
+    await terms_index.bulk_write([UpdateOne({'_id': term}, {'$inc': {'df': n}}, upsert=True) for term, n in changed.items()], ordered=False)
+    await terms_index.delete_many({'_id': {'$in': [term for term, n in changed.items() if n < 0]}, 'df': {'$lte': 0}})
+
+
+async def rebuild_term_stats():
+    """Recount every term's document frequency from the search index; $out swaps the result in atomically."""
+    pipeline = [{'$unwind': '$terms'}, {'$group': {'_id': '$terms', 'df': {'$sum': 1}}}, {'$out': TERMS_COLLECTION}]
+    async for _ in collection(SEARCH_COLLECTION).aggregate(pipeline):
+        pass
+
+
+async def rebuild_report_search(batch_size: int = 1000) -> int:
+    started = now()
+    count = 0
+    ops = []
+    async for report in collection('reports').find({}, SOURCE_PROJECTION).batch_size(batch_size):
+        ops.append(ReplaceOne({'_id': report['_id']}, build_search_entry(report), upsert=True))
+        if len(ops) >= batch_size:
+            await collection(SEARCH_COLLECTION).bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        await collection(SEARCH_COLLECTION).bulk_write(ops, ordered=False)
+        count += len(ops)
+    await collection(SEARCH_COLLECTION).delete_many({'synced_at': {'$lt': started}})
+    await rebuild_term_stats()
+    return count
+
+
+async def ensure_report_search():
+    if await collection(SEARCH_COLLECTION).estimated_document_count() == 0:
+        if await collection('reports').estimated_document_count() > 0:
+            await rebuild_report_search()
+    elif await collection(TERMS_COLLECTION).estimated_document_count() == 0:
+        await rebuild_term_stats()
+
+
+async def search_reports(q: str, *, filters: dict | None = None, limit: int = 20, offset: int = 0) -> list[dict]:
+    """Rank reports containing every query term by length-normalised tf-idf.
+
+    Document frequencies come from TERMS_COLLECTION in one read. Terms are
+    matched rarest first so the `terms` index scans the smallest posting
+    list, newest first, and at most MAX_CANDIDATES reports are scored.
+    """
+    query_terms = list(dict.fromkeys(terms(q)))
+    if not query_terms:
+        return []
+    filters = filters or {}
+    index = collection(SEARCH_COLLECTION)
+    total = max(await index.estimated_document_count(), 1)
+    df = {doc['_id']: doc['df'] async for doc in collection(TERMS_COLLECTION).find({'_id': {'$in': query_terms}})}
+    if len(df) < len(query_terms):
+        return []
+    ordered = sorted(query_terms, key=df.get)
+    weighted_tf = [{'$multiply': [{'$ifNull': [f'$tf.{term}', 0]}, math.log(1 + total / df[term])]} for term in ordered]
+    pipeline = [
+        {'$match': {'terms': {'$all': ordered}, **filters}},
+        {'$sort': {'_id': -1}},
+        {'$limit': MAX_CANDIDATES},
+        {'$project': {'score': {'$divide': [{'$add': weighted_tf}, {'$sqrt': {'$max': ['$length', 1]}}]}}},
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$skip': offset},
+        {'$limit': limit},
+    ]
+    ranked = [doc async for doc in index.aggregate(pipeline)]
+    if not ranked:
+        return []
+
+    ids = [doc['_id'] for doc in ranked]
+    summaries = {doc['_id']: doc async for doc in collection(SUMMARY_COLLECTION).find({'_id': {'$in': ids}}, {'synced_at': 0, 'products': 0})}
+    sources = {doc['_id']: doc async for doc in collection('reports').find({'_id': {'$in': ids}}, SOURCE_PROJECTION)}
+    wanted = set(query_terms)
+    results = []
+    for doc in ranked:
+        highlights = []
+        for field, text in report_text_fields(sources.get(doc['_id']) or {}):
+            snippet = highlight(text, wanted)
+            if snippet:
+                highlights.append({'field': field, 'snippet': snippet})
+                if len(highlights) >= MAX_HIGHLIGHTS:
+                    break
+        row = summaries.get(doc['_id']) or {'_id': doc['_id']}
+        results.append(row | {'score': round(doc['score'], 4), 'highlights': highlights})
+    return results
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne
+
+from .db import collection
+from .routers.common import now
+
+SUMMARY_COLLECTION = 'report_summaries'
+SUMMARY_FIELDS = (
+    'report_no',
+    'revision_no',
+    'status',
+    'language',
+    'customer_id',
+    'customer_code',
+    'customer_short_name',
+    'customer_name',
+    'contact_id',
+    'issuer_id',
+    'responsible_user',
+    'arrival_date',
+    'shipping_date',
+    'created_at',
+    'updated_at',
+)
+SNAPSHOT_FIELDS = ('brand', 'model', 'serial_no', 'tag_no')
+SOURCE_PROJECTION = {field: 1 for field in SUMMARY_FIELDS} | {'products.product_id': 1, 'products.snapshot_fields': 1}
+
+
+def build_report_summary(report: dict) -> dict:
+    """Compact list-view row: the table columns plus flattened product search keys."""
+    summary = {'_id': report['_id']} | {field: report.get(field) for field in SUMMARY_FIELDS}
+    summary['products'] = [
+        {'product_id': p.get('product_id')} | {field: (p.get('snapshot_fields') or {}).get(field) for field in SNAPSHOT_FIELDS}
+        for p in report.get('products') or []
+        if isinstance(p, dict)
+    ]
+    summary['synced_at'] = now()
+    return summary
+
+
+async def sync_report_summaries(report_ids: Iterable[str | ObjectId]):
+    ids = [ObjectId(x) for x in {str(r) for r in report_ids} if ObjectId.is_valid(x)]
+    if not ids:
+        return
+    ops = []
+    found = set()
+    async for report in collection('reports').find({'_id': {'$in': ids}}, SOURCE_PROJECTION):
+        found.add(report['_id'])
+        ops.append(ReplaceOne({'_id': report['_id']}, build_report_summary(report), upsert=True))
+    ops.extend(DeleteOne({'_id': oid}) for oid in ids if oid not in found)
+    await collection(SUMMARY_COLLECTION).bulk_write(ops, ordered=False)
+
+
+async def rebuild_report_summaries(batch_size: int = 1000) -> int:
+    """Upsert a row for every report, then drop rows whose report no longer exists."""
+    started = now()
+    count = 0
+    ops = []
+    async for report in collection('reports').find({}, SOURCE_PROJECTION).batch_size(batch_size):
+        ops.append(ReplaceOne({'_id': report['_id']}, build_report_summary(report), upsert=True))
+        if len(ops) >= batch_size:
+            await collection(SUMMARY_COLLECTION).bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        await collection(SUMMARY_COLLECTION).bulk_write(ops, ordered=False)
+        count += len(ops)
+    await collection(SUMMARY_COLLECTION).delete_many({'synced_at': {'$lt': started}})
+    return count
+
+
+async def ensure_report_summaries():
+    """Build the read model on first start after upgrading; later writes keep it current."""
+    if await collection(SUMMARY_COLLECTION).estimated_document_count() == 0 and await collection('reports').estimated_document_count() > 0:
+        await rebuild_report_summaries()
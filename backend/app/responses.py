@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from bson import Decimal128, ObjectId
+from fastapi.encoders import decimal_encoder
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return decimal_encoder(value.to_decimal())
+    if isinstance(value, Decimal):
+        return decimal_encoder(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response that serializes raw Mongo documents without `jsonable_encoder`.
+
+    Handlers return an instance directly so FastAPI skips its generic encoder;
+    `ObjectId`, `Decimal128` and datetimes are handled natively by orjson.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,70 @@
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import Response
+
+from app.db import collection
+from app.engines import startup_report
+from app.media_gc import sweep
+from app.profiling import PROFILES_COLLECTION, profiling_config, to_speedscope
+from app.responses import MongoJSONResponse
+from app.schemas import ProfilingConfigIn
+from app.slow_query_log import recent_slow_queries, top_slow_query_shapes
+from app.storage import upload_cache
+
+router = APIRouter(prefix='/api/admin', tags=['admin'])
+
+
+@router.post('/gc/sweep')
+async def gc_sweep(dry_run: bool = True, grace_seconds: int | None = None, batch_size: int | None = None):
+    return await sweep(dry_run=dry_run, grace_seconds=grace_seconds, batch_size=batch_size)
+
+
+@router.get('/storage/cache')
+async def storage_cache_stats():
+    return upload_cache.stats()
+
+
+@router.get('/engines')
+async def engine_stats():
+    return startup_report()
+
+
+@router.get('/slow-queries/top')
+async def slow_query_top(hours: int = Query(default=24, ge=1, le=24 * 30), limit: int = Query(default=20, ge=1, le=200), collection: str | None = None):
+    return await top_slow_query_shapes(hours=hours, limit=limit, collection_name=collection)
+
+
+@router.get('/slow-queries')
+async def slow_query_list(shape_id: str | None = None, limit: int = Query(default=50, ge=1, le=500)):
+    return await recent_slow_queries(shape=shape_id, limit=limit)
+
+
+@router.get('/profiling')
+async def get_profiling_config():
+    return await profiling_config.get()
+
+
+@router.put('/profiling')
+async def update_profiling_config(payload: ProfilingConfigIn):
+    return await profiling_config.update(payload.model_dump())
+
+
+@router.get('/profiles')
+async def list_profiles(route: str | None = None, request_id: str | None = None, limit: int = Query(default=50, ge=1, le=500)):
+    query = {k: v for k, v in (('route', route), ('request_id', request_id)) if v}
+    docs = await collection(PROFILES_COLLECTION).find(query, {'collapsed': 0}).sort('created_at', -1).limit(limit).to_list(limit)
+    return [doc | {'id': doc.pop('_id')} for doc in docs]
+
+
+@router.get('/profiles/{profile_id}')
+async def download_profile(profile_id: str, format: Literal['speedscope', 'collapsed'] = 'speedscope'):
+    doc = await collection(PROFILES_COLLECTION).find_one({'_id': profile_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail='Profile not found')
+    if format == 'collapsed':
+        headers = {'Content-Disposition': f'attachment; filename="{profile_id}.folded"'}
+        return Response(doc['collapsed'], media_type='text/plain; charset=utf-8', headers=headers)
+    name = f"{doc['method']} {doc['path']}"
+    headers = {'Content-Disposition': f'attachment; filename="{profile_id}.speedscope.json"'}
+    return MongoJSONResponse(to_speedscope(doc['collapsed'], name, doc['interval_ms']), headers=headers)
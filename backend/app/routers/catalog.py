@@ -1,21 +1,25 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
 from app.db import collection
+from app.responses import MongoJSONResponse
 from app.schemas import BrandIn, ModelIn
-from .common import normalize_doc, now, parse_id
+from .common import bump_collection_version, cached_json, normalize_doc, now, parse_id
 
 router = APIRouter(prefix='/api', tags=['catalog'])
 
 
 @router.get('/brands')
-async def list_brands():
-    return [normalize_doc(doc) async for doc in collection('brands').find().sort('name', 1)]
+async def list_brands(request: Request):
+    async def load():
+        return [normalize_doc(doc) async for doc in collection('brands').find().sort('name', 1)]
+    return await cached_json(request, 'brands', '', load)
 
 
 @router.post('/brands')
 async def create_brand(payload: BrandIn):
     doc = payload.model_dump() | {'created_at': now(), 'updated_at': now()}
     inserted = await collection('brands').insert_one(doc)
+    await bump_collection_version('brands')
     return {'id': str(inserted.inserted_id)}
 
 
@@ -23,28 +27,33 @@ async def create_brand(payload: BrandIn):
 async def create_model(brand_id: str, payload: ModelIn):
     doc = payload.model_dump() | {'brand_id': brand_id, 'created_at': now(), 'updated_at': now()}
     inserted = await collection('models').insert_one(doc)
+    await bump_collection_version('models')
     return {'id': str(inserted.inserted_id)}
 
 
 
 
 @router.get('/models')
-async def list_models(brand_id: str | None = None):
-    query = {'brand_id': brand_id} if brand_id else {}
-    return [normalize_doc(doc) async for doc in collection('models').find(query).sort('name', 1)]
+async def list_models(request: Request, brand_id: str | None = None):
+    async def load():
+        query = {'brand_id': brand_id} if brand_id else {}
+        return [normalize_doc(doc) async for doc in collection('models').find(query).sort('name', 1)]
+    return await cached_json(request, 'models', brand_id or '', load)
 
 @router.get('/models/{model_id}')
 async def get_model(model_id: str):
-    return normalize_doc(await collection('models').find_one({'_id': parse_id(model_id)}))
+    return MongoJSONResponse(normalize_doc(await collection('models').find_one({'_id': parse_id(model_id)})))
 
 
 @router.put('/models/{model_id}')
 async def update_model(model_id: str, payload: ModelIn):
     await collection('models').update_one({'_id': parse_id(model_id)}, {'$set': payload.model_dump() | {'updated_at': now()}})
+    await bump_collection_version('models')
     return {'ok': True}
 
 
 @router.delete('/models/{model_id}')
 async def delete_model(model_id: str):
     await collection('models').delete_one({'_id': parse_id(model_id)})
+    await bump_collection_version('models')
     return {'ok': True}
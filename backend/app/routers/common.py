@@ -1,7 +1,13 @@
+import hashlib
 from datetime import datetime, timezone
 
 from bson import ObjectId
-from fastapi import HTTPException
+from fastapi import HTTPException, Request, Response
+from pymongo import ReturnDocument
+
+from app.cache import response_cache
+from app.db import collection
+from app.responses import dumps
 
 
 def now():
@@ -19,3 +25,70 @@ def normalize_doc(doc: dict | None):
         return None
     doc['id'] = str(doc.pop('_id'))
     return doc
+
+
+def make_etag(*parts) -> str:
+    raw = '|'.join(str(p) for p in parts)
+    return f'"{hashlib.blake2b(raw.encode(), digest_size=12).hexdigest()}"'
+
+
+def document_etag(doc: dict | None, *extra) -> str | None:
+    """ETag for a single document; documents without `updated_at` are never cached."""
+    if not doc or not doc.get('updated_at'):
+        return None
+    return make_etag(doc['_id'], doc['updated_at'].isoformat(), *extra)
+
+
+def etag_matches(request: Request, etag: str | None) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header or not etag:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in {tag.strip().removeprefix('W/') for tag in header.split(',')}
+
+
+def etag_headers(etag: str | None) -> dict:
+    return {'ETag': etag, 'Cache-Control': 'no-cache'} if etag else {}
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
+
+
+async def collection_version(name: str) -> int:
+    doc = await collection('collection_versions').find_one({'_id': name})
+    return int((doc or {}).get('version') or 0)
+
+
+async def cached_collection_version(name: str) -> int:
+    """collection_version, read through the Redis mirror that bump_collection_version keeps."""
+    version = await response_cache.get_version(name)
+    if version is None:
+        version = await collection_version(name)
+        await response_cache.set_version(name, version)
+    return version
+
+
+async def bump_collection_version(name: str):
+    doc = await collection('collection_versions').find_one_and_update(
+        {'_id': name}, {'$inc': {'version': 1}, '$set': {'updated_at': now()}}, upsert=True, return_document=ReturnDocument.AFTER
+    )
+    await response_cache.set_version(name, int(doc['version']))
+
+
+async def cached_json(request: Request, tag: str, key: str, load) -> Response:
+    """JSON body of `load()` cached per version of collection `tag`, with a matching ETag.
+
+    Handlers that write the collection must call bump_collection_version(tag).
+    """
+    version = await cached_collection_version(tag)
+    etag = make_etag(tag, version, key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    async def render() -> bytes:
+        return dumps(await load())
+
+    body = await response_cache.get_or_load(tag, version, key, render)
+    return Response(body, media_type='application/json', headers=etag_headers(etag))
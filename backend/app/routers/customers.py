@@ -1,13 +1,16 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 
 from app.db import collection
+from app.product_lookup import HIDDEN_FIELDS
+from app.responses import MongoJSONResponse
 from app.schemas import ContactIn, CustomerIn
-from .common import normalize_doc, now, parse_id
+from app.service_summary import SUMMARY_COLLECTION
+from .common import document_etag, etag_headers, etag_matches, normalize_doc, not_modified, now, parse_id
 
 router = APIRouter(prefix='/api', tags=['customers'])
 
 
-async def _next_customer_code() -> int:
+async def next_customer_code() -> int:
     latest = await collection('customers').find_one({'customer_code': {'$type': 'number'}}, sort=[('customer_code', -1)])
     return int((latest or {}).get('customer_code') or 4000) + 1
 
@@ -15,24 +18,94 @@ async def _next_customer_code() -> int:
 @router.get('/customers')
 async def list_customers():
     items = [normalize_doc(doc) async for doc in collection('customers').find().sort('created_at', -1)]
-    return items
+    return MongoJSONResponse(items)
 
 
 @router.post('/customers')
 async def create_customer(payload: CustomerIn):
     values = payload.model_dump()
-    values['customer_code'] = values.get('customer_code') or await _next_customer_code()
+    values['customer_code'] = values.get('customer_code') or await next_customer_code()
     doc = values | {'created_at': now(), 'updated_at': now()}
     inserted = await collection('customers').insert_one(doc)
     return {'id': str(inserted.inserted_id)}
 
 
 @router.get('/customers/{customer_id}')
-async def get_customer(customer_id: str):
-    doc = await collection('customers').find_one({'_id': parse_id(customer_id)})
+async def get_customer(customer_id: str, request: Request):
+    oid = parse_id(customer_id)
+    if request.headers.get('if-none-match'):
+        etag = document_etag(await collection('customers').find_one({'_id': oid}, {'updated_at': 1}))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    doc = await collection('customers').find_one({'_id': oid})
     if not doc:
         raise HTTPException(status_code=404, detail='Customer not found')
-    return normalize_doc(doc)
+    etag = document_etag(doc)
+    return MongoJSONResponse(normalize_doc(doc), headers=etag_headers(etag))
+
+
+def _lookup_name(source: str, field: str, alias: str) -> dict:
+    # Catalog ids are stored as strings on products; convert once so the _id index is used.
+    return {
+        '$lookup': {
+            'from': source,
+            'let': {'ref': {'$convert': {'input': f'${field}', 'to': 'objectId', 'onError': None, 'onNull': None}}},
+            'pipeline': [{'$match': {'$expr': {'$eq': ['$_id', '$$ref']}}}, {'$project': {'name': 1}}],
+            'as': alias,
+        }
+    }
+
+
+def _fleet_pipeline(oid, customer_id: str, skip: int, limit: int) -> list[dict]:
+    product_page = [
+        {'$skip': skip},
+        {'$limit': limit},
+        _lookup_name('brands', 'brand_id', 'brand'),
+        _lookup_name('models', 'model_id', 'model'),
+        {
+            '$lookup': {
+                'from': SUMMARY_COLLECTION,
+                'let': {'pid': {'$toString': '$_id'}},
+                'pipeline': [{'$match': {'$expr': {'$eq': ['$_id', '$$pid']}}}, {'$project': {'_id': 0}}],
+                'as': 'service',
+            }
+        },
+        {'$set': {'brand_name': {'$first': '$brand.name'}, 'model_name': {'$first': '$model.name'}, 'last_service': {'$first': '$service'}}},
+        # Same fields the product endpoints hide (the internal lookup keys).
+        {'$unset': ['brand', 'model', 'service', *HIDDEN_FIELDS]},
+    ]
+    return [
+        {'$match': {'_id': oid}},
+        {'$lookup': {'from': 'customer_contacts', 'pipeline': [{'$match': {'customer_id': customer_id}}], 'as': 'contacts'}},
+        {
+            '$lookup': {
+                'from': 'products',
+                'pipeline': [
+                    {'$match': {'customer_id': customer_id}},
+                    {'$sort': {'_id': 1}},
+                    {'$facet': {'total': [{'$count': 'count'}], 'items': product_page}},
+                ],
+                'as': 'fleet',
+            }
+        },
+    ]
+
+
+@router.get('/customers/{customer_id}/fleet')
+async def customer_fleet(customer_id: str, skip: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Customer, contacts and a page of products with catalog names and last service, in one aggregation."""
+    rows = await collection('customers').aggregate(_fleet_pipeline(parse_id(customer_id), customer_id, skip, limit)).to_list(1)
+    if not rows:
+        raise HTTPException(status_code=404, detail='Customer not found')
+    customer = rows[0]
+    contacts = [normalize_doc(doc) for doc in customer.pop('contacts')]
+    fleet = (customer.pop('fleet') or [{}])[0]
+    total = (fleet.get('total') or [{}])[0].get('count', 0)
+    return MongoJSONResponse({
+        'customer': normalize_doc(customer),
+        'contacts': contacts,
+        'products': {'total': total, 'skip': skip, 'limit': limit, 'items': [normalize_doc(doc) for doc in fleet.get('items', [])]},
+    })
 
 
 @router.put('/customers/{customer_id}')
@@ -50,7 +123,7 @@ async def delete_customer(customer_id: str):
 @router.get('/customers/{customer_id}/contacts')
 async def list_contacts(customer_id: str):
     items = [normalize_doc(doc) async for doc in collection('customer_contacts').find({'customer_id': customer_id})]
-    return items
+    return MongoJSONResponse(items)
 
 
 @router.post('/customers/{customer_id}/contacts')
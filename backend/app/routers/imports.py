@@ -0,0 +1,60 @@
+import csv
+import io
+from pathlib import Path
+
+from fastapi import APIRouter, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from app.db import collection
+from app.importer import ERRORS_COLLECTION, IMPORT_KINDS, JOBS_COLLECTION, start_import
+from app.responses import MongoJSONResponse
+from .common import normalize_doc, parse_id
+
+router = APIRouter(prefix='/api', tags=['imports'])
+
+IMPORT_SUFFIXES = {'.xlsx', '.xlsm', '.csv'}
+
+
+@router.post('/imports/{kind}')
+async def create_import(kind: str, file: UploadFile, create_missing: bool = True):
+    """Queue a background import; `create_missing` adds unknown brands/models instead of rejecting the row."""
+    if kind not in IMPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(IMPORT_KINDS)}")
+    if Path(file.filename or '').suffix.lower() not in IMPORT_SUFFIXES:
+        raise HTTPException(status_code=400, detail='Upload an .xlsx or .csv file')
+    job_id = await start_import(kind, file.filename, file, create_missing=create_missing)
+    return {'id': job_id}
+
+
+@router.get('/imports')
+async def list_imports(limit: int = 50):
+    return MongoJSONResponse([normalize_doc(doc) async for doc in collection(JOBS_COLLECTION).find().sort('created_at', -1).limit(limit)])
+
+
+@router.get('/imports/{job_id}')
+async def get_import(job_id: str):
+    doc = await collection(JOBS_COLLECTION).find_one({'_id': parse_id(job_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail='Import not found')
+    return MongoJSONResponse(normalize_doc(doc))
+
+
+@router.get('/imports/{job_id}/errors')
+async def import_errors(job_id: str, format: str = 'json'):
+    cursor = collection(ERRORS_COLLECTION).find({'job_id': parse_id(job_id)}, {'_id': 0, 'job_id': 0}).sort('row', 1)
+    if format != 'csv':
+        return MongoJSONResponse([doc async for doc in cursor])
+
+    async def rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['row', 'field', 'message'])
+        async for doc in cursor:
+            for err in doc.get('errors', []):
+                writer.writerow([doc['row'], err.get('field'), err.get('message')])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return StreamingResponse(rows(), media_type='text/csv', headers={'Content-Disposition': f'attachment; filename="import-{job_id}-errors.csv"'})
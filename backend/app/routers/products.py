@@ -1,8 +1,13 @@
-from fastapi import APIRouter, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, HTTPException, Query, Request
 
 from app.db import collection
-from app.schemas import ProductIn, ProductOptionUpdateIn, ProductOptionValueIn
-from .common import normalize_doc, now, parse_id
+from app.product_lookup import HIDDEN_FIELDS, find_products, normalize_code, product_lookup_keys
+from app.responses import MongoJSONResponse
+from app.schemas import ProductIdsIn, ProductIn, ProductLookupIn, ProductOptionUpdateIn, ProductOptionValueIn
+from app.service_summary import get_product_summaries
+from .common import bump_collection_version, cached_json, document_etag, etag_headers, etag_matches, normalize_doc, not_modified, now, parse_id
 
 router = APIRouter(prefix='/api', tags=['products'])
 
@@ -16,24 +21,68 @@ async def list_products(customer_id: str | None = None, brand_id: str | None = N
         query['brand_id'] = brand_id
     if model_id:
         query['model_id'] = model_id
-    return [normalize_doc(doc) async for doc in collection('products').find(query)]
+    items = [normalize_doc(doc) async for doc in collection('products').find(query, HIDDEN_FIELDS)]
+    summaries = await get_product_summaries(item['id'] for item in items)
+    for item in items:
+        item['service_summary'] = summaries.get(item['id'])
+    return MongoJSONResponse(items)
+
+
+@router.post('/products/service-summaries')
+async def product_service_summaries(payload: ProductIdsIn):
+    summaries = await get_product_summaries(payload.product_ids)
+    return MongoJSONResponse({product_id: summaries.get(product_id) for product_id in payload.product_ids})
+
+
+@router.get('/products/lookup')
+async def lookup_products(code: str, field: Literal['any', 'serial_no', 'tag_no', 'actuator_serial_no'] = 'any', match: Literal['auto', 'exact', 'prefix'] = 'auto', limit: int = Query(20, ge=1, le=100)):
+    """Scan/typed serial or tag lookup; `auto` tries an exact hit first and falls back to prefix."""
+    items = [] if match == 'prefix' else await find_products([code], field=field, limit=limit)
+    if not items and match != 'exact':
+        items = await find_products([code], field=field, prefix=True, limit=limit)
+    return MongoJSONResponse([normalize_doc(doc) for doc in items])
+
+
+@router.post('/products/lookup')
+async def lookup_products_batch(payload: ProductLookupIn):
+    """Exact lookup for a batch of scanned codes, keyed by the code as sent."""
+    wanted = {code: normalize_code(code) for code in payload.codes}
+    keys = [payload.field] if payload.field != 'any' else None
+    results: dict[str, list] = {code: [] for code in payload.codes}
+    for doc in await find_products(list(wanted.values()), field=payload.field, limit=max(len(wanted), 1) * 10):
+        lookup = product_lookup_keys(doc)
+        values = {lookup[key] for key in keys} if keys else set(lookup.values())
+        item = normalize_doc(doc)
+        for code, normalized in wanted.items():
+            if normalized and normalized in values:
+                results[code].append(item)
+    return MongoJSONResponse(results)
 
 
 @router.post('/products')
 async def create_product(payload: ProductIn):
     doc = payload.model_dump() | {'created_at': now(), 'updated_at': now()}
+    doc['lookup'] = product_lookup_keys(doc)
     inserted = await collection('products').insert_one(doc)
     return {'id': str(inserted.inserted_id)}
 
 
 @router.get('/products/{product_id}')
-async def get_product(product_id: str):
-    return normalize_doc(await collection('products').find_one({'_id': parse_id(product_id)}))
+async def get_product(product_id: str, request: Request):
+    oid = parse_id(product_id)
+    if request.headers.get('if-none-match'):
+        etag = document_etag(await collection('products').find_one({'_id': oid}, {'updated_at': 1}))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    doc = await collection('products').find_one({'_id': oid}, HIDDEN_FIELDS)
+    etag = document_etag(doc)
+    return MongoJSONResponse(normalize_doc(doc), headers=etag_headers(etag))
 
 
 @router.put('/products/{product_id}')
 async def update_product(product_id: str, payload: ProductIn):
-    await collection('products').update_one({'_id': parse_id(product_id)}, {'$set': payload.model_dump() | {'updated_at': now()}})
+    values = payload.model_dump()
+    await collection('products').update_one({'_id': parse_id(product_id)}, {'$set': values | {'lookup': product_lookup_keys(values), 'updated_at': now()}})
     return {'ok': True}
 
 
@@ -92,7 +141,11 @@ def _option_sort_key(field: str, value: str):
 
 
 @router.get('/product-options')
-async def get_product_options():
+async def get_product_options(request: Request):
+    return await cached_json(request, 'product_options', '', _load_product_options)
+
+
+async def _load_product_options() -> dict:
     doc = await collection('settings').find_one({'key': 'product_options'})
     values = doc.get('values', {}) if doc else {}
     merged = {}
@@ -120,6 +173,7 @@ async def add_product_option_value(field: str, payload: ProductOptionValueIn):
         },
         upsert=True,
     )
+    await bump_collection_version('product_options')
     return {'ok': True, 'field': field, 'value': value}
 
 
@@ -141,6 +195,7 @@ async def update_product_option_value(field: str, payload: ProductOptionUpdateIn
         },
         upsert=True,
     )
+    await bump_collection_version('product_options')
     return {'ok': True, 'field': field, 'old_value': old_value, 'new_value': new_value}
 
 
@@ -156,4 +211,5 @@ async def delete_product_option_value(field: str, value: str):
         {'$pull': {f'values.{field}': normalized}, '$set': {'updated_at': now()}},
         upsert=True,
     )
+    await bump_collection_version('product_options')
     return {'ok': True, 'field': field, 'value': normalized}
@@ -1,30 +1,30 @@
 from datetime import datetime
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Query, Request
+from pymongo import UpdateOne
 
 from app.db import collection
-from app.schemas import ReportIn
-from .common import normalize_doc, now, parse_id
+from app.idempotency import idempotent
+from app.media_gc import delete_report_cascade
+from app.report_actions import normalize_actions
+from app.report_events import report_deleted, report_product_ids, report_written, reports_written
+from app.report_search import search_reports
+from app.report_summaries import SUMMARY_COLLECTION
+from app.responses import MongoJSONResponse
+from app.service_summary import get_product_summaries
+from app.schemas import ReportIn, ReportStatusBulkIn
+from .common import document_etag, etag_headers, etag_matches, normalize_doc, not_modified, now, parse_id
 
 router = APIRouter(prefix='/api', tags=['reports'])
 
 STATUS_FLOW = ['draft', 'pre_report', 'quotation_sent', 'awaiting_approval', 'approved', 'in_service', 'final_report', 'archived']
 
 
-def _compose_final_text(snapshot: str, extension: str) -> str:
-    snap = (snapshot or '').strip()
-    ext = (extension or '').strip()
-    return f"{snap} {ext}".strip() if ext else snap
-
-
-def _normalize_actions(actions: list[dict]) -> list[dict]:
-    normalized: list[dict] = []
-    for item in actions:
-        entry = dict(item)
-        entry['final_text_tr'] = _compose_final_text(entry.get('snapshot_text_tr', ''), entry.get('manual_extension_tr', ''))
-        entry['final_text_en'] = _compose_final_text(entry.get('snapshot_text_en', ''), entry.get('manual_extension_en', ''))
-        normalized.append(entry)
-    return normalized
+def _report_etag(doc: dict | None) -> str | None:
+    exports = (doc or {}).get('exports') or {}
+    return document_etag(doc, *sorted(f"{key}:{(value or {}).get('generated_at')}" for key, value in exports.items()))
 
 
 def generate_report_no(ts: datetime):
@@ -36,6 +36,9 @@ def status_meta(current_status: str):
     return {'current_stage': current_status, 'next_allowed': STATUS_FLOW[idx + 1] if idx < len(STATUS_FLOW) - 1 else None, 'timeline': STATUS_FLOW}
 
 
+STATUS_META_BY_STAGE = {stage: status_meta(stage) for stage in STATUS_FLOW}
+
+
 async def _load_customer_snapshot(customer_id: str | None) -> dict:
     if not customer_id:
         return {'customer_code': None, 'customer_short_name': '', 'customer_name': ''}
@@ -69,7 +72,11 @@ async def list_reports(
     status_bucket: str | None = None,
     sort_by: str | None = None,
     sort_order: str | None = None,
+    view: Literal['summary', 'full'] = 'summary',
 ):
+    # List views read the compact report_summaries projection unless full documents are asked for.
+    summary_view = view == 'summary'
+    snap = 'products.' if summary_view else 'products.snapshot_fields.'
     query = {}
     if customer_id:
         query['customer_id'] = customer_id
@@ -88,13 +95,13 @@ async def list_reports(
         if date_to:
             query['created_at']['$lte'] = datetime.fromisoformat(date_to)
     if brand:
-        query['products.snapshot_fields.brand'] = {'$regex': brand, '$options': 'i'}
+        query[f'{snap}brand'] = {'$regex': brand, '$options': 'i'}
     if model:
-        query['products.snapshot_fields.model'] = {'$regex': model, '$options': 'i'}
+        query[f'{snap}model'] = {'$regex': model, '$options': 'i'}
     if serial_no:
-        query['products.snapshot_fields.serial_no'] = {'$regex': serial_no, '$options': 'i'}
+        query[f'{snap}serial_no'] = {'$regex': serial_no, '$options': 'i'}
     if tag_no:
-        query['products.snapshot_fields.tag_no'] = {'$regex': tag_no, '$options': 'i'}
+        query[f'{snap}tag_no'] = {'$regex': tag_no, '$options': 'i'}
 
     if status_bucket == 'pending':
         query['status'] = {'$nin': ['final_report', 'archived']}
@@ -104,19 +111,23 @@ async def list_reports(
     if search_type and search_value:
         sv = search_value.strip()
         if search_type == 'tag_no':
-            query['products.snapshot_fields.tag_no'] = {'$regex': sv, '$options': 'i'}
+            query[f'{snap}tag_no'] = {'$regex': sv, '$options': 'i'}
         elif search_type == 'serial_no':
-            query['products.snapshot_fields.serial_no'] = {'$regex': sv, '$options': 'i'}
+            query[f'{snap}serial_no'] = {'$regex': sv, '$options': 'i'}
         elif search_type == 'model_no':
-            query['products.snapshot_fields.model'] = {'$regex': sv, '$options': 'i'}
+            query[f'{snap}model'] = {'$regex': sv, '$options': 'i'}
         elif search_type == 'customer_no' and sv.isdigit():
             query['customer_code'] = int(sv)
 
     items = []
-    async for doc in collection('reports').find(query).sort('created_at', -1):
-        doc['status_meta'] = status_meta(doc.get('status', 'draft'))
-        doc['actions'] = _normalize_actions(doc.get('actions', []))
-        items.append(normalize_doc(doc))
+    if summary_view:
+        async for doc in collection(SUMMARY_COLLECTION).find(query, {'synced_at': 0}).sort('created_at', -1):
+            doc['status_meta'] = STATUS_META_BY_STAGE.get(doc.get('status'), STATUS_META_BY_STAGE['draft'])
+            items.append(normalize_doc(doc))
+    else:
+        async for doc in collection('reports').find(query).sort('created_at', -1):
+            doc['status_meta'] = status_meta(doc.get('status', 'draft'))
+            items.append(normalize_doc(doc))
 
     reverse = (sort_order or 'asc').lower() == 'desc'
     if sort_by == 'customer_short_name':
@@ -128,15 +139,30 @@ async def list_reports(
     elif sort_by == 'shipping_date':
         items.sort(key=lambda x: str(x.get('shipping_date') or ''), reverse=reverse)
 
-    return items
+    return MongoJSONResponse(items)
+
+
+@router.get('/reports/search')
+async def search_report_texts(q: str, customer_id: str | None = None, status: str | None = None, limit: int = Query(20, ge=1, le=100), offset: int = Query(0, ge=0)):
+    filters = {}
+    if customer_id:
+        filters['customer_id'] = customer_id
+    if status:
+        filters['status'] = status
+    items = await search_reports(q, filters=filters, limit=limit, offset=offset)
+    return MongoJSONResponse([normalize_doc(doc) for doc in items])
 
 
 @router.post('/reports')
-async def create_report(payload: ReportIn):
+async def create_report(payload: ReportIn, request: Request):
+    return await idempotent(request, lambda: _create_report(payload), payload.model_dump(mode='json'))
+
+
+async def _create_report(payload: ReportIn) -> dict:
     ts = now()
     values = payload.model_dump()
     values |= await _load_customer_snapshot(values.get('customer_id'))
-    values['actions'] = _normalize_actions(values.get('actions', []))
+    values['actions'] = normalize_actions(values.get('actions', []))
     doc = values | {
         'report_no': generate_report_no(ts),
         'exports': {},
@@ -148,59 +174,128 @@ async def create_report(payload: ReportIn):
         'updated_by': payload.responsible_user,
     }
     inserted = await collection('reports').insert_one(doc)
+    await report_written(str(inserted.inserted_id), product_ids=report_product_ids(doc))
     return {'id': str(inserted.inserted_id), 'report_no': doc['report_no'], 'status_meta': status_meta(doc['status'])}
 
 
 @router.get('/reports/{report_id}')
-async def get_report(report_id: str):
-    doc = await collection('reports').find_one({'_id': parse_id(report_id)})
+async def get_report(report_id: str, request: Request):
+    oid = parse_id(report_id)
+    if request.headers.get('if-none-match'):
+        head = await collection('reports').find_one({'_id': oid}, {'updated_at': 1, 'exports': 1})
+        etag = _report_etag(head)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+    doc = await collection('reports').find_one({'_id': oid})
     if not doc:
         raise HTTPException(status_code=404, detail='Report not found')
+    etag = _report_etag(doc)
     doc['status_meta'] = status_meta(doc.get('status', 'draft'))
-    doc['actions'] = _normalize_actions(doc.get('actions', []))
-    return normalize_doc(doc)
+    return MongoJSONResponse(normalize_doc(doc), headers=etag_headers(etag))
 
 
 @router.put('/reports/{report_id}')
 async def update_report(report_id: str, payload: ReportIn):
     base = payload.model_dump()
     base |= await _load_customer_snapshot(base.get('customer_id'))
-    base['actions'] = _normalize_actions(base.get('actions', []))
+    base['actions'] = normalize_actions(base.get('actions', []))
     values = base | {'updated_at': now(), 'updated_by': payload.responsible_user}
-    await collection('reports').update_one({'_id': parse_id(report_id)}, {'$set': values})
+    previous = await collection('reports').find_one_and_update({'_id': parse_id(report_id)}, {'$set': values}, projection={'products': 1})
+    if previous:
+        await report_written(report_id, product_ids=report_product_ids(previous) | report_product_ids(values))
     return {'ok': True}
 
 
 @router.delete('/reports/{report_id}')
 async def delete_report(report_id: str):
-    await collection('reports').delete_one({'_id': parse_id(report_id)})
+    report = await collection('reports').find_one({'_id': parse_id(report_id)}, {'photo_sets': 1, 'products': 1})
+    if report:
+        await collection('reports').delete_one({'_id': report['_id']})
+        await delete_report_cascade(report)
+        await report_deleted(report_id, product_ids=report_product_ids(report))
     return {'ok': True}
 
 
+TRANSITION_PROJECTION = {'status': 1, 'actions': 1, 'blocks.actions': 1, 'photo_sets.after': 1, 'products.product_id': 1}
+
+
+def _transition_error(report: dict, status: str) -> str | None:
+    has_actions = bool(report.get('actions') or report.get('blocks', {}).get('actions'))
+    if status == 'final_report' and (not has_actions or not report.get('photo_sets', {}).get('after')):
+        return 'Final report requires actions and after photos'
+    current = report.get('status', 'draft')
+    current_idx = STATUS_FLOW.index(current) if current in STATUS_FLOW else 0
+    if STATUS_FLOW.index(status) > current_idx + 1:
+        return 'Can only move to next stage'
+    return None
+
+
+def _transition_update(report: dict, status: str, user: str, ts: datetime) -> dict:
+    return {
+        '$set': {'status': status, 'updated_at': ts, 'updated_by': user},
+        '$push': {'audit_log': {'ts': ts, 'user': user, 'action': 'status_change', 'diff_summary': f"{report.get('status', 'draft')}->{status}"}},
+    }
+
+
+@router.post('/reports/bulk-status')
+async def bulk_transition_status(payload: ReportStatusBulkIn):
+    """Move many reports to one status: one read, in-memory checks, one bulk_write.
+
+    Each write is guarded on the status that was validated, so a report changed
+    concurrently is reported as a conflict instead of skipping a stage.
+    """
+    if payload.status not in STATUS_FLOW:
+        raise HTTPException(status_code=400, detail='Invalid status')
+    requested = list(dict.fromkeys(payload.report_ids))
+    oids = [ObjectId(x) for x in requested if ObjectId.is_valid(x)]
+    reports = {str(doc['_id']): doc async for doc in collection('reports').find({'_id': {'$in': oids}}, TRANSITION_PROJECTION)}
+
+    ts = now()
+    results: dict[str, dict] = {}
+    ops, pending = [], []
+    for report_id in requested:
+        report = reports.get(report_id)
+        if not report:
+            results[report_id] = {'id': report_id, 'ok': False, 'error': 'Invalid id' if not ObjectId.is_valid(report_id) else 'Report not found'}
+            continue
+        error = _transition_error(report, payload.status)
+        if error:
+            results[report_id] = {'id': report_id, 'ok': False, 'error': error, 'from': report.get('status', 'draft')}
+            continue
+        ops.append(UpdateOne({'_id': report['_id'], 'status': report.get('status')}, _transition_update(report, payload.status, payload.user, ts)))
+        pending.append(report)
+
+    applied: set[str] = set()
+    if ops:
+        result = await collection('reports').bulk_write(ops, ordered=False)
+        if result.matched_count == len(ops):
+            applied = {str(r['_id']) for r in pending}
+        else:
+            applied = {str(doc['_id']) async for doc in collection('reports').find({'_id': {'$in': [r['_id'] for r in pending]}, 'updated_at': ts, 'updated_by': payload.user}, {'_id': 1})}
+    for report in pending:
+        report_id = str(report['_id'])
+        results[report_id] = {'id': report_id, 'ok': report_id in applied, 'from': report.get('status', 'draft')}
+        if report_id not in applied:
+            results[report_id]['error'] = 'Report changed concurrently'
+
+    changed = [r for r in pending if str(r['_id']) in applied]
+    await reports_written([r['_id'] for r in changed], product_ids={p for r in changed for p in report_product_ids(r)})
+    return {'status': payload.status, 'updated': len(changed), 'status_meta': status_meta(payload.status), 'results': [results[x] for x in requested]}
+
+
 @router.post('/reports/{report_id}/status')
 async def transition_status(report_id: str, status: str, user: str = 'system'):
     if status not in STATUS_FLOW:
         raise HTTPException(status_code=400, detail='Invalid status')
-    report = await collection('reports').find_one({'_id': parse_id(report_id)})
+    report = await collection('reports').find_one({'_id': parse_id(report_id)}, TRANSITION_PROJECTION)
     if not report:
         raise HTTPException(status_code=404, detail='Report not found')
-    has_actions = bool(report.get('actions') or report.get('blocks', {}).get('actions'))
-    if status == 'final_report' and (not has_actions or not report.get('photo_sets', {}).get('after')):
-        raise HTTPException(status_code=400, detail='Final report requires actions and after photos')
+    error = _transition_error(report, status)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
 
-    current = report.get('status', 'draft')
-    current_idx = STATUS_FLOW.index(current) if current in STATUS_FLOW else 0
-    target_idx = STATUS_FLOW.index(status)
-    if target_idx > current_idx + 1:
-        raise HTTPException(status_code=400, detail='Can only move to next stage')
-
-    await collection('reports').update_one(
-        {'_id': report['_id']},
-        {
-            '$set': {'status': status, 'updated_at': now(), 'updated_by': user},
-            '$push': {'audit_log': {'ts': now(), 'user': user, 'action': 'status_change', 'diff_summary': f'{current}->{status}'}},
-        },
-    )
+    await collection('reports').update_one({'_id': report['_id']}, _transition_update(report, status, user, now()))
+    await report_written(report_id, product_ids=report_product_ids(report))
     return {'ok': True, 'status_meta': status_meta(status)}
 
 
@@ -215,6 +310,7 @@ async def create_revision(report_id: str):
     report['updated_at'] = now()
     report['status'] = 'draft'
     inserted = await collection('reports').insert_one(report)
+    await report_written(str(inserted.inserted_id), product_ids=report_product_ids(report))
     return {'id': str(inserted.inserted_id), 'revision_no': report['revision_no']}
 
 
@@ -232,6 +328,7 @@ async def duplicate_report(report_id: str):
     report['created_at'] = ts
     report['updated_at'] = ts
     inserted = await collection('reports').insert_one(report)
+    await report_written(str(inserted.inserted_id), product_ids=report_product_ids(report))
     return {'id': str(inserted.inserted_id), 'report_no': report['report_no'], 'revision_no': 1}
 
 
@@ -247,9 +344,14 @@ async def service_history(product_id: str, limit: int = 10):
             'summary': doc.get('result_notes') or (doc.get('blocks', {}).get('actions', [{}])[0].get('text') if doc.get('blocks', {}).get('actions') else ''),
         })
 
-    total = await collection('reports').count_documents({'products.product_id': product_id})
+    summary = (await get_product_summaries([product_id])).get(product_id)
+    if summary:
+        total = summary['total_reports']
+    else:
+        # No read-model row yet (pre-rebuild data); fall back to counting.
+        total = await collection('reports').count_documents({'products.product_id': product_id}) if items else 0
     latest = items[0]['date'] if items else None
-    return {'product_id': product_id, 'total_reports': total, 'last_service_date': latest, 'reports': items}
+    return MongoJSONResponse({'product_id': product_id, 'total_reports': total, 'last_service_date': latest, 'reports': items})
 
 
 @router.get('/dashboard/kpis')
@@ -288,6 +390,7 @@ async def list_issuer_reports(
     status_bucket: str | None = None,
     sort_by: str | None = None,
     sort_order: str | None = None,
+    view: Literal['summary', 'full'] = 'summary',
 ):
     return await list_reports(
         customer_id=customer_id,
@@ -301,4 +404,5 @@ async def list_issuer_reports(
         model=model,
         serial_no=serial_no,
         tag_no=tag_no,
+        view=view,
     )
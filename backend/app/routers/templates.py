@@ -1,32 +1,37 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
 from app.db import collection
 from app.schemas import TemplateIn
-from .common import normalize_doc, now, parse_id
+from .common import bump_collection_version, cached_json, normalize_doc, now, parse_id
 
 router = APIRouter(prefix='/api', tags=['templates'])
 
 
 @router.get('/templates')
-async def list_templates(template_type: str | None = None):
-    query = {'type': template_type} if template_type else {}
-    return [normalize_doc(doc) async for doc in collection('templates').find(query)]
+async def list_templates(request: Request, template_type: str | None = None):
+    async def load():
+        query = {'type': template_type} if template_type else {}
+        return [normalize_doc(doc) async for doc in collection('templates').find(query)]
+    return await cached_json(request, 'templates', template_type or '', load)
 
 
 @router.post('/templates')
 async def create_template(payload: TemplateIn):
     doc = payload.model_dump() | {'created_at': now(), 'updated_at': now()}
     inserted = await collection('templates').insert_one(doc)
+    await bump_collection_version('templates')
     return {'id': str(inserted.inserted_id)}
 
 
 @router.put('/templates/{template_id}')
 async def update_template(template_id: str, payload: TemplateIn):
     await collection('templates').update_one({'_id': parse_id(template_id)}, {'$set': payload.model_dump() | {'updated_at': now()}})
+    await bump_collection_version('templates')
     return {'ok': True}
 
 
 @router.delete('/templates/{template_id}')
 async def delete_template(template_id: str):
     await collection('templates').delete_one({'_id': parse_id(template_id)})
+    await bump_collection_version('templates')
     return {'ok': True}
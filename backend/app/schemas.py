@@ -117,6 +117,15 @@ class ProductIn(StrictModel):
 
 
 
+class ProductIdsIn(StrictModel):
+    product_ids: list[str] = Field(default_factory=list, max_length=1000)
+
+
+class ProductLookupIn(StrictModel):
+    codes: list[str] = Field(default_factory=list, max_length=500)
+    field: Literal['any', 'serial_no', 'tag_no', 'actuator_serial_no'] = 'any'
+
+
 class ProductOptionValueIn(StrictModel):
     value: str
 
@@ -136,6 +145,12 @@ class ReportActionItem(StrictModel):
     order_index: int = 0
 
 
+class ReportStatusBulkIn(StrictModel):
+    report_ids: list[str] = Field(min_length=1, max_length=1000)
+    status: str
+    user: str = 'system'
+
+
 class ReportIn(StrictModel):
     language: Literal['tr', 'en'] = 'tr'
     status: Literal['draft', 'pre_report', 'quotation_sent', 'awaiting_approval', 'approved', 'in_service', 'final_report', 'archived'] = 'draft'
@@ -203,3 +218,9 @@ class ExportOptionsIn(StrictModel):
 class ExcelExportOptionsIn(StrictModel):
     type: Literal['external', 'internal'] = 'external'
     language: Literal['tr', 'en'] = 'tr'
+
+
+class ProfilingConfigIn(StrictModel):
+    sample_rate: float = Field(default=0.0, ge=0, le=1)
+    routes: list[str] = Field(default_factory=list)
+    interval_ms: int = Field(default=5, ge=1, le=100)
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from collections.abc import Iterable
+
+from pymongo import DeleteOne, ReplaceOne
+
+from .db import collection
+
+SUMMARY_COLLECTION = 'product_service_summary'
+
+
+def _summary_pipeline(product_ids: list[str]) -> list[dict]:
+    return [
+        {'$match': {'products.product_id': {'$in': product_ids}}},
+        {'$sort': {'created_at': -1}},
+        # A report that lists the same product twice still counts once.
+        {'$project': {'created_at': 1, 'status': 1, 'report_no': 1, 'product_id': {'$setUnion': ['$products.product_id', []]}}},
+        {'$unwind': '$product_id'},
+        {'$match': {'product_id': {'$in': product_ids}}},
+        {
+            '$group': {
+                '_id': '$product_id',
+                'total_reports': {'$sum': 1},
+                'last_service_date': {'$first': '$created_at'},
+                'last_status': {'$first': '$status'},
+                'last_report_id': {'$first': '$_id'},
+                'last_report_no': {'$first': '$report_no'},
+            }
+        },
+    ]
+
+
+async def refresh_product_summaries(product_ids: Iterable[str]) -> int:
+    """Recompute the summary rows of the given products from `reports`.
+
+    Only the touched products are recomputed, which is one indexed aggregation
+    per report write; products left without reports lose their row.
+    """
+    ids = sorted({p for p in product_ids if p})
+    if not ids:
+        return 0
+    ops = []
+    found = set()
+    async for row in collection('reports').aggregate(_summary_pipeline(ids)):
+        found.add(row['_id'])
+        row['last_report_id'] = str(row['last_report_id'])
+        ops.append(ReplaceOne({'_id': row['_id']}, row, upsert=True))
+    ops.extend(DeleteOne({'_id': product_id}) for product_id in ids if product_id not in found)
+    await collection(SUMMARY_COLLECTION).bulk_write(ops, ordered=False)
+    return len(ids)
+
+
+async def get_product_summaries(product_ids: Iterable[str]) -> dict[str, dict]:
+    ids = list({p for p in product_ids if p})
+    if not ids:
+        return {}
+    summaries = {}
+    async for doc in collection(SUMMARY_COLLECTION).find({'_id': {'$in': ids}}):
+        product_id = doc.pop('_id')
+        summaries[product_id] = doc | {'product_id': product_id}
+    return summaries
+
+
+async def rebuild_product_summaries(batch_size: int = 500) -> int:
+    """Rebuild every row; used by scripts/rebuild_read_models.py."""
+    await collection(SUMMARY_COLLECTION).delete_many({})
+    product_ids = [p for p in await collection('reports').distinct('products.product_id') if p]
+    for start in range(0, len(product_ids), batch_size):
+        await refresh_product_summaries(product_ids[start:start + batch_size])
+    return len(product_ids)
+
+
+async def ensure_product_service_summary():
+    """Build the read model on first start after upgrading, or when it misses products; later writes keep it current."""
+    if await collection('reports').estimated_document_count() == 0:
+        return
+    expected = len([p for p in await collection('reports').distinct('products.product_id') if p])
+    if await collection(SUMMARY_COLLECTION).count_documents({}) != expected:
+        await rebuild_product_summaries()
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import hashlib
+import re
+import time
+from collections import deque
+from datetime import datetime
+
+import orjson
+from bson import ObjectId
+from pymongo import monitoring
+
+from .config import settings
+from .metrics import MONGO_SLOW_COMMANDS
+
+SLOW_QUERY_COLLECTION = 'slow_queries'
+RECORDED_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct'}
+# Session/cluster fields the driver adds; an explain must not carry them.
+DRIVER_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction'}
+MAX_PENDING = 1000
+
+
+def redact(value):
+    """Replace literal values with type markers, keeping field names and operators."""
+    if isinstance(value, dict):
+        return {k: redact(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, dict) for v in value):
+            return [redact(v) for v in value]
+        # `$in: [a, b, c]` and `$in: [d]` share a shape; only the element types matter.
+        # Items may be nested lists/dicts (`$setUnion: ['$a', []]`), so dedupe by their serialized form.
+        unique = {orjson.dumps(item, option=orjson.OPT_SORT_KEYS): item for item in map(redact, value)}
+        return [unique[key] for key in sorted(unique)]
+    if isinstance(value, bool):
+        return '<bool>'
+    if isinstance(value, (int, float)):
+        return '<num>'
+    if isinstance(value, str):
+        return '<str>'
+    if value is None:
+        return '<null>'
+    if isinstance(value, datetime):
+        return '<date>'
+    if isinstance(value, ObjectId):
+        return '<oid>'
+    if isinstance(value, re.Pattern) or type(value).__name__ == 'Regex':
+        return '<regex>'
+    return f'<{type(value).__name__}>'
+
+
+def query_shape(command_name: str, command: dict) -> dict:
+    if command_name == 'find':
+        return {'filter': redact(command.get('filter') or {}), 'sort': dict(command.get('sort') or {})}
+    if command_name == 'aggregate':
+        return {'pipeline': redact(command.get('pipeline') or [])}
+    if command_name == 'distinct':
+        return {'key': command.get('key'), 'query': redact(command.get('query') or {})}
+    if command_name == 'findAndModify':
+        return {'query': redact(command.get('query') or {}), 'sort': dict(command.get('sort') or {})}
+    if command_name in ('update', 'delete'):
+        statements = command.get('updates' if command_name == 'update' else 'deletes') or [{}]
+        return {'q': redact(statements[0].get('q') or {})}
+    return {'query': redact(command.get('query') or {})}
+
+
+def shape_id(collection: str, command_name: str, shape: dict) -> str:
+    key = orjson.dumps({'collection': collection, 'command': command_name, 'shape': shape}, option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha1(key).hexdigest()[:16]
+
+
+def explain_command(command_name: str, command: dict) -> dict | None:
+    """The original command minus driver fields, or None when it must not be explained."""
+    if command_name not in EXPLAINABLE_COMMANDS:
+        return None
+    if command_name == 'aggregate' and any('$out' in stage or '$merge' in stage for stage in command.get('pipeline') or []):
+        return None
+    return {k: v for k, v in command.items() if not k.startswith('$') and k not in DRIVER_FIELDS}
+
+
+def _docs_returned(command_name: str, reply: dict) -> int | None:
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch') or [])
+    if command_name == 'distinct':
+        return len(reply.get('values') or [])
+    if 'n' in reply:
+        return int(reply['n'])
+    return None
+
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    """Queue commands slower than SLOW_QUERY_MS; `slow_query_log` persists and explains them.
+
+    Events arrive on driver threads, so the listener only keeps a reference to
+    the command and appends to a bounded deque; anything heavier happens in the
+    async drain loop.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING):
+        self.pending: deque[dict] = deque(maxlen=max_pending)
+        self.dropped = 0
+        self._started: dict[tuple, tuple[str, dict]] = {}
+
+    @staticmethod
+    def _key(event) -> tuple:
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        if settings.slow_query_ms <= 0 or event.command_name not in RECORDED_COMMANDS:
+            return
+        target = event.command.get(event.command_name)
+        if isinstance(target, str) and target != SLOW_QUERY_COLLECTION:
+            self._started[self._key(event)] = (event.database_name, event.command)
+
+    def _finish(self, event, reply: dict | None, failure: str | None = None):
+        started = self._started.pop(self._key(event), None)
+        if started is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < settings.slow_query_ms:
+            return
+        database_name, command = started
+        collection = command[event.command_name]
+        MONGO_SLOW_COMMANDS.labels(collection, event.command_name).inc()
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append({
+            'ts': time.time(),
+            'database': database_name,
+            'collection': collection,
+            'command_name': event.command_name,
+            'command': command,
+            'duration_ms': round(duration_ms, 2),
+            'docs_returned': _docs_returned(event.command_name, reply) if reply else None,
+            'failure': failure,
+        })
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event, None, str(event.failure.get('errmsg', '')) if isinstance(event.failure, dict) else str(event.failure))
+
+
+slow_query_recorder = SlowQueryRecorder()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+import orjson
+from pymongo.errors import CollectionInvalid
+
+from .config import settings
+from .db import collection
+from .slow_queries import SLOW_QUERY_COLLECTION, explain_command, query_shape, shape_id, slow_query_recorder
+
+logger = logging.getLogger(__name__)
+
+DRAIN_INTERVAL_SECONDS = 1.0
+# shape_id -> monotonic time of its last explain, so a hot shape is explained once per interval.
+_explained: dict[str, float] = {}
+
+
+async def ensure_slow_query_log():
+    database = collection(SLOW_QUERY_COLLECTION).database
+    if SLOW_QUERY_COLLECTION in await database.list_collection_names():
+        return
+    try:
+        await database.create_collection(SLOW_QUERY_COLLECTION, capped=True, size=settings.slow_query_log_size_bytes)
+    except CollectionInvalid:
+        pass  # another API node created it first
+    except Exception:
+        logger.warning('could not create capped %s collection; it will grow uncapped', SLOW_QUERY_COLLECTION, exc_info=True)
+
+
+def _find_key(doc, key: str):
+    """First value stored under `key` anywhere in an explain document."""
+    if isinstance(doc, dict):
+        if key in doc:
+            return doc[key]
+        children = doc.values()
+    elif isinstance(doc, list):
+        children = doc
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def _plan_stages(plan: dict) -> list[str]:
+    stages = []
+    while isinstance(plan, dict) and plan:
+        plan = plan.get('queryPlan', plan)
+        stage = plan.get('stage', '?')
+        stages.append(f"{stage}({plan['indexName']})" if plan.get('indexName') else stage)
+        inputs = plan.get('inputStages') or [plan.get('inputStage')]
+        plan = inputs[0] if inputs else None
+    return stages
+
+
+def explain_summary(explain: dict) -> dict:
+    """Winning plan and executionStats counters, from find/count/distinct and aggregate explains alike."""
+    stats = _find_key(explain, 'executionStats') or {}
+    stages = _plan_stages(_find_key(explain, 'winningPlan') or {})
+    return {
+        'plan': ' > '.join(stages),
+        'collscan': 'COLLSCAN' in stages,
+        'docs_examined': stats.get('totalDocsExamined'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'n_returned': stats.get('nReturned'),
+        'execution_ms': stats.get('executionTimeMillis'),
+    }
+
+
+async def _explain(entry: dict, sid: str) -> dict | None:
+    if not settings.slow_query_explain:
+        return None
+    command = explain_command(entry['command_name'], entry['command'])
+    last = _explained.get(sid)
+    if command is None or (last is not None and time.monotonic() - last < settings.slow_query_explain_interval_seconds):
+        return None
+    if len(_explained) > 10000:
+        _explained.clear()
+    _explained[sid] = time.monotonic()
+    try:
+        explain = await collection(entry['collection']).database.client[entry['database']].command({'explain': command, 'verbosity': 'executionStats'})
+    except Exception as exc:
+        return {'error': str(exc)}
+    return explain_summary(explain)
+
+
+async def drain_slow_queries() -> int:
+    """Persist what the recorder queued since the last drain; returns the number written."""
+    docs = []
+    while slow_query_recorder.pending:
+        entry = slow_query_recorder.pending.popleft()
+        try:
+            shape = query_shape(entry['command_name'], entry['command'])
+            sid = shape_id(entry['collection'], entry['command_name'], shape)
+        except Exception:
+            # One command the redactor cannot handle must not cost the rest of the batch.
+            logger.exception('computing the shape of a slow %s on %s failed', entry['command_name'], entry['collection'])
+            continue
+        docs.append({
+            'ts': datetime.fromtimestamp(entry['ts'], timezone.utc),
+            'collection': entry['collection'],
+            'command': entry['command_name'],
+            'shape_id': sid,
+            # Stored as JSON: redacted shapes keep `$`-prefixed operator keys.
+            'shape': orjson.dumps(shape).decode(),
+            'duration_ms': entry['duration_ms'],
+            'docs_returned': entry['docs_returned'],
+            'failure': entry['failure'],
+            'explain': await _explain(entry, sid),
+        })
+    if docs:
+        await collection(SLOW_QUERY_COLLECTION).insert_many(docs)
+    return len(docs)
+
+
+async def run_slow_query_drain():
+    """Background loop started by the app when SLOW_QUERY_MS > 0."""
+    while True:
+        await asyncio.sleep(DRAIN_INTERVAL_SECONDS)
+        try:
+            await drain_slow_queries()
+        except Exception:
+            logger.exception('slow query drain failed')
+
+
+async def top_slow_query_shapes(hours: int = 24, limit: int = 20, collection_name: str | None = None) -> list[dict]:
+    match: dict = {'ts': {'$gte': datetime.now(timezone.utc) - timedelta(hours=hours)}}
+    if collection_name:
+        match['collection'] = collection_name
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'ts': -1}},
+        {'$group': {
+            '_id': '$shape_id',
+            'collection': {'$first': '$collection'},
+            'command': {'$first': '$command'},
+            'shape': {'$first': '$shape'},
+            'count': {'$sum': 1},
+            'total_ms': {'$sum': '$duration_ms'},
+            'avg_ms': {'$avg': '$duration_ms'},
+            'max_ms': {'$max': '$duration_ms'},
+            'max_docs_examined': {'$max': '$explain.docs_examined'},
+            'avg_docs_returned': {'$avg': '$docs_returned'},
+            'plans': {'$addToSet': '$explain.plan'},
+            'last_seen': {'$first': '$ts'},
+        }},
+        {'$sort': {'total_ms': -1}},
+        {'$limit': limit},
+    ]
+    rows = await collection(SLOW_QUERY_COLLECTION).aggregate(pipeline).to_list(limit)
+    for row in rows:
+        row['shape_id'] = row.pop('_id')
+        row['shape'] = orjson.loads(row['shape'])
+        row['avg_ms'] = round(row['avg_ms'], 2)
+        row['plans'] = [p for p in row['plans'] if p]
+    return rows
+
+
+async def recent_slow_queries(shape: str | None = None, limit: int = 50) -> list[dict]:
+    query = {'shape_id': shape} if shape else {}
+    rows = await collection(SLOW_QUERY_COLLECTION).find(query, {'_id': 0}).sort('ts', -1).limit(limit).to_list(limit)
+    for row in rows:
+        row['shape'] = orjson.loads(row['shape'])
+    return rows
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import os
+
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def parse_byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Parse a single `bytes=` range into an inclusive (start, end) pair.
+
+    Returns None when the header is absent or asks for several ranges (the full
+    body is served then) and raises ValueError when the range is unsatisfiable.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    start_raw, _, end_raw = header[6:].strip().partition('-')
+    try:
+        if not start_raw:
+            length = int(end_raw)
+            if length <= 0:
+                raise ValueError('empty suffix range')
+            return max(size - length, 0), size - 1
+        start = int(start_raw)
+        end = min(int(end_raw), size - 1) if end_raw else size - 1
+    except ValueError:
+        raise ValueError('malformed range') from None
+    if start >= size or start > end:
+        raise ValueError('range not satisfiable')
+    return start, end
+
+
+def range_not_satisfiable(size: int) -> Response:
+    return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+
+
+class RangeFileResponse(FileResponse):
+    """FileResponse that honours a single HTTP byte range."""
+
+    def __init__(self, path, byte_range: tuple[int, int] | None = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.byte_range = byte_range
+        self.headers['accept-ranges'] = 'bytes'
+        if byte_range and self.stat_result is not None:
+            start, end = byte_range
+            self.status_code = 206
+            self.headers['content-range'] = f'bytes {start}-{end}/{self.stat_result.st_size}'
+            self.headers['content-length'] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self.byte_range or scope['method'].upper() == 'HEAD':
+            await super().__call__(scope, receive, send)
+            return
+        start, end = self.byte_range
+        await send({'type': 'http.response.start', 'status': self.status_code, 'headers': self.raw_headers})
+        async with await anyio.open_file(self.path, mode='rb') as file:
+            await file.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+        if remaining > 0:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files whose names never change: long-lived caching and Range support.
+
+    `fetch_missing` is awaited with the relative path before lookup so a cache
+    tier can materialise the file locally (read-through).
+    """
+
+    def __init__(self, *args, fetch_missing=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetch_missing = fetch_missing
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if self.fetch_missing is not None and scope['method'] in ('GET', 'HEAD'):
+            await self.fetch_missing(path)
+        return await super().get_response(path, scope)
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {'Cache-Control': IMMUTABLE_CACHE_CONTROL}
+        probe = FileResponse(full_path, stat_result=stat_result)
+        if self.is_not_modified(probe.headers, request_headers):
+            return Response(status_code=304, headers={'ETag': probe.headers['etag'], **headers})
+
+        byte_range = None
+        if_range = request_headers.get('if-range')
+        if status_code == 200 and (not if_range or if_range == probe.headers['etag']):
+            try:
+                byte_range = parse_byte_range(request_headers.get('range'), stat_result.st_size)
+            except ValueError:
+                return range_not_satisfiable(stat_result.st_size)
+        return RangeFileResponse(full_path, byte_range=byte_range, status_code=status_code, stat_result=stat_result, headers=headers)
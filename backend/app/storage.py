@@ -1,35 +1,93 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
 from uuid import uuid4
 
-import boto3
-from botocore.client import Config
-from PIL import Image
-
 from .config import settings
+from .engines import engine
+from .metrics import MINIO_UPLOAD_FAILURES, MINIO_UPLOAD_SECONDS
+from .static_files import IMMUTABLE_CACHE_CONTROL
+
+logger = logging.getLogger(__name__)
 
+PHOTO_BUCKET = 'demart-photos'
+ASSET_BUCKET = 'demart-assets'
+EXPORT_BUCKET = 'demart-exports'
+# S3 requires every multipart part except the last to be at least 5 MiB.
+MULTIPART_PART_SIZE = 8 * 1024 * 1024
+# Bound on remembered misses; a flood of distinct bogus paths only churns this dict.
+MAX_NEGATIVE_ENTRIES = 10_000
 BASE_DIR = Path(__file__).resolve().parents[2]
 RUNTIME_DIR = BASE_DIR / 'runtime'
 UPLOAD_DIR = RUNTIME_DIR / 'uploads'
+# One marker per upload that has not reached MinIO; outside UPLOAD_DIR so it is never served.
+UNSYNCED_DIR = RUNTIME_DIR / 'unsynced'
 EXPORT_DIR = BASE_DIR / 'exports'
 
-for p in [RUNTIME_DIR, UPLOAD_DIR, EXPORT_DIR]:
+for p in [RUNTIME_DIR, UPLOAD_DIR, UNSYNCED_DIR, EXPORT_DIR]:
     p.mkdir(parents=True, exist_ok=True)
 
 
+@lru_cache(maxsize=1)
 def _s3_client():
-    return boto3.client(
+    # boto3 clients are thread-safe; building one per call costs more than most requests.
+    s3 = engine('boto3')
+    return s3.client(
         's3',
         endpoint_url=f"http://{settings.minio_endpoint}",
         aws_access_key_id=settings.minio_access_key,
         aws_secret_access_key=settings.minio_secret_key,
-        config=Config(signature_version='s3v4'),
+        config=s3.Config(signature_version='s3v4'),
+        region_name='us-east-1',
+    )
+
+
+@lru_cache(maxsize=1)
+def _presign_client():
+    # Signing is local (no request is made), so the client can target the public host.
+    s3 = engine('boto3')
+    return s3.client(
+        's3',
+        endpoint_url=f"http://{settings.minio_public_endpoint or settings.minio_endpoint}",
+        aws_access_key_id=settings.minio_access_key,
+        aws_secret_access_key=settings.minio_secret_key,
+        config=s3.Config(signature_version='s3v4'),
         region_name='us-east-1',
     )
 
 
+_presigned_cache: dict[tuple[str, str], tuple[float, str]] = {}
+
+
+def presigned_url(bucket: str, key: str, download_name: str | None = None) -> str:
+    """Presigned GET URL, reused for half its lifetime so browsers can cache the object."""
+    ts = time.monotonic()
+    cached = _presigned_cache.get((bucket, key))
+    if cached and cached[0] > ts:
+        return cached[1]
+    ttl = settings.presigned_url_ttl_seconds
+    params = {'Bucket': bucket, 'Key': key, 'ResponseCacheControl': IMMUTABLE_CACHE_CONTROL}
+    if download_name:
+        params['ResponseContentDisposition'] = f'attachment; filename="{download_name}"'
+    url = _presign_client().generate_presigned_url('get_object', Params=params, ExpiresIn=ttl)
+    if len(_presigned_cache) > 10000:
+        _presigned_cache.clear()
+    _presigned_cache[(bucket, key)] = (ts + ttl / 2, url)
+    return url
+
+
 def _ensure_bucket(bucket: str):
     client = _s3_client()
     try:
@@ -38,14 +96,398 @@ def _ensure_bucket(bucket: str):
         client.create_bucket(Bucket=bucket)
 
 
-def upload_bytes_to_minio(bucket: str, key: str, data: bytes, content_type: str = 'application/octet-stream'):
+@contextmanager
+def _timed_upload(bucket: str, operation: str):
+    """Record latency and failures of one MinIO upload call; exceptions propagate."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        MINIO_UPLOAD_FAILURES.labels(bucket, operation).inc()
+        raise
+    finally:
+        MINIO_UPLOAD_SECONDS.labels(bucket, operation).observe(time.perf_counter() - started)
+
+
+def upload_bytes_to_minio(bucket: str, key: str, data: bytes, content_type: str = 'application/octet-stream') -> bool:
     try:
-        _ensure_bucket(bucket)
-        client = _s3_client()
-        client.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+        with _timed_upload(bucket, 'put_object'):
+            _ensure_bucket(bucket)
+            client = _s3_client()
+            client.put_object(Bucket=bucket, Key=key, Body=data, ContentType=content_type)
+        return True
     except Exception:
         # Keep local runtime functional even if MinIO is unavailable.
-        pass
+        return False
+
+
+class MultipartUploadWriter:
+    """Write-only stream that tees into a local file and streams parts to MinIO.
+
+    Renderers write straight into it; every `part_size` bytes become one
+    multipart part, so the finished file is never read back. Small outputs
+    fall back to a single put_object. If MinIO fails the upload is aborted and
+    only the local file is kept (`object_key` is then None).
+    """
+
+    def __init__(self, local_path: Path, bucket: str, key: str, content_type: str, part_size: int = MULTIPART_PART_SIZE):
+        self.local_path = local_path
+        self.bucket = bucket
+        self.key = key
+        self.content_type = content_type
+        self.part_size = part_size
+        self.size = 0
+        self.object_key: str | None = None
+        self._buffer = bytearray()
+        self._parts: list[dict] = []
+        self._upload_id: str | None = None
+        self._failed = False
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(local_path, 'wb')
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self.size
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('seek')
+
+    def flush(self):
+        self._file.flush()
+
+    def write(self, data) -> int:
+        self._file.write(data)
+        self.size += len(data)
+        if not self._failed:
+            self._buffer += data
+            if len(self._buffer) >= self.part_size:
+                self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        try:
+            client = _s3_client()
+            if self._upload_id is None:
+                _ensure_bucket(self.bucket)
+                self._upload_id = client.create_multipart_upload(Bucket=self.bucket, Key=self.key, ContentType=self.content_type)['UploadId']
+            number = len(self._parts) + 1
+            with _timed_upload(self.bucket, 'upload_part'):
+                result = client.upload_part(Bucket=self.bucket, Key=self.key, PartNumber=number, UploadId=self._upload_id, Body=bytes(self._buffer))
+            self._parts.append({'PartNumber': number, 'ETag': result['ETag']})
+        except Exception:
+            self._abort_upload()
+        self._buffer.clear()
+
+    def _abort_upload(self):
+        self._failed = True
+        if self._upload_id:
+            try:
+                _s3_client().abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            except Exception:
+                pass
+
+    def close(self):
+        self._file.close()
+        if self._failed:
+            return
+        try:
+            if self._upload_id is None:
+                self.object_key = self.key if upload_bytes_to_minio(self.bucket, self.key, bytes(self._buffer), self.content_type) else None
+                return
+            if self._buffer:
+                self._upload_part()
+                if self._failed:
+                    return
+            with _timed_upload(self.bucket, 'complete_multipart_upload'):
+                _s3_client().complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id, MultipartUpload={'Parts': self._parts})
+            self.object_key = self.key
+        except Exception:
+            self._abort_upload()
+        finally:
+            self._buffer = bytearray()
+
+    def discard(self):
+        self._file.close()
+        self._abort_upload()
+        self.local_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def open_object_stream(bucket: str, key: str, byte_range: tuple[int, int] | None = None):
+    kwargs = {'Range': f'bytes={byte_range[0]}-{byte_range[1]}'} if byte_range else {}
+    return _s3_client().get_object(Bucket=bucket, Key=key, **kwargs)['Body']
+
+
+def export_local_path(doc: dict) -> Path:
+    if doc.get('object_key'):
+        return EXPORT_DIR / doc['object_key']
+    return Path(doc.get('file_path') or EXPORT_DIR / doc.get('file_name', ''))
+
+
+class LocalCache:
+    """Size-capped LRU cache of MinIO objects on local disk.
+
+    MinIO is the source of truth; a miss downloads the object (read-through) and
+    the least recently used files are evicted once `max_bytes` is exceeded.
+    Entries that never reached MinIO are pinned so the only copy is not evicted.
+    Pins are also written as marker files in `marker_dir`, so they survive
+    restarts and are honoured by every worker sharing the directory;
+    retry_pinned() uploads them again and unpins the ones that made it. Keys a
+    download failed for are remembered for `negative_ttl` seconds, so repeated
+    requests for missing paths do not each cost a MinIO GET.
+    The index is per process and rebuilt from the directory by load(), which
+    the app runs in a thread at startup.
+    """
+
+    def __init__(self, root: Path, bucket: str, max_bytes: int, negative_ttl: float = 60, marker_dir: Path | None = None):
+        self.root = root
+        self.bucket = bucket
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.marker_dir = marker_dir
+        self._missing: dict[str, float] = {}
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._pinned: set[str] = set()
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.fetch_failures = 0
+        self.negative_hits = 0
+        self.pinned_uploaded = 0
+
+    def path_for(self, key: str) -> Path | None:
+        path = (self.root / key).resolve()
+        return path if path.is_relative_to(self.root.resolve()) and key else None
+
+    def _marker(self, key: str) -> Path | None:
+        return self.marker_dir / hashlib.sha1(key.encode()).hexdigest() if self.marker_dir else None
+
+    def _is_unsynced(self, key: str) -> bool:
+        marker = self._marker(key)
+        return marker is not None and marker.is_file()
+
+    def _set_unsynced(self, key: str, unsynced: bool):
+        marker = self._marker(key)
+        if marker is None:
+            return
+        if unsynced:
+            marker.parent.mkdir(parents=True, exist_ok=True)
+            marker.write_text(key)
+        else:
+            marker.unlink(missing_ok=True)
+
+    def unsynced_keys(self) -> list[str]:
+        if self.marker_dir is None or not self.marker_dir.is_dir():
+            return []
+        return [p.read_text() for p in self.marker_dir.iterdir() if p.is_file()]
+
+    def load(self):
+        """Index the files on disk and restore pins; a full walk, so run it off the event loop."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+    def _load(self):
+        files = []
+        for path in self.root.rglob('*'):
+            if path.is_file() and not path.name.endswith('.part'):
+                stat = path.stat()
+                files.append((stat.st_atime, path.relative_to(self.root).as_posix(), stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._size += size
+        self._pinned.update(self.unsynced_keys())
+        self._loaded = True
+
+    def add(self, key: str, size: int, *, pinned: bool = False):
+        if pinned:
+            self._set_unsynced(key, True)
+        else:
+            # Another worker (or an earlier run) may have pinned a file this process only now sees.
+            pinned = self._is_unsynced(key)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._missing.pop(key, None)
+            if pinned:
+                self._pinned.add(key)
+            else:
+                self._pinned.discard(key)
+            victims = self._collect_victims()
+        self._unlink(victims)
+
+    def _collect_victims(self) -> list[str]:
+        victims = []
+        if self.max_bytes <= 0:
+            return victims
+        for key in list(self._entries):
+            if self._size <= self.max_bytes:
+                break
+            if key in self._pinned or self._is_unsynced(key):
+                continue
+            size = self._entries.pop(key)
+            self._size -= size
+            self.evictions += 1
+            self.evicted_bytes += size
+            victims.append(key)
+        return victims
+
+    def _unlink(self, keys: list[str]):
+        for key in keys:
+            try:
+                (self.root / key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _touch(self, key: str, path: Path) -> bool:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return True
+        if path.is_file():
+            self.add(key, path.stat().st_size)
+            return True
+        return False
+
+    def forget(self, key: str):
+        with self._lock:
+            self._size -= self._entries.pop(key, 0)
+            self._pinned.discard(key)
+        self._set_unsynced(key, False)
+
+    def _download(self, key: str, path: Path) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{uuid4().hex}.part')
+        try:
+            _s3_client().download_file(self.bucket, key, str(tmp))
+            os.replace(tmp, path)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return path.stat().st_size
+
+    async def get(self, key: str) -> Path | None:
+        """Local path for `key`, downloading it from MinIO on a miss; None if unavailable."""
+        path = self.path_for(key)
+        if path is None:
+            return None
+        if path.is_file() and self._touch(key, path):
+            self.hits += 1
+            return path
+        if self._missing.get(key, 0) > time.monotonic():
+            self.negative_hits += 1
+            return None
+        self.misses += 1
+        pending = self._inflight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(asyncio.to_thread(self._download, key, path))
+            self._inflight[key] = pending
+            pending.add_done_callback(lambda _: self._inflight.pop(key, None))
+        try:
+            size = await asyncio.shield(pending)
+        except Exception:
+            self.fetch_failures += 1
+            self._remember_missing(key)
+            return None
+        self.add(key, size)
+        return path if path.is_file() else None
+
+    def _remember_missing(self, key: str):
+        now = time.monotonic()
+        if len(self._missing) >= MAX_NEGATIVE_ENTRIES:
+            self._missing = {k: t for k, t in self._missing.items() if t > now}
+            while len(self._missing) >= MAX_NEGATIVE_ENTRIES:
+                del self._missing[next(iter(self._missing))]
+        self._missing[key] = now + self.negative_ttl
+
+    def _upload_pinned(self, key: str) -> bool:
+        path = self.root / key
+        if not path.is_file():
+            self.forget(key)
+            return False
+        content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        if not upload_bytes_to_minio(self.bucket, key, path.read_bytes(), content_type):
+            return False
+        self._set_unsynced(key, False)
+        return True
+
+    async def retry_pinned(self) -> int:
+        """Upload pinned entries to MinIO again; those that succeed become evictable. Returns how many.
+
+        Work comes from the markers, so files pinned by other workers or before a restart are retried too.
+        """
+        with self._lock:
+            pinned = set(self._pinned)
+        pinned.update(await asyncio.to_thread(self.unsynced_keys))
+        uploaded = []
+        for key in sorted(pinned):
+            if await asyncio.to_thread(self._upload_pinned, key):
+                uploaded.append(key)
+        with self._lock:
+            self._pinned.difference_update(uploaded)
+            victims = self._collect_victims()
+        self._unlink(victims)
+        self.pinned_uploaded += len(uploaded)
+        return len(uploaded)
+
+    async def get_many(self, keys: list[str]) -> dict[str, Path]:
+        unique = list(dict.fromkeys(k for k in keys if k))
+        paths = await asyncio.gather(*(self.get(k) for k in unique))
+        return {k: p for k, p in zip(unique, paths) if p is not None}
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'bucket': self.bucket,
+            'entries': len(self._entries),
+            'pinned': len(self._pinned),
+            'size_bytes': self._size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'evicted_bytes': self.evicted_bytes,
+            'fetch_failures': self.fetch_failures,
+            'negative_hits': self.negative_hits,
+            'pinned_uploaded': self.pinned_uploaded,
+        }
+
+
+upload_cache = LocalCache(UPLOAD_DIR, PHOTO_BUCKET, settings.upload_cache_max_bytes, settings.upload_cache_negative_ttl_seconds, UNSYNCED_DIR)
+
+
+async def run_pinned_upload_retry():
+    """Background loop started by the app when UPLOAD_RETRY_INTERVAL_SECONDS > 0."""
+    while True:
+        await asyncio.sleep(settings.upload_retry_interval_seconds)
+        try:
+            uploaded = await upload_cache.retry_pinned()
+            if uploaded:
+                logger.info('uploaded %d pinned files to MinIO', uploaded)
+        except Exception:
+            logger.exception('retrying pinned uploads failed')
 
 
 def save_original_image(report_id: str, filename: str, data: bytes) -> tuple[str, Path]:
@@ -59,7 +501,7 @@ def save_original_image(report_id: str, filename: str, data: bytes) -> tuple[str
 
 
 def build_thumbnail_and_optimized(original_path: Path, report_id: str, filename_hint: str, *, max_width: int = 2000, quality: int = 85):
-    image = Image.open(original_path)
+    image = engine('pillow').Image.open(original_path)
     if image.mode not in ('RGB', 'L'):
         image = image.convert('RGB')
 
@@ -98,5 +540,11 @@ def local_upload_url(rel_path: str) -> str:
     return f"/files/uploads/{rel_path}"
 
 
+def upload_url(rel_path: str) -> str:
+    if settings.media_url_mode == 'presigned':
+        return presigned_url(PHOTO_BUCKET, rel_path)
+    return local_upload_url(rel_path)
+
+
 def local_export_url(filename: str) -> str:
     return f"/files/exports/{filename}"
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import html
+import re
+import unicodedata
+
+# Turkish casing first (I -> ı, İ -> i), then fold to ASCII so queries typed
+# without Turkish letters still match: "ISIL", "ışıl" and "isil" are one term.
+_TURKISH_UPPER = str.maketrans({'I': 'ı', 'İ': 'i'})
+_ASCII_FOLD = str.maketrans({'ı': 'i', 'ş': 's', 'ğ': 'g', 'ç': 'c', 'ö': 'o', 'ü': 'u', 'â': 'a', 'î': 'i', 'û': 'u'})
+_TOKEN_RE = re.compile(r'\w+')
+
+MIN_TOKEN_LENGTH = 2
+MIN_STEM_LENGTH = 3
+# Folded Turkish inflections (plural, case, possessive) and common English
+# endings. Longest match wins; three passes reduce "conta", "contalar" and
+# "contalarda" to the same stem.
+SUFFIXES = sorted(
+    {
+        'lerinden', 'larindan', 'lerinde', 'larinda', 'lerini', 'larini', 'lerin', 'larin',
+        'leri', 'lari', 'ler', 'lar',
+        'ndan', 'nden', 'dan', 'den', 'tan', 'ten', 'nda', 'nde', 'da', 'de', 'ta', 'te',
+        'nin', 'nun', 'in', 'un', 'yi', 'yu', 'ya', 'ye', 'si', 'su', 'i', 'u', 'a', 'e',
+        'ings', 'ing', 'ed', 'es', 's',
+    },
+    key=len,
+    reverse=True,
+)
+
+
+def fold(text: str) -> str:
+    text = text.translate(_TURKISH_UPPER).lower().translate(_ASCII_FOLD)
+    return ''.join(ch for ch in unicodedata.normalize('NFKD', text) if not unicodedata.combining(ch))
+
+
+def stem(token: str) -> str:
+    if any(ch.isdigit() for ch in token):
+        return token
+    for _ in range(3):
+        for suffix in SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM_LENGTH:
+                token = token[: -len(suffix)]
+                break
+        else:
+            break
+    return token
+
+
+def _spans(text: str):
+    # Tokens are found in the original text and folded one at a time, so the
+    # offsets stay valid for highlighting.
+    for match in _TOKEN_RE.finditer(text):
+        folded = fold(match.group())
+        if len(folded) >= MIN_TOKEN_LENGTH:
+            yield match.start(), match.end(), stem(folded)
+
+
+def words(text: str) -> list[str]:
+    """Folded, unstemmed tokens; prefix matching wants whole words."""
+    return [word for word in (fold(token) for token in _TOKEN_RE.findall(text or '')) if word]
+
+
+def terms(text: str) -> list[str]:
+    return [term for _, _, term in _spans(text or '')]
+
+
+def highlight(text: str, query_terms: set[str], width: int = 160) -> str | None:
+    """HTML-escaped snippet of `text` around the first hit, hits wrapped in <mark>."""
+    hits = [(start, end) for start, end, term in _spans(text or '') if term in query_terms]
+    if not hits:
+        return None
+    begin = max(0, hits[0][0] - width // 4)
+    end = min(len(text), begin + width)
+    parts = ['…' if begin else '']
+    cursor = begin
+    for start, stop in hits:
+        if start < begin or stop > end:
+            continue
+        parts.append(html.escape(text[cursor:start]))
+        parts.append(f'<mark>{html.escape(text[start:stop])}</mark>')
+        cursor = stop
+    parts.append(html.escape(text[cursor:end]))
+    parts.append('…' if end < len(text) else '')
+    return ''.join(parts)
@@ -0,0 +1,67 @@
+"""Compare the frontend's per-customer call pattern with GET /api/customers/{id}/fleet.
+
+Runs against a live API: python scripts/bench_customer_fleet.py CUSTOMER_ID [--base-url http://localhost:8000] [--rounds 20]
+Requires httpx (requirements-dev.txt).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def legacy_pattern(client: httpx.AsyncClient, customer_id: str) -> int:
+    customer, contacts, products = await asyncio.gather(
+        client.get(f'/api/customers/{customer_id}'),
+        client.get(f'/api/customers/{customer_id}/contacts'),
+        client.get('/api/products', params={'customer_id': customer_id}),
+    )
+    for response in (customer, contacts, products):
+        response.raise_for_status()
+    histories = await asyncio.gather(*(client.get(f"/api/products/{p['id']}/service-history") for p in products.json()))
+    for response in histories:
+        response.raise_for_status()
+    return 3 + len(histories)
+
+
+async def fleet_pattern(client: httpx.AsyncClient, customer_id: str, limit: int) -> int:
+    calls, skip = 0, 0
+    while True:
+        response = await client.get(f'/api/customers/{customer_id}/fleet', params={'skip': skip, 'limit': limit})
+        response.raise_for_status()
+        calls += 1
+        page = response.json()['products']
+        skip += limit
+        if skip >= page['total']:
+            return calls
+
+
+async def measure(name: str, fn, rounds: int):
+    timings, calls = [], 0
+    await fn()
+    for _ in range(rounds):
+        start = time.perf_counter()
+        calls = await fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f'{name:<8} requests={calls:<4} median={statistics.median(timings):8.1f} ms  p95={timings[int(len(timings) * 0.95) - 1]:8.1f} ms')
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('customer_id')
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--page-size', type=int, default=500)
+    args = parser.parse_args()
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60) as client:
+        legacy = await measure('legacy', lambda: legacy_pattern(client, args.customer_id), args.rounds)
+        fleet = await measure('fleet', lambda: fleet_pattern(client, args.customer_id, args.page_size), args.rounds)
+    print(f'speedup: {legacy / fleet:.1f}x')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
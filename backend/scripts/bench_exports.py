@@ -0,0 +1,221 @@
+"""Benchmark the PDF (HTML + WeasyPrint) and Excel (openpyxl) exporters by photo count.
+
+Usage: python scripts/bench_exports.py [--photos 0 10 50 150] [--exporters pdf excel]
+           [--languages tr en] [--photos-per-page 4 6 8] [--rounds 3]
+           [--output results.json] [--baseline previous.json] [--threshold 0.15]
+
+Every case renders in a fresh process, so peak RSS belongs to that case alone.
+Reported per case: median wall time, tracemalloc peak (Python allocations),
+peak process RSS (includes native WeasyPrint/Pillow memory) and output size.
+With --baseline, cases slower or hungrier than the baseline by more than
+--threshold are flagged and the exit status is 1.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from generate_data import make_jpeg  # noqa: E402
+
+COMPARED_METRICS = ('wall_ms', 'tracemalloc_peak_mb', 'peak_rss_mb')
+
+
+def fixture_report(photo_count: int) -> tuple[dict, list[dict], list[dict]]:
+    ts = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    photos = [{'optimized_object_key': f'photo-{i:03d}.jpg', 'caption': f'Seat yüzeyi aşınmış {i}'} for i in range(photo_count)]
+    report = {
+        'report_no': 'SR-260101-001',
+        'revision_no': 2,
+        'status': 'final_report',
+        'customer_name': 'Tüpraş İzmit Rafinerisi',
+        'customer_short_name': 'TUPIZM',
+        'customer_code': 4001,
+        'contact_id': 'Ahmet Yılmaz',
+        'blocks': {
+            'complaint': [{'text': 'Kontrol dengesiz, salmastradan kaçak var.'}],
+            'problems': [{'text': 'Seat yüzeyi aşınmış.'}, {'text': 'Stem üzerinde çizikler mevcut.'}],
+            'actions': [{'text': 'Seat laplama uygulandı.'}, {'text': 'Salmastra seti yenilendi.'}],
+        },
+        'spares': [{'part_name': 'Packing set', 'qty': 1, 'note': 'PTFE'}, {'part_name': 'Gasket', 'qty': 2, 'note': ''}],
+        'result_notes': 'Vana test edilerek sevke hazırlandı.',
+        'created_at': ts,
+        'updated_at': ts + timedelta(days=3),
+    }
+    half = (photo_count + 1) // 2
+    return report, photos[:half], photos[half:]
+
+
+def prepare_photos(directory: Path, count: int, seed: int = 1) -> dict[str, Path]:
+    """Distinct JPEGs at the optimized size the upload path stores (max 2000 px wide)."""
+    rng = random.Random(seed)
+    paths = {}
+    for i in range(count):
+        key = f'photo-{i:03d}.jpg'
+        path = directory / key
+        if not path.exists():
+            path.write_bytes(make_jpeg(rng, 2000, 1500, label=key))
+        paths[key] = path
+    return paths
+
+
+def _rss_mb() -> float:
+    # VmHWM belongs to this address space; ru_maxrss on Linux is carried over
+    # exec from the parent, so it would report the parent's peak instead.
+    status = Path('/proc/self/status')
+    if status.exists():
+        for line in status.read_text().splitlines():
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _render_case(case: dict, photo_dir: str, rounds: int, queue):
+    from app.exports import render_excel, render_pdf
+    from app.schemas import ExcelExportOptionsIn, ExportOptionsIn
+
+    report, before, after = fixture_report(case['photos'])
+    photo_paths = {p['optimized_object_key']: Path(photo_dir) / p['optimized_object_key'] for p in before + after}
+    if case['exporter'] == 'pdf':
+        options = ExportOptionsIn(photos_per_page=case['photos_per_page'], language=case['language'])
+
+        def render(target):
+            render_pdf(target, report, before, after, options, None, photo_paths)
+    else:
+        options = ExcelExportOptionsIn(type=case['excel_type'], language=case['language'])
+
+        def render(target):
+            render_excel(target, report, before, after, options, photo_paths)
+
+    baseline_rss = _rss_mb()
+    timings = []
+    size = 0
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as out_dir:
+        for n in range(rounds):
+            target = Path(out_dir) / f'out-{n}'
+            started = time.perf_counter()
+            render(str(target))
+            timings.append((time.perf_counter() - started) * 1000)
+            size = target.stat().st_size
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put({
+        'wall_ms': round(statistics.median(timings), 1),
+        'wall_ms_min': round(min(timings), 1),
+        'tracemalloc_peak_mb': round(traced_peak / 1024**2, 2),
+        'peak_rss_mb': round(_rss_mb(), 1),
+        'baseline_rss_mb': round(baseline_rss, 1),
+        'output_bytes': size,
+    })
+
+
+def case_key(case: dict) -> str:
+    if case['exporter'] == 'pdf':
+        return f"pdf/photos={case['photos']}/per_page={case['photos_per_page']}/{case['language']}"
+    return f"excel_{case['excel_type']}/photos={case['photos']}/{case['language']}"
+
+
+def build_cases(args) -> list[dict]:
+    cases = []
+    for photos in args.photos:
+        for language in args.languages:
+            if 'pdf' in args.exporters:
+                cases.extend({'exporter': 'pdf', 'photos': photos, 'language': language, 'photos_per_page': per_page} for per_page in args.photos_per_page)
+            if 'excel' in args.exporters:
+                cases.extend({'exporter': 'excel', 'photos': photos, 'language': language, 'excel_type': kind} for kind in ('external', 'internal'))
+    return cases
+
+
+def run_case(case: dict, photo_dir: Path, rounds: int) -> dict:
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_render_case, args=(case, str(photo_dir), rounds, queue))
+    proc.start()
+    proc.join()
+    if proc.exitcode != 0:
+        return case | {'key': case_key(case), 'error': f'exit code {proc.exitcode}'}
+    return case | {'key': case_key(case)} | queue.get()
+
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> list[str]:
+    previous = {r['key']: r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for result in results:
+        before = previous.get(result['key'])
+        if not before or 'error' in result:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old and new and (new - old) / old > threshold:
+                regressions.append(f"{result['key']}: {metric} {old} -> {new} (+{(new - old) / old:.0%})")
+    return regressions
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--photos', type=int, nargs='+', default=[0, 10, 50, 150])
+    parser.add_argument('--exporters', nargs='+', choices=['pdf', 'excel'], default=['pdf', 'excel'])
+    parser.add_argument('--languages', nargs='+', choices=['tr', 'en'], default=['tr', 'en'])
+    parser.add_argument('--photos-per-page', type=int, nargs='+', choices=[4, 6, 8], default=[4, 6, 8])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--photo-dir', help='reuse generated fixture photos between runs')
+    parser.add_argument('--output', help='write results as JSON')
+    parser.add_argument('--baseline', help='JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15, help='relative increase reported as a regression')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        photo_dir = Path(args.photo_dir or tmp)
+        photo_dir.mkdir(parents=True, exist_ok=True)
+        prepare_photos(photo_dir, max(args.photos))
+        results = []
+        print(f"{'case':42} {'wall ms':>9} {'py peak MB':>11} {'rss MB':>8} {'size KiB':>10}")
+        for case in build_cases(args):
+            result = run_case(case, photo_dir, args.rounds)
+            results.append(result)
+            if 'error' in result:
+                print(f"{result['key']:42} {result['error']}")
+            else:
+                print(f"{result['key']:42} {result['wall_ms']:>9} {result['tracemalloc_peak_mb']:>11} {result['peak_rss_mb']:>8} {result['output_bytes'] / 1024:>10.1f}")
+
+    report = {
+        'commit': _git_commit(),
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rounds': args.rounds,
+        'results': results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Measure /api/reports/search latency against the data already in MONGODB_URI/MONGODB_DB.
+
+Usage: python scripts/bench_search.py [--rounds 50] [--target-ms 100] [--limit 20]
+
+Load a large data set first, e.g. 100k reports:
+    python scripts/generate_data.py --customers 500 --products-per-customer 40 --reports-per-product 5 --revisions 1
+
+Queries are picked from the term statistics: the most common term, two
+common terms together, a median term and a rare one, so the worst case
+(a word in most reports) is always covered. Prints median and p95 per
+query; the exit status is 1 when any p95 is above --target-ms.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.db import collection  # noqa: E402
+from app.report_search import SEARCH_COLLECTION, TERMS_COLLECTION, ensure_report_search, search_reports  # noqa: E402
+
+
+async def pick_queries() -> dict[str, str]:
+    by_df = [doc['_id'] async for doc in collection(TERMS_COLLECTION).find({}, {'_id': 1}).sort('df', -1)]
+    if not by_df:
+        raise SystemExit('the search index is empty; run scripts/generate_data.py first')
+    return {
+        'most common': by_df[0],
+        'two common': ' '.join(by_df[:2]),
+        'median': by_df[len(by_df) // 2],
+        'rare': by_df[-1],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=50)
+    parser.add_argument('--target-ms', type=float, default=100)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    await ensure_report_search()
+    print(f'{await collection(SEARCH_COLLECTION).estimated_document_count()} reports indexed')
+    failed = False
+    for name, q in (await pick_queries()).items():
+        await search_reports(q, limit=args.limit)
+        timings = []
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            results = await search_reports(q, limit=args.limit)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        failed |= p95 > args.target_ms
+        flag = '  SLOW' if p95 > args.target_ms else ''
+        print(f'{name:<12} {q!r:<28} hits={len(results):<3} median={statistics.median(timings):7.1f} ms  p95={p95:7.1f} ms{flag}')
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""Compare the generic FastAPI encoder path with MongoJSONResponse on report documents.
+
+Usage: python scripts/bench_serialization.py [--reports 500] [--rounds 20]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bson import Decimal128, ObjectId  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.responses import MongoJSONResponse  # noqa: E402
+from app.routers.common import normalize_doc  # noqa: E402
+
+
+def make_report(i: int) -> dict:
+    ts = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(hours=i)
+    return {
+        '_id': ObjectId(),
+        'report_no': f'SR-260101-{i % 1000:03d}',
+        'language': 'tr',
+        'status': 'in_service',
+        'revision_no': 1 + i % 3,
+        'customer_id': str(ObjectId()),
+        'customer_code': 4001 + i % 200,
+        'customer_short_name': f'Müşteri {i % 200}',
+        'customer_name': f'Müşteri Enerji A.Ş. {i % 200}',
+        'issuer_id': str(ObjectId()),
+        'contact_id': str(ObjectId()),
+        'responsible_user': 'Demo Tech',
+        'arrival_date': ts,
+        'shipping_date': ts + timedelta(days=7),
+        'products': [
+            {
+                'product_id': str(ObjectId()),
+                'snapshot_fields': {'brand': 'Fisher', 'model': 'DVC6200', 'serial_no': f'SN-{i:05d}-{p}', 'tag_no': f'TAG-{i}-{p}'},
+            }
+            for p in range(2)
+        ],
+        'blocks': {
+            'complaint': [{'text': 'Kontrol dengesiz, salmastradan kaçak var.'}],
+            'problems': [{'text': 'Seat yüzeyi aşınmış.'}, {'text': 'Stem üzerinde çizikler mevcut.'}],
+            'actions': [{'text': 'Seat laplama uygulandı.'}],
+        },
+        'actions': [
+            {
+                'library_id': str(ObjectId()),
+                'snapshot_text_tr': 'Vana komple demonte edilerek tüm iç trim bileşenleri ayrıştırıldı.',
+                'snapshot_text_en': 'The valve was completely disassembled and all internal trim components were separated.',
+                'manual_extension_tr': 'Ek testler yapıldı.',
+                'manual_extension_en': 'Additional tests completed.',
+                'final_text_tr': 'Vana komple demonte edilerek tüm iç trim bileşenleri ayrıştırıldı. Ek testler yapıldı.',
+                'final_text_en': 'The valve was completely disassembled and all internal trim components were separated. Additional tests completed.',
+                'order_index': a,
+            }
+            for a in range(8)
+        ],
+        'accessory_notes': [{'accessory_key': 'positioner', 'finding': 'Kalibrasyon kaymış', 'action_text': 'Zero/span ayarlandı', 'measurement': {'value': Decimal128('4.0'), 'unit': 'mA'}}],
+        'spares': [{'part_name': 'Packing set', 'qty': 1, 'note': 'PTFE'}, {'part_name': 'Gasket', 'qty': 2, 'note': ''}],
+        'result_notes': 'Vana test edilerek sevke hazırlandı.',
+        'internal_notes': 'Müşteri onayı bekleniyor.',
+        'exports': {'pdf': {'latest_url': '/files/exports/x.pdf', 'generated_at': ts, 'size_bytes': 123456}},
+        'photo_sets': {'before': [str(ObjectId()) for _ in range(6)], 'after': [str(ObjectId()) for _ in range(6)]},
+        'audit_log': [{'ts': ts + timedelta(minutes=m), 'user': 'Demo Tech', 'action': 'status_change', 'diff_summary': 'draft->pre_report'} for m in range(6)],
+        'created_at': ts,
+        'updated_at': ts,
+        'created_by': 'Demo Tech',
+        'updated_by': 'Demo Tech',
+    }
+
+
+def generic_path(docs: list[dict]) -> bytes:
+    items = [normalize_doc(dict(doc)) for doc in docs]
+    return JSONResponse(jsonable_encoder(items, custom_encoder={ObjectId: str, Decimal128: lambda d: float(d.to_decimal())})).body
+
+
+def fast_path(docs: list[dict]) -> bytes:
+    items = [normalize_doc(dict(doc)) for doc in docs]
+    return MongoJSONResponse(items).body
+
+
+def run(name: str, fn, docs: list[dict], rounds: int) -> float:
+    fn(docs)
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        body = fn(docs)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median = timings[len(timings) // 2]
+    print(f'{name:<10} median={median * 1000:8.2f} ms  best={timings[0] * 1000:8.2f} ms  size={len(body) / 1024:8.1f} KiB')
+    return median
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--reports', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    docs = [make_report(i) for i in range(args.reports)]
+    print(f'{args.reports} report documents, {args.rounds} rounds')
+    generic = run('generic', generic_path, docs, args.rounds)
+    fast = run('orjson', fast_path, docs, args.rounds)
+    print(f'speedup: {generic / fast:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,322 @@
+"""Generate a realistic data set at scale for benchmarks and load tests.
+
+Usage: python scripts/generate_data.py [--customers 50] [--products-per-customer 20]
+           [--reports-per-product 3] [--revisions 2] [--photos-per-report 2]
+           [--seed 1] [--upload-photos] [--reset]
+
+Writes to MONGODB_URI/MONGODB_DB like the API. Photos are generated JPEGs
+stored in the local upload directory (and MinIO with --upload-photos).
+Read models are rebuilt at the end so list/search endpoints see the data.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bson import ObjectId  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from app.action_library_seed import SEED_ACTIONS  # noqa: E402
+from app.db import collection  # noqa: E402
+from app.indexes import ensure_indexes  # noqa: E402
+from app.product_lookup import product_lookup_keys  # noqa: E402
+from app.report_actions import normalize_actions  # noqa: E402
+from app.report_search import rebuild_report_search  # noqa: E402
+from app.report_summaries import rebuild_report_summaries  # noqa: E402
+from app.routers.common import bump_collection_version  # noqa: E402
+from app.service_summary import rebuild_product_summaries  # noqa: E402
+from app.storage import PHOTO_BUCKET, build_thumbnail_and_optimized, save_original_image, upload_bytes_to_minio  # noqa: E402
+
+GENERATED_COLLECTIONS = ['customers', 'customer_contacts', 'brands', 'models', 'products', 'reports', 'photos', 'exports']
+STATUS_WEIGHTS = {
+    'draft': 10,
+    'pre_report': 8,
+    'quotation_sent': 8,
+    'awaiting_approval': 10,
+    'approved': 8,
+    'in_service': 12,
+    'final_report': 30,
+    'archived': 14,
+}
+CATALOG = {
+    'Fisher': ['DVC6200', 'ED', 'EZ', 'GX', '667'],
+    'Samson': ['3241', '3730', '3277'],
+    'Flowserve': ['Valtek Mark One', 'Logix 3800'],
+    'Masoneilan': ['21000', 'SVI II AP'],
+    'Metso': ['Neles RE', 'ND9000'],
+    'ARI': ['STEVI 440', 'ZETRIX'],
+}
+CITIES = ['İzmit', 'İzmir', 'Aliağa', 'Kırıkkale', 'Batman', 'Ceyhan', 'Bursa', 'Gebze', 'Ankara', 'Iğdır']
+INDUSTRIES = ['Rafineri', 'Petrokimya', 'Enerji', 'Kimya', 'Gübre', 'Şeker', 'Kağıt', 'Çimento']
+SUFFIXES = ['A.Ş.', 'Sanayi A.Ş.', 'Ltd. Şti.', 'Enerji Üretim A.Ş.']
+FIRST_NAMES = ['Ahmet', 'Ayşe', 'Mehmet', 'Zeynep', 'İsmail', 'Şule', 'Çağrı', 'Gökhan', 'Özge', 'Ümit']
+LAST_NAMES = ['Yılmaz', 'Kaya', 'Demir', 'Şahin', 'Çelik', 'Öztürk', 'Arslan', 'Doğan', 'Kılıç', 'Aydın']
+COMPLAINTS = [
+    'Kontrol dengesiz, salmastradan kaçak var.',
+    'Vana tam kapanmıyor, seat kaçağı mevcut.',
+    'Pozisyoner sinyale cevap vermiyor.',
+    'Aktüatör diyaframından hava kaçağı var.',
+    'Valve is sticking during stroke.',
+    'Gövde contasından dış kaçak tespit edildi.',
+]
+PROBLEMS = [
+    'Seat yüzeyi aşınmış.',
+    'Stem üzerinde çizikler mevcut.',
+    'Salmastra seti sertleşmiş ve ezilmiş.',
+    'Plug üzerinde erozyon izleri var.',
+    'Diyafram yırtılmış.',
+    'Limit switch ayarı kaymış.',
+    'Cage internal surfaces show cavitation damage.',
+]
+SPARES = [
+    ('Salmastra seti', 'Packing set'),
+    ('Gövde contası', 'Body gasket'),
+    ('O-ring seti', 'O-ring kit'),
+    ('Diyafram', 'Diaphragm'),
+    ('Seat ring', 'Seat ring'),
+    ('Plug', 'Plug'),
+    ('Stem', 'Stem'),
+]
+RESULTS = [
+    'Vana test edilerek sevke hazır hale getirildi.',
+    'Sızdırmazlık testi başarılı, strok testi tamamlandı.',
+    'Unit tested and returned to service.',
+    'Yedek parça onayı bekleniyor.',
+]
+
+
+def _weighted_status(rng: random.Random) -> str:
+    return rng.choices(list(STATUS_WEIGHTS), weights=list(STATUS_WEIGHTS.values()))[0]
+
+
+def make_jpeg(rng: random.Random, width: int = 1280, height: int = 960, label: str = '') -> bytes:
+    """A noisy gradient, so JPEG sizes are closer to real photos than a flat fill."""
+    base = [rng.randrange(40, 200) for _ in range(3)]
+    image = Image.effect_noise((width, height), rng.randrange(30, 80)).convert('RGB')
+    tint = Image.new('RGB', (width, height), tuple(base))
+    image = Image.blend(image, tint, 0.6)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle([width // 4, height // 4, width * 3 // 4, height * 3 // 4], outline=(255, 255, 255), width=6)
+    if label:
+        draw.text((24, 24), label, fill=(255, 255, 255))
+    out = BytesIO()
+    image.save(out, format='JPEG', quality=88)
+    return out.getvalue()
+
+
+async def _insert(name: str, docs: list[dict], batch_size: int = 1000):
+    for start in range(0, len(docs), batch_size):
+        await collection(name).insert_many(docs[start:start + batch_size], ordered=False)
+
+
+def _store_photo(rng: random.Random, report_id: str, kind: str, upload: bool) -> dict:
+    raw = make_jpeg(rng, label=f'{report_id} {kind}')
+    original_rel, original_path = save_original_image(report_id, f'{kind}.jpg', raw)
+    optimized_rel, optimized_path, ow, oh, thumb_rel, thumb_path, tw, th = build_thumbnail_and_optimized(original_path, report_id, f'{kind}.jpg')
+    if upload:
+        for rel, path in ((original_rel, original_path), (optimized_rel, optimized_path), (thumb_rel, thumb_path)):
+            upload_bytes_to_minio(PHOTO_BUCKET, rel, path.read_bytes(), 'image/jpeg')
+    return {
+        'report_id': report_id,
+        'kind': kind,
+        'caption': rng.choice(PROBLEMS),
+        'tags': [],
+        'original_object_key': original_rel,
+        'original_size_bytes': len(raw),
+        'optimized_object_key': optimized_rel,
+        'thumb_object_key': thumb_rel,
+        'optimized_width': ow,
+        'optimized_height': oh,
+        'thumb_width': tw,
+        'thumb_height': th,
+        'created_at': datetime.now(timezone.utc),
+    }
+
+
+def _report(rng: random.Random, customer: dict, products: list[dict], catalog: dict, created: datetime, revision: int, report_no: str, status: str) -> dict:
+    actions = normalize_actions([
+        {
+            'library_id': None,
+            'snapshot_text_tr': tr,
+            'snapshot_text_en': en,
+            'manual_extension_tr': rng.choice(['', '', 'Ek testler yapıldı.']),
+            'manual_extension_en': '',
+            'order_index': idx,
+        }
+        for idx, (_, _, tr, en) in enumerate(rng.sample(SEED_ACTIONS, rng.randint(2, 8)))
+    ])
+    responsible = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+    return {
+        'report_no': report_no,
+        'language': rng.choice(['tr', 'tr', 'en']),
+        'status': status,
+        'revision_no': revision,
+        'customer_id': str(customer['_id']),
+        'customer_code': customer['customer_code'],
+        'customer_short_name': customer['short_name'],
+        'customer_name': customer['name'],
+        'contact_id': None,
+        'issuer_id': None,
+        'responsible_user': responsible,
+        'arrival_date': created,
+        'shipping_date': created + timedelta(days=rng.randint(3, 30)) if status in {'final_report', 'archived'} else None,
+        'products': [
+            {
+                'product_id': str(p['_id']),
+                'snapshot_fields': {'brand': catalog[p['brand_id']][0], 'model': catalog[p['brand_id']][1][p['model_id']], 'serial_no': p['serial_no'], 'tag_no': p['tag_no']},
+            }
+            for p in products
+        ],
+        'blocks': {
+            'complaint': [{'text': rng.choice(COMPLAINTS)}],
+            'problems': [{'text': t} for t in rng.sample(PROBLEMS, rng.randint(1, 3))],
+            'actions': [{'text': a['final_text_tr']} for a in actions[:2]],
+        },
+        'actions': actions,
+        'spares': [{'part_name': tr, 'qty': rng.randint(1, 4), 'note': en} for tr, en in rng.sample(SPARES, rng.randint(0, 4))],
+        'result_notes': rng.choice(RESULTS),
+        'exports': {},
+        'photo_sets': {'before': [], 'after': []},
+        'audit_log': [{'ts': created, 'user': responsible, 'action': 'create', 'diff_summary': 'initial draft'}],
+        'created_at': created,
+        'updated_at': created,
+        'created_by': responsible,
+        'updated_by': responsible,
+    }
+
+
+async def generate(*, customers: int = 50, products_per_customer: int = 20, reports_per_product: int = 3, revisions: int = 2,
+                   photos_per_report: int = 2, seed: int = 1, upload_photos: bool = False, reset: bool = False, log=print) -> dict:
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    if reset:
+        for name in GENERATED_COLLECTIONS:
+            await collection(name).delete_many({})
+    await ensure_indexes()
+    ts = datetime.now(timezone.utc)
+
+    catalog: dict[str, tuple[str, dict[str, str]]] = {}
+    brand_docs, model_docs = [], []
+    for brand, models in CATALOG.items():
+        brand_doc = {'_id': ObjectId(), 'name': brand, 'created_at': ts, 'updated_at': ts}
+        brand_docs.append(brand_doc)
+        names = {}
+        for model in models:
+            model_doc = {'_id': ObjectId(), 'brand_id': str(brand_doc['_id']), 'name': model, 'created_at': ts, 'updated_at': ts}
+            model_docs.append(model_doc)
+            names[str(model_doc['_id'])] = model
+        catalog[str(brand_doc['_id'])] = (brand, names)
+    await _insert('brands', brand_docs)
+    await _insert('models', model_docs)
+    for name in ('brands', 'models'):
+        await bump_collection_version(name)
+
+    latest = await collection('customers').find_one({'customer_code': {'$type': 'number'}}, sort=[('customer_code', -1)])
+    next_code = int((latest or {}).get('customer_code') or 4000) + 1
+    customer_docs, contact_docs, product_docs = [], [], []
+    for i in range(customers):
+        industry, city = rng.choice(INDUSTRIES), rng.choice(CITIES)
+        customer = {
+            '_id': ObjectId(),
+            'name': f'{city} {industry} {rng.choice(SUFFIXES)} {i + 1}',
+            'short_name': f'{city[:3].upper()}{industry[:3].upper()}{i + 1}',
+            'customer_code': next_code + i,
+            'city': city,
+            'country': 'TR',
+            'branches': [],
+            'created_at': ts,
+            'updated_at': ts,
+        }
+        customer_docs.append(customer)
+        for c in range(rng.randint(1, 3)):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            contact_docs.append({'customer_id': str(customer['_id']), 'name': f'{first} {last}', 'email': f'{first.lower()}.{i}.{c}@example.com', 'is_default': c == 0, 'created_at': ts, 'updated_at': ts})
+        for p in range(products_per_customer):
+            brand_id = rng.choice(list(catalog))
+            model_id = rng.choice(list(catalog[brand_id][1]))
+            product = {
+                '_id': ObjectId(),
+                'customer_id': str(customer['_id']),
+                'brand_id': brand_id,
+                'model_id': model_id,
+                'type': 'Control Valve',
+                'valve_type': rng.choice(['control', 'on_off', 'safety']),
+                'serial_no': f'SN-{i:04d}-{p:04d}-{rng.randrange(10**6):06d}',
+                'tag_no': f'{rng.choice(["FV", "PV", "LV", "TV", "XV"])}-{rng.randrange(100, 9999)}',
+                'size': rng.choice(['DN25', 'DN50', 'DN80', 'DN100', 'DN150']),
+                'pressure_class': rng.choice(['PN16', 'PN40', 'ANSI 150', 'ANSI 300']),
+                'actuator': {'type': 'pneumatic_diaphragm', 'serial_no': f'ACT-{i:04d}-{p:04d}'},
+                'accessories': [],
+                'created_at': ts,
+                'updated_at': ts,
+            }
+            product['lookup'] = product_lookup_keys(product)
+            product_docs.append(product)
+    await _insert('customers', customer_docs)
+    await _insert('customer_contacts', contact_docs)
+    await _insert('products', product_docs)
+    log(f'catalog, {len(customer_docs)} customers, {len(product_docs)} products')
+
+    by_customer: dict[str, list[dict]] = {}
+    for product in product_docs:
+        by_customer.setdefault(product['customer_id'], []).append(product)
+    customers_by_id = {str(c['_id']): c for c in customer_docs}
+    report_docs, photo_docs = [], []
+    report_seq = 0
+    for product in product_docs:
+        siblings = by_customer[product['customer_id']]
+        for _ in range(reports_per_product):
+            report_seq += 1
+            created = ts - timedelta(days=rng.randint(0, 730), minutes=rng.randint(0, 1440))
+            report_no = f"SR-{created.strftime('%y%m%d')}-{report_seq % 1000:03d}"
+            listed = [product] + ([rng.choice(siblings)] if len(siblings) > 1 and rng.random() < 0.2 else [])
+            for revision in range(1, revisions + 1):
+                status = _weighted_status(rng) if revision == revisions else rng.choice(['final_report', 'archived'])
+                report = _report(rng, customers_by_id[product['customer_id']], listed, catalog, created + timedelta(days=revision - 1), revision, report_no, status)
+                report['_id'] = ObjectId()
+                if revision == 1:
+                    for n in range(photos_per_report):
+                        photo = _store_photo(rng, str(report['_id']), 'before' if n % 2 == 0 else 'after', upload_photos)
+                        photo['_id'] = ObjectId()
+                        photo_docs.append(photo)
+                        report['photo_sets'][photo['kind']].append(str(photo['_id']))
+                report_docs.append(report)
+        if len(report_docs) >= 1000:
+            await _insert('reports', report_docs)
+            await _insert('photos', photo_docs)
+            log(f'{report_seq} reports generated')
+            report_docs, photo_docs = [], []
+    await _insert('reports', report_docs)
+    await _insert('photos', photo_docs)
+
+    counts = {
+        'customers': len(customer_docs),
+        'contacts': len(contact_docs),
+        'products': len(product_docs),
+        'reports': await collection('reports').count_documents({}),
+        'photos': await collection('photos').count_documents({}),
+    }
+    for name, rebuild in (('report_summaries', rebuild_report_summaries), ('report_search', rebuild_report_search), ('service_summary', rebuild_product_summaries)):
+        log(f'{name}: rebuilt {await rebuild()} rows')
+    counts['seconds'] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=50)
+    parser.add_argument('--products-per-customer', type=int, default=20)
+    parser.add_argument('--reports-per-product', type=int, default=3)
+    parser.add_argument('--revisions', type=int, default=2)
+    parser.add_argument('--photos-per-report', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--upload-photos', action='store_true', help='also upload generated photos to MinIO')
+    parser.add_argument('--reset', action='store_true', help=f"delete {', '.join(GENERATED_COLLECTIONS)} first")
+    args = parser.parse_args()
+    print(asyncio.run(generate(**vars(args))))
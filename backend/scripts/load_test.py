@@ -0,0 +1,210 @@
+"""Async load test for the hot API paths, reporting latency percentiles and throughput.
+
+Usage:
+  python scripts/load_test.py --base-url http://localhost:8000 [--requests 200] [--concurrency 10]
+  python scripts/load_test.py --in-memory [--customers 20] ...   # mongomock-motor stand-in, no server
+  options: [--scenario NAME ...] [--json results.json]
+
+Against a live server, the data should come from scripts/generate_data.py.
+With --in-memory the app runs in-process on mongomock-motor (requirements-dev.txt),
+is filled by the same generator, and is called through httpx's ASGI transport.
+Photo uploads and exports still talk to MinIO when it is reachable.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+
+from generate_data import generate, make_jpeg  # noqa: E402
+
+STATUSES = ['draft', 'pre_report', 'quotation_sent', 'awaiting_approval', 'approved', 'in_service', 'final_report', 'archived']
+
+
+class Context:
+    """Ids and values sampled from the target so every request hits real data."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+        self.reports: list[dict] = []
+        self.customer_ids: list[str] = []
+        self.photo = make_jpeg(rng, 1600, 1200)
+
+    async def load(self, client: httpx.AsyncClient):
+        self.reports = (await client.get('/api/reports')).raise_for_status().json()
+        self.customer_ids = [c['id'] for c in (await client.get('/api/customers')).raise_for_status().json()]
+        if not self.reports or not self.customer_ids:
+            raise SystemExit('no reports/customers found; run scripts/generate_data.py first')
+
+    def report(self) -> dict:
+        return self.rng.choice(self.reports)
+
+    def product(self) -> dict:
+        for _ in range(20):
+            products = self.report().get('products') or []
+            if products:
+                return self.rng.choice(products)
+        return {}
+
+
+def _list(params):
+    async def call(client: httpx.AsyncClient, ctx: Context):
+        return await client.get('/api/reports', params=params(ctx))
+    return call
+
+
+def _date_range(ctx: Context) -> dict:
+    end = datetime.now(timezone.utc) - timedelta(days=ctx.rng.randint(0, 600))
+    return {'date_from': (end - timedelta(days=90)).replace(tzinfo=None).isoformat(), 'date_to': end.replace(tzinfo=None).isoformat()}
+
+
+async def upload_photo(client: httpx.AsyncClient, ctx: Context):
+    report = ctx.report()
+    files = {'file': ('load.jpg', ctx.photo, 'image/jpeg')}
+    return await client.post(f"/api/reports/{report['id']}/photos", params={'kind': ctx.rng.choice(['before', 'after'])}, files=files)
+
+
+async def export_pdf(client: httpx.AsyncClient, ctx: Context):
+    return await client.post(f"/api/reports/{ctx.report()['id']}/export/pdf", json={'language': ctx.rng.choice(['tr', 'en'])})
+
+
+async def export_excel(client: httpx.AsyncClient, ctx: Context):
+    payload = {'type': ctx.rng.choice(['external', 'internal']), 'language': ctx.rng.choice(['tr', 'en'])}
+    return await client.post(f"/api/reports/{ctx.report()['id']}/export/excel", json=payload)
+
+
+async def dashboard_kpis(client: httpx.AsyncClient, ctx: Context):
+    return await client.get('/api/dashboard/kpis')
+
+
+SCENARIOS = {
+    'list_reports': _list(lambda ctx: {}),
+    'list_reports_full': _list(lambda ctx: {'view': 'full'}),
+    'list_reports_status': _list(lambda ctx: {'status': ctx.rng.choice(STATUSES)}),
+    'list_reports_customer': _list(lambda ctx: {'customer_id': ctx.rng.choice(ctx.customer_ids)}),
+    'list_reports_customer_status': _list(lambda ctx: {'customer_id': ctx.rng.choice(ctx.customer_ids), 'status_bucket': 'pending'}),
+    'list_reports_status_bucket': _list(lambda ctx: {'status_bucket': ctx.rng.choice(['pending', 'completed'])}),
+    'list_reports_dates': _list(_date_range),
+    'list_reports_brand': _list(lambda ctx: {'brand': ctx.product().get('brand') or 'Fisher'}),
+    'list_reports_serial': _list(lambda ctx: {'serial_no': ctx.product().get('serial_no') or 'SN'}),
+    'list_reports_search_tag': _list(lambda ctx: {'search_type': 'tag_no', 'search_value': ctx.product().get('tag_no') or 'FV'}),
+    'list_reports_search_customer_no': _list(lambda ctx: {'search_type': 'customer_no', 'search_value': str(ctx.report().get('customer_code') or '')}),
+    'list_reports_sorted': _list(lambda ctx: {'sort_by': 'customer_short_name', 'sort_order': 'desc'}),
+    'upload_photo': upload_photo,
+    'export_pdf': export_pdf,
+    'export_excel': export_excel,
+    'dashboard_kpis': dashboard_kpis,
+}
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, name: str, requests: int, concurrency: int) -> dict:
+    call = SCENARIOS[name]
+    latencies: list[float] = []
+    errors: dict[str, int] = {}
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await call(client, ctx)
+                if response.status_code >= 400:
+                    errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+            except Exception as exc:
+                errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall
+    latencies.sort()
+    return {
+        'scenario': name,
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def _print_row(r: dict):
+    print(f"{r['scenario']:34} {r['requests']:>6} {r['throughput_rps']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['max_ms']:>9}  {r['errors'] or ''}")
+
+
+async def _in_memory_client(args) -> tuple[httpx.AsyncClient, object]:
+    from mongomock_motor import AsyncMongoMockClient
+
+    import app.db as app_db
+    from app.config import settings
+
+    app_db.client = AsyncMongoMockClient()
+    app_db.db = app_db.client[settings.mongodb_db]
+    from app.main import app
+
+    await app.router.startup()
+    counts = await generate(customers=args.customers, products_per_customer=args.products_per_customer, reports_per_product=args.reports_per_product,
+                            revisions=args.revisions, photos_per_report=args.photos_per_report, seed=args.seed, log=lambda msg: None)
+    print(f'in-memory data set: {counts}')
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://load-test', timeout=120), app
+
+
+async def main(args) -> list[dict]:
+    app = None
+    if args.in_memory:
+        client, app = await _in_memory_client(args)
+    else:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=120)
+    ctx = Context(random.Random(args.seed))
+    results = []
+    try:
+        await ctx.load(client)
+        print(f"{'scenario':34} {'req':>6} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}  errors")
+        for name in args.scenario or list(SCENARIOS):
+            results.append(await run_scenario(client, ctx, name, args.requests, args.concurrency))
+            _print_row(results[-1])
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--base-url')
+    target.add_argument('--in-memory', action='store_true')
+    parser.add_argument('--scenario', action='append', choices=list(SCENARIOS), help='repeatable; default: all')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    generated = parser.add_argument_group('--in-memory data set')
+    generated.add_argument('--customers', type=int, default=20)
+    generated.add_argument('--products-per-customer', type=int, default=10)
+    generated.add_argument('--reports-per-product', type=int, default=2)
+    generated.add_argument('--revisions', type=int, default=2)
+    generated.add_argument('--photos-per-report', type=int, default=0)
+    args = parser.parse_args()
+    results = asyncio.run(main(args))
+    if args.json:
+        Path(args.json).write_text(json.dumps({'generated_at': datetime.now(timezone.utc).isoformat(), 'results': results}, indent=2))
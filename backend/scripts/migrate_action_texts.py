@@ -0,0 +1,35 @@
+"""Backfill stored final_text_tr/en on report actions, or verify them.
+
+Usage: python scripts/migrate_action_texts.py [--check] [--restart] [--batch-size N]
+
+The backfill resumes from its last checkpoint unless --restart is given.
+--check exits non-zero when any report still has stale final texts.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.report_actions import backfill_final_texts, check_final_texts  # noqa: E402
+
+
+async def main(args) -> int:
+    if args.check:
+        result = await check_final_texts()
+        print(f"scanned {result['scanned']} reports with actions, {result['stale']} stale")
+        for report_id in result['sample']:
+            print(f'  {report_id}')
+        return 1 if result['stale'] else 0
+    result = await backfill_final_texts(batch_size=args.batch_size, restart=args.restart)
+    print(f"scanned {result['scanned']} reports, updated {result['updated']}")
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--check', action='store_true', help='only report reports whose stored final texts are stale')
+    parser.add_argument('--restart', action='store_true', help='ignore the saved checkpoint and scan from the beginning')
+    parser.add_argument('--batch-size', type=int, default=500)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,38 @@
+"""Rebuild read models and derived lookup keys.
+
+Usage: python scripts/rebuild_read_models.py [report_summaries] [report_search] [service_summary] [product_lookup]
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.product_lookup import backfill_product_lookup  # noqa: E402
+from app.report_search import rebuild_report_search  # noqa: E402
+from app.report_summaries import rebuild_report_summaries  # noqa: E402
+from app.service_summary import rebuild_product_summaries  # noqa: E402
+
+READ_MODELS = {
+    'report_summaries': rebuild_report_summaries,
+    'report_search': rebuild_report_search,
+    'service_summary': rebuild_product_summaries,
+    'product_lookup': backfill_product_lookup,
+}
+
+
+async def main(names: list[str]):
+    for name in names:
+        count = await READ_MODELS[name]()
+        print(f'{name}: rebuilt {count} rows')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('models', nargs='*', metavar='model', help=f"one of {', '.join(READ_MODELS)} (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.models) - set(READ_MODELS)
+    if unknown:
+        parser.error(f"unknown read model(s): {', '.join(sorted(unknown))}")
+    asyncio.run(main(args.models or list(READ_MODELS)))
@@ -111,4 +111,9 @@ for status in ['draft', 'pre_report', 'final_report']:
             'updated_at': now,
         }
     )
+# invalidate list ETags and cached responses keyed by collection versions
+# (API nodes see the bump once their Redis-mirrored version expires, within CACHE_VERSION_TTL_SECONDS)
+for c in ['brands', 'models', 'templates', 'company_profiles']:
+    db.collection_versions.update_one({'_id': c}, {'$inc': {'version': 1}, '$set': {'updated_at': now}}, upsert=True)
+
 print('Seed completed with action_library + issuer + demo reports')